@@ -14,6 +14,8 @@ Sample run (usage)::
 Copyright (C) 2016-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 """
 
+import hashlib
+import json
 import logging
 import os
 import shutil
@@ -23,11 +25,20 @@ from functools import partial
 
 import numpy as np
 import pandas as pd
-from skimage.color import rgb2gray
 
 # this is used while calling this file as a script
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
-from birl.utilities.data_io import create_folder, image_sizes, load_image, load_landmarks, save_image, update_path
+from birl.utilities import LazyModule
+from birl.utilities.data_io import (
+    create_folder,
+    image_sizes,
+    load_image,
+    load_landmarks,
+    load_stage_timings,
+    save_image,
+    save_landmarks,
+    update_path,
+)
 from birl.utilities.dataset import common_landmarks, image_histogram_matching
 from birl.utilities.drawing import draw_image_points, draw_images_warped_landmarks, export_figure, overlap_two_images
 from birl.utilities.evaluate import (
@@ -42,10 +53,13 @@ from birl.utilities.experiments import (
     get_nb_workers,
     iterate_mproc_map,
     parse_arg_params,
+    preload_modules,
     string_dict,
 )
 from birl.utilities.registration import estimate_affine_transform
 
+sk_color = LazyModule('skimage.color')
+
 #: In case provided dataset and complete (true) dataset differ
 COL_PAIRED_LANDMARKS = 'Ration matched landmarks'
 
@@ -122,6 +136,17 @@ class ImRegBenchmark(Experiment):
     NAME_RESULTS_TXT = 'results-summary.txt'
     #: logging file for registration experiments
     NAME_LOG_REGISTRATION = 'registration.log'
+    #: timing sidecar in the registration folder where the method wrapper reports its stages,
+    #: one JSON record per line, see :func:`birl.utilities.data_io.save_stage_timing`
+    NAME_FILE_TIMING = 'timing.jsonl'
+    #: folder in experiment with files prepared once per target image and shared among its pairs
+    FOLDER_CACHE_TARGETS = 'cache-targets'
+    #: schedule the registration pairs grouped by the target image, so a target prepared once is reused
+    GROUP_PAIRS_BY_TARGET = False
+    #: stages reported by the method which sum up to the execution time
+    STAGES_EXECUTION_TIME = ('loading', 'registration')
+    #: modules imported in each worker at its start, extended by :meth:`_list_preload_modules` by the run
+    PRELOAD_MODULES = ()
     #: output image name in experiment folder for reg. results - overlap of reference and warped image
     NAME_IMAGE_REF_WARP = 'image_refence-warped.jpg'
     #: output image name in experiment folder for reg. results - image and landmarks are warped
@@ -151,10 +176,15 @@ class ImRegBenchmark(Experiment):
     COL_REG_DIR = 'Registration folder'
     #: define robustness as improved image alignment from initial state
     COL_ROBUSTNESS = 'Robustness'
-    #: measured time of image registration in minutes
+    #: measured time of image registration in minutes, if the method reports its stages,
+    #: it is the sum of stages in `STAGES_EXECUTION_TIME` (as measured by former method wrappers)
     COL_TIME = 'Execution time [minutes]'
     #: measured time of image pre-processing in minutes
     COL_TIME_PREPROC = 'Pre-processing time [minutes]'
+    #: measured time of a stage reported by the method in minutes
+    COL_TIME_STAGE = '%s time [minutes]'
+    #: CPU time of a particular stage reported by the method
+    COL_TIME_CPU_STAGE = '%s CPU time [minutes]'
     #: tuple of image size
     COL_IMAGE_SIZE = 'Image size [pixels]'
     #: image diagonal in pixels
@@ -188,6 +218,8 @@ class ImRegBenchmark(Experiment):
         logging.info(self.__doc__)
         self._df_overview = None
         self._df_experiments = None
+        self._paths_dataset = {}
+        self._method_plugin = None
         self.nb_workers = params.get('nb_workers', get_nb_workers(0.25))
         self._path_csv_regist = os.path.join(self.params['path_exp'], self.NAME_CSV_REGISTRATION_PAIRS)
 
@@ -200,6 +232,8 @@ class ImRegBenchmark(Experiment):
         :param str destination: type of update
         :return str: updated path
         """
+        if destination == 'data' and path in self._paths_dataset:
+            return self._paths_dataset[path]
         if destination and destination == 'data' and 'path_dataset' in self.params:
             path = os.path.join(self.params['path_dataset'], path)
         elif destination and destination == 'expt' and 'path_exp' in self.params:
@@ -276,6 +310,23 @@ class ImRegBenchmark(Experiment):
     def _get_path_reg_dir(self, item):
         return self._absolute_path(str(item[self.COL_REG_DIR]), destination='expt')
 
+    def _get_path_target_cache(self, path_img_ref):
+        """ get the folder for files prepared once per target image and shared among its pairs,
+        it may be used also for the moving images which appear in several pairs
+
+        :param str path_img_ref: path to the target (reference) image
+        :return str: path to the cache folder
+        """
+        name = hashlib.sha1(os.path.abspath(path_img_ref).encode()).hexdigest()
+        path_dir = os.path.join(self.params['path_exp'], self.FOLDER_CACHE_TARGETS, name)
+        # parallel workers may create the same folder at once
+        try:
+            os.makedirs(path_dir)
+        except OSError:
+            if not os.path.isdir(path_dir):
+                raise
+        return path_dir
+
     def _load_data(self):
         """ loading data, the cover file with all registration pairs """
         logging.info('-> loading data...')
@@ -286,6 +337,20 @@ class ImRegBenchmark(Experiment):
         self._df_overview = _df_drop_unnamed(self._df_overview)
         if not all(col in self._df_overview.columns for col in self.COVER_COLUMNS):
             raise ValueError('Some required columns are missing in the cover file.')
+        self._resolve_dataset_paths()
+
+    def _resolve_dataset_paths(self):
+        """ resolve all dataset paths in the cover table at once
+
+        The particular experiments then do not need to search for them again.
+        The table keeps the original (relative) paths as they are used for exporting
+        and matching the results.
+        """
+        paths = pd.unique(self._df_overview[list(self.COVER_COLUMNS)].values.ravel())
+        # drop any previous resolution, e.g. for another dataset
+        self._paths_dataset = {}
+        self._paths_dataset = {p: self._absolute_path(p, destination='data') for p in paths if isinstance(p, str)}
+        logging.debug('resolved %i dataset paths', len(self._paths_dataset))
 
     def _run(self):
         """ perform complete benchmark experiment """
@@ -301,14 +366,19 @@ class ImRegBenchmark(Experiment):
         else:
             self._df_experiments = pd.DataFrame()
 
+        df_pairs = self._df_overview
+        if self.GROUP_PAIRS_BY_TARGET:
+            # keep the pairs sharing a target together, the index (experiment ID) is kept
+            df_pairs = df_pairs.sort_values(self.COL_IMAGE_REF, kind='mergesort')
         # run the experiment in parallel of single thread
         self.__execute_method(
             self._perform_registration,
-            self._df_overview,
+            df_pairs,
             self._path_csv_regist,
             'registration experiments',
             aggr_experiments=True,
         )
+        shutil.rmtree(os.path.join(self.params['path_exp'], self.FOLDER_CACHE_TARGETS), ignore_errors=True)
 
     def __execute_method(self, method, input_table, path_csv=None, desc='', aggr_experiments=False, nb_workers=None):
         """ execute a method in sequence or parallel
@@ -326,12 +396,27 @@ class ImRegBenchmark(Experiment):
         # run the experiment in parallel of single thread
         nb_workers = self.nb_workers if nb_workers is None else nb_workers
         iter_table = ((idx, dict(row)) for idx, row, in input_table.iterrows())
-        for res in iterate_mproc_map(method, iter_table, nb_workers=nb_workers, desc=desc):
+        preload = (self._list_preload_modules(), )
+        for res in iterate_mproc_map(
+            method, iter_table, nb_workers=nb_workers, desc=desc, initializer=preload_modules, initargs=preload
+        ):
             if res is not None and aggr_experiments:
                 self._df_experiments = self._df_experiments.append(res, ignore_index=True)
                 self.__export_df_experiments(path_csv)
         self._main_thread = True
 
+    def _list_preload_modules(self):
+        """ list the heavy modules needed in this run, the workers import them once at their start
+
+        :return list(str): full names of modules
+        """
+        modules = list(self.PRELOAD_MODULES)
+        if self.params.get('preprocessing'):
+            modules.append('skimage.color')
+        if self.params.get('visual', False):
+            modules.append('matplotlib.pylab')
+        return modules
+
     def __export_df_experiments(self, path_csv=None):
         """ export the DataFrame with registration results
 
@@ -384,7 +469,7 @@ class ImRegBenchmark(Experiment):
         def __convert_gray(path_img_col):
             path_img, col = path_img_col
             path_img_new = __path_img(path_img, 'gray')
-            __save_img(col, path_img_new, rgb2gray(load_image(path_img)))
+            __save_img(col, path_img_new, sk_color.rgb2gray(load_image(path_img)))
             return self._relativize_path(path_img_new, destination='path_exp'), col
 
         for pproc in self.params.get('preprocessing', []):
@@ -450,6 +535,10 @@ class ImRegBenchmark(Experiment):
         if self.__check_exist_regist(idx, path_dir_reg):
             return
         create_folder(path_dir_reg)
+        # the method appends its timing, so drop records of any previous interrupted run
+        path_timing = os.path.join(path_dir_reg, self.NAME_FILE_TIMING)
+        if os.path.isfile(path_timing):
+            os.remove(path_timing)
 
         time_start = time.time()
         # do some requested pre-processing if required
@@ -466,8 +555,9 @@ class ImRegBenchmark(Experiment):
         # if the experiment failed, return back None
         if not row:
             return
-        # compute the registration time in minutes
-        row[self.COL_TIME] = (time.time() - time_start) / 60.
+        # compute the registration time in minutes, unless it was reported by the method
+        if self._method_plugin is None or self.COL_TIME not in row:
+            row[self.COL_TIME] = (time.time() - time_start) / 60.
         # remove some temporary images
         row = self.__remove_pproc_images(row)
 
@@ -520,12 +610,83 @@ class ImRegBenchmark(Experiment):
         logging.debug('.. no preparing before registration experiment')
         return item
 
+    def set_method_plugin(self, method):
+        """ register Python callable performing the registration in-process instead of executing commands
+
+        The callable gets the target and source image (both np.array<height, width, 3> in range (0, 1))
+        and the source landmarks np.array<nb_points, 2>, and it returns the warped source image and
+        the warped source landmarks (any of them can be None) and dictionary of timings in seconds,
+        either just the wall-clock time or ``{'time': float, 'cpu': float}`` for each stage,
+        all stages are exported as extra columns and `loading` with `registration` make the execution time,
+        where the time of loading the inputs for the callable is added to the `loading` stage.
+        It is called directly in the worker processes, so the libraries it uses are imported just once
+        and the registration results do not need to be parsed from files.
+
+        .. note:: for parallel execution the callable has to be picklable, e.g. module level function
+
+        :param method: callable ``(img_ref, img_move, lnds_move) -> (img_warp, lnds_warp, timings)``,
+            None for executing commands
+        """
+        self._method_plugin = method
+
+    def _execute_method_plugin(self, item):
+        """ execute the registration by the in-process method plugin and export its results
+
+        :param dict item: record
+        :return dict: record
+        """
+        logging.debug('.. execute image registration in-process')
+        path_dir = self._get_path_reg_dir(item)
+        path_im_ref, path_im_move, _, path_lnds_move = self._get_paths(item)
+        try:
+            t_start = time.time()
+            img_ref = load_image(path_im_ref)
+            img_move = load_image(path_im_move)
+            lnds_move = load_landmarks(path_lnds_move)
+            t_loading = time.time() - t_start
+            img_warp, lnds_warp, timings = self._method_plugin(img_ref, img_move, lnds_move)
+        except Exception:
+            logging.exception('in-process registration failed for: %s', path_dir)
+            return None
+
+        if img_warp is not None:
+            item[self.COL_IMAGE_MOVE_WARP] = os.path.join(path_dir, os.path.basename(path_im_move))
+            save_image(item[self.COL_IMAGE_MOVE_WARP], img_warp)
+        if lnds_warp is not None:
+            item[self.COL_POINTS_MOVE_WARP] = os.path.join(path_dir, os.path.basename(path_lnds_move))
+            save_landmarks(item[self.COL_POINTS_MOVE_WARP], lnds_warp)
+        timings = {stage: dict(t) if isinstance(t, dict) else {'time': t} for stage, t in (timings or {}).items()}
+        # the benchmark loads the inputs for the method, so it is also part of the loading
+        timings.setdefault('loading', {'time': 0.})
+        timings['loading']['time'] += t_loading
+        item = self._set_stage_timings(item, timings)
+        return item
+
+    def _set_stage_timings(self, item, timings):
+        """ set the times of the stages reported by the method, if `registration` is reported,
+        the execution time is the sum of `STAGES_EXECUTION_TIME` stages
+
+        :param dict item: record
+        :param dict timings: {str: {str: float}} time and optional CPU time in seconds for each stage
+        :return dict: record
+        """
+        for stage, stage_times in timings.items():
+            item[self.COL_TIME_STAGE % stage] = stage_times['time'] / 60.
+            if stage_times.get('cpu') is not None:
+                item[self.COL_TIME_CPU_STAGE % stage] = stage_times['cpu'] / 60.
+        if 'registration' in timings:
+            stages = [s for s in self.STAGES_EXECUTION_TIME if s in timings]
+            item[self.COL_TIME] = sum(timings[s]['time'] for s in stages) / 60.
+        return item
+
     def _execute_img_registration(self, item):
         """ execute the image registration itself
 
         :param dict item: record
         :return dict: record
         """
+        if self._method_plugin is not None:
+            return self._execute_method_plugin(item)
         logging.debug('.. execute image registration as command line')
         path_dir_reg = self._get_path_reg_dir(item)
 
@@ -540,12 +701,21 @@ class ImRegBenchmark(Experiment):
         if not isinstance(commands, (list, tuple)):
             commands = [commands]
         # measure execution time
-        cmd_result = exec_commands(commands, path_log, timeout=self.EXECUTE_TIMEOUT)
+        cmd_result = self._exec_commands(commands, path_log)
         # if the experiment failed, return back None
         if not cmd_result:
             item = None
         return item
 
+    def _exec_commands(self, commands, path_log):
+        """ execute the method commands, the benchmarks may override it to run them differently
+
+        :param str|list(str) commands: commands to be executed
+        :param str path_log: path to the logger
+        :return bool: whether the commands passed
+        """
+        return exec_commands(commands, path_log, timeout=self.EXECUTE_TIMEOUT)
+
     def _generate_regist_command(self, item):
         """ generate the registration command(s)
 
@@ -598,7 +768,14 @@ class ImRegBenchmark(Experiment):
         :return dict:
         """
         # Update the registration outputs / paths
-        res_paths = self._extract_warped_image_landmarks(item)
+        if self._method_plugin is None:
+            res_paths = self._extract_warped_image_landmarks(item)
+        else:
+            # the in-process method exported its results already
+            res_paths = {
+                col: item[col]
+                for col in (self.COL_IMAGE_MOVE_WARP, self.COL_POINTS_MOVE_WARP) if isinstance(item.get(col), str)
+            }
 
         for col in (k for k in res_paths if res_paths[k] is not None):
             path = res_paths[col]
@@ -607,11 +784,17 @@ class ImRegBenchmark(Experiment):
             if os.path.isfile(self._absolute_path(path, destination='expt')):
                 item[col] = path
 
-        # Update the registration time
-        exec_time = self._extract_execution_time(item)
-        if exec_time:
-            # compute the registration time in minutes
-            item[self.COL_TIME] = exec_time
+        # Update the registration time, the in-process method reported it already
+        if self._method_plugin is None:
+            # the stages reported by the method wrapper, otherwise let the method extract its time
+            path_timing = os.path.join(self._get_path_reg_dir(item), self.NAME_FILE_TIMING)
+            timings = load_stage_timings(path_timing)
+            item = self._set_stage_timings(item, timings)
+            if 'registration' not in timings:
+                exec_time = self._extract_execution_time(item)
+                if exec_time:
+                    # compute the registration time in minutes
+                    item[self.COL_TIME] = exec_time
 
         return item
 
@@ -665,11 +848,11 @@ class ImRegBenchmark(Experiment):
         return img_diag
 
     @classmethod
-    def _load_landmarks(cls, item, path_dataset):
+    def _load_landmarks(cls, item, path_dataset, landmarks=None):
         path_img_ref, _, path_lnds_ref, path_lnds_move = \
             [update_path(item[col], pre_path=path_dataset) for col in cls.COVER_COLUMNS]
-        points_ref = load_landmarks(path_lnds_ref)
-        points_move = load_landmarks(path_lnds_move)
+        points_ref = _get_landmarks(path_lnds_ref, landmarks)
+        points_move = _get_landmarks(path_lnds_move, landmarks)
         return points_ref, points_move, path_img_ref
 
     @classmethod
@@ -680,6 +863,8 @@ class ImRegBenchmark(Experiment):
         path_dataset=None,
         path_experiment=None,
         path_reference=None,
+        path_cache=None,
+        landmarks=None,
     ):
         """ after successful registration load initial nad estimated landmarks
         afterwords compute various statistic for init, and final alignment
@@ -689,11 +874,14 @@ class ImRegBenchmark(Experiment):
         :param str|None path_dataset: path to the provided dataset folder
         :param str|None path_reference: path to the complete landmark collection folder
         :param str|None path_experiment: path to the experiment folder
+        :param str|None path_cache: path to folder with cached landmarks pairing
+        :param dict|None landmarks: already loaded dataset and reference landmarks,
+            see :func:`preload_landmarks`
         """
         idx, row = idx_row
         row = dict(row)  # convert even series to dictionary
         # load common landmarks and image size
-        points_ref, points_move, path_img_ref = cls._load_landmarks(row, path_dataset)
+        points_ref, points_move, path_img_ref = cls._load_landmarks(row, path_dataset, landmarks)
         img_diag = cls._image_diag(row, path_img_ref)
         df_experiments.loc[idx, cls.COL_IMAGE_DIAGONAL] = img_diag
 
@@ -715,8 +903,9 @@ class ImRegBenchmark(Experiment):
 
         # optional filtering
         if path_reference:
-            ratio, points_target, _ = \
-                filter_paired_landmarks(row, path_dataset, path_reference, col_source, col_target)
+            ratio, points_target, _ = filter_paired_landmarks(
+                row, path_dataset, path_reference, col_source, col_target, path_cache=path_cache, landmarks=landmarks
+            )
             df_experiments.loc[idx, COL_PAIRED_LANDMARKS] = np.round(ratio, 2)
 
         # load transformed landmarks
@@ -932,7 +1121,70 @@ def _df_drop_unnamed(df):
     return df
 
 
-def filter_paired_landmarks(item, path_dataset, path_reference, col_source, col_target):
+def _file_hash(path_file, block_size=2**20):
+    """ compute hash of the file content
+
+    :param str path_file: path to the file
+    :param int block_size: size of reading block
+    :return str: hash
+    """
+    hasher = hashlib.sha1()
+    with open(path_file, 'rb') as fp:
+        for block in iter(lambda: fp.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def preload_landmarks(paths):
+    """ load the landmarks and hash their files just once, so several evaluations
+    (e.g. of various submissions) can share them instead of reading them for each case
+
+    :param list(str) paths: paths to landmarks files, the missing ones are skipped
+    :return dict: {str: (ndarray, str)} landmarks and the file hash for each path
+
+    >>> path_lnds = os.path.join(update_path('data-images'), 'rat-kidney_', 'scale-5pc', 'Rat-Kidney_HE.csv')
+    >>> landmarks = preload_landmarks([path_lnds, path_lnds, './missing-landmarks.csv'])
+    >>> list(landmarks) == [path_lnds]
+    True
+    >>> np.array_equal(_get_landmarks(path_lnds, landmarks), load_landmarks(path_lnds))
+    True
+    """
+    return {p: (load_landmarks(p), _file_hash(p)) for p in set(paths) if os.path.isfile(p)}
+
+
+def _get_landmarks(path_file, landmarks=None):
+    """ get the preloaded landmarks or load them from the file
+
+    :param str path_file: path to landmarks file
+    :param dict|None landmarks: preloaded landmarks, see :func:`preload_landmarks`
+    :return ndarray: landmarks
+    """
+    if landmarks and path_file in landmarks:
+        return landmarks[path_file][0]
+    return load_landmarks(path_file)
+
+
+def _get_file_hash(path_file, landmarks=None):
+    """ get the hash of the preloaded landmarks or hash the file
+
+    :param str path_file: path to landmarks file
+    :param dict|None landmarks: preloaded landmarks, see :func:`preload_landmarks`
+    :return str: hash
+    """
+    if landmarks and path_file in landmarks:
+        return landmarks[path_file][1]
+    return _file_hash(path_file)
+
+
+def filter_paired_landmarks(
+    item,
+    path_dataset,
+    path_reference,
+    col_source,
+    col_target,
+    path_cache=None,
+    landmarks=None,
+):
     """ filter all relevant landmarks which were used and copy them to experiment
 
     The case is that in certain challenge stage users had provided just a subset
@@ -940,11 +1192,17 @@ def filter_paired_landmarks(item, path_dataset, path_reference, col_source, col_
      all user used (provided in dataset) landmarks and filter them from temporary
      reference dataset.
 
+    The pairing is optionally cached in a folder, keyed by content hashes of the provided
+    and reference landmarks, so it is reused for evaluating other submissions.
+
     :param dict|Series item: experiment DataFrame
     :param str path_dataset: path to provided landmarks
     :param str path_reference: path to the complete landmark collection
     :param str col_source: column name of landmarks to be transformed
     :param str col_target: column name of landmarks to be compared
+    :param str|None path_cache: path to folder with cached pairing, None means no caching
+    :param dict|None landmarks: already loaded dataset and reference landmarks,
+        see :func:`preload_landmarks`
     :return tuple(float,ndarray,ndarray): match ratio, filtered ref and move landmarks
 
     >>> p_data = update_path('data-images')
@@ -956,6 +1214,15 @@ def filter_paired_landmarks(item, path_dataset, path_reference, col_source, col_
     1.0
     >>> lnds_ref.shape == lnds_move.shape
     True
+    >>> for _ in range(2):
+    ...     ratio_, lnds_ref_, lnds_move_ = filter_paired_landmarks(dict(df.iloc[0]), p_data, p_data,
+    ...         ImRegBenchmark.COL_POINTS_MOVE, ImRegBenchmark.COL_POINTS_REF, path_cache='./cache-pairing')
+    ...     ratio_ == ratio, np.array_equal(lnds_ref_, lnds_ref), np.array_equal(lnds_move_, lnds_move)
+    (True, True, True)
+    (True, True, True)
+    >>> len(os.listdir('./cache-pairing'))
+    1
+    >>> shutil.rmtree('./cache-pairing')
     """
     path_ref = update_path(item[col_source], pre_path=path_reference)
     if not os.path.isfile(path_ref):
@@ -963,26 +1230,43 @@ def filter_paired_landmarks(item, path_dataset, path_reference, col_source, col_
     path_load = update_path(item[col_source], pre_path=path_dataset)
     if not os.path.isfile(path_load):
         raise FileNotFoundError('missing landmarks: %s' % path_load)
-    pairs = common_landmarks(load_landmarks(path_ref), load_landmarks(path_load), threshold=1)
-    if not pairs.size:
+    path_lnd_ref = update_path(item[col_target], pre_path=path_reference)
+    path_lnd_move = update_path(item[col_source], pre_path=path_reference)
+
+    path_pairing = None
+    if path_cache:
+        hashes = ''.join(_get_file_hash(p, landmarks) for p in (path_ref, path_load, path_lnd_ref))
+        path_pairing = os.path.join(path_cache, hashlib.sha1(hashes.encode()).hexdigest() + '.json')
+    if path_pairing and os.path.isfile(path_pairing):
+        with open(path_pairing, 'r') as fp:
+            pairing = json.load(fp)
+    else:
+        pairs = common_landmarks(_get_landmarks(path_ref, landmarks), _get_landmarks(path_load, landmarks), threshold=1)
+        pairs = sorted(pairs.tolist(), key=lambda p: p[1])
+        nb_common = min([len(_get_landmarks(p, landmarks)) for p in (path_lnd_ref, path_lnd_move)])
+        ind_ref = [int(p[0]) for p in pairs if p[0] < nb_common]
+        pairing = dict(nb_pairs=len(pairs), nb_common=nb_common, indexes=ind_ref)
+        if path_pairing:
+            create_folder(path_cache, ok_existing=True)
+            # write aside and move, so parallel evaluations do not read partial file
+            path_tmp = '%s.%i' % (path_pairing, os.getpid())
+            with open(path_tmp, 'w') as fp:
+                json.dump(pairing, fp)
+            os.rename(path_tmp, path_pairing)
+
+    if not pairing['nb_pairs']:
         logging.warning('there is not pairing between landmarks or dataset and user reference')
         return 0., np.empty([0]), np.empty([0])
 
-    pairs = sorted(pairs.tolist(), key=lambda p: p[1])
-    ind_ref = np.asarray(pairs)[:, 0]
-    nb_common = min([
-        len(load_landmarks(update_path(item[col], pre_path=path_reference))) for col in (col_target, col_source)
-    ])
-    ind_ref = ind_ref[ind_ref < nb_common]
+    ind_ref = np.array(pairing['indexes'], dtype=int)
+    lnds_filter_ref = _get_landmarks(path_lnd_ref, landmarks)[ind_ref]
+    lnds_filter_move = _get_landmarks(path_lnd_move, landmarks)[ind_ref]
 
-    path_lnd_ref = update_path(item[col_target], pre_path=path_reference)
-    lnds_filter_ref = load_landmarks(path_lnd_ref)[ind_ref]
-    path_lnd_move = update_path(item[col_source], pre_path=path_reference)
-    lnds_filter_move = load_landmarks(path_lnd_move)[ind_ref]
-
-    ratio_matches = len(ind_ref) / float(nb_common)
+    ratio_matches = len(ind_ref) / float(pairing['nb_common'])
     if ratio_matches > 1:
-        raise ValueError('suspicious ratio for %i paired and %i common landmarks' % (len(pairs), nb_common))
+        raise ValueError(
+            'suspicious ratio for %i paired and %i common landmarks' % (pairing['nb_pairs'], pairing['nb_common'])
+        )
     return ratio_matches, lnds_filter_ref, lnds_filter_move
 
 
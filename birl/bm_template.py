@@ -44,7 +44,7 @@ class BmTemplate(ImRegBenchmark):
      * `_prepare_img_registration`
      * `_execute_img_registration`/`_generate_regist_command`
      * `_extract_warped_image_landmarks`
-     * `_extract_execution_time`
+     * `_extract_execution_time` (used only if the method does not write `NAME_FILE_TIMING`)
      * `_clear_after_registration`
 
     .. note:: The actual implementation simulates the "WORSE" registration while
@@ -1,21 +1,96 @@
+import importlib
 import os
 import subprocess
-from distutils.version import LooseVersion
+import sys
+import types
 
-try:
-    import matplotlib
-except ImportError:
+#: check whether the display works, it is performed only if some display is set
+CMD_TRY_MATPLOTLIB = 'python -c "from matplotlib import pyplot; pyplot.close(pyplot.figure())"'
+
+
+def is_module_available(name):
+    """ check whether a module can be imported without importing it
+
+    :param str name: full name of a top level module
+    :return bool:
+
+    >>> is_module_available('json'), is_module_available('some_missing_module')
+    (True, False)
+    """
+    try:
+        from importlib.util import find_spec
+    except ImportError:  # python 2
+        from pkgutil import find_loader as find_spec
+    return find_spec(name) is not None
+
+
+if not is_module_available('matplotlib'):
     print('Package `matplotlib` which shall be configured are missing...')
-else:
-    CMD_TRY_MATPLOTLIB = 'python -c "from matplotlib import pyplot; pyplot.close(pyplot.figure())"'
-    # in case you are running on machine without display, e.g. server
-    if not os.environ.get('DISPLAY', '') and matplotlib.rcParams['backend'] != 'agg':
+# in case you are running on machine without display, e.g. server
+elif not os.environ.get('DISPLAY', ''):
+    # set just the backend so the matplotlib is not imported before it is really needed
+    if 'matplotlib' in sys.modules:
+        if sys.modules['matplotlib'].get_backend().lower() != 'agg':
+            print('No display found. Using non-interactive Agg backend')
+            sys.modules['matplotlib'].use('Agg')
+    elif os.environ.get('MPLBACKEND', '').lower() != 'agg':
         print('No display found. Using non-interactive Agg backend')
-        matplotlib.use('Agg')
-    # _tkinter.TclError: couldn't connect to display "localhost:10.0"
-    elif subprocess.call(CMD_TRY_MATPLOTLIB, stdout=None, stderr=None, shell=True):
-        print('Problem with display. Using non-interactive Agg backend')
-        matplotlib.use('Agg')
+        os.environ['MPLBACKEND'] = 'Agg'
+# _tkinter.TclError: couldn't connect to display "localhost:10.0"
+elif subprocess.call(CMD_TRY_MATPLOTLIB, stdout=None, stderr=None, shell=True):
+    import matplotlib
+    print('Problem with display. Using non-interactive Agg backend')
+    matplotlib.use('Agg')
+
+
+class LazyModule(types.ModuleType):
+    """ Proxy of a module which is imported on the first access to its attributes,
+    so the heavy backends (e.g. OpenCV, SimpleITK or matplotlib) are loaded only if they are used
+
+    >>> json = LazyModule('json')
+    >>> json
+    <LazyModule 'json' (not loaded)>
+    >>> json.dumps({'a': 1})
+    '{"a": 1}'
+    >>> json
+    <LazyModule 'json' (loaded)>
+    """
+
+    def __init__(self, name):
+        """ create the proxy
+
+        :param str name: full name of the module, e.g. `skimage.color`
+        """
+        super(LazyModule, self).__init__(name)
+        # private names, so they do not hide any attribute of the wrapped module
+        self.__module = None
+
+    def __load(self):
+        """ import the module, repeated calls just return the already imported module
+
+        :return module: imported module
+        """
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name__)
+        return self.__module
+
+    def __getattr__(self, name):
+        # called only for attributes which are not set on the proxy itself
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        return getattr(self.__load(), name)
+
+    def __reduce__(self):
+        # the module itself is not picklable, so the proxy is recreated in the other process
+        return type(self), (self.__name__, )
+
+    def __dir__(self):
+        return dir(self.__load())
+
+    def __repr__(self):
+        state = 'not loaded' if self.__module is None else 'loaded'
+        return '<%s %r (%s)>' % (type(self).__name__, self.__name__, state)
+
 
 try:
     import numpy as np
@@ -23,7 +98,7 @@ except ImportError:
     print('Package `numpy` which shall be configured are missing...')
 else:
     # comparing strings does not work for version lower 1.10
-    if LooseVersion(np.version.full_version) >= LooseVersion('1.14'):
+    if np.lib.NumpyVersion(np.version.full_version) >= '1.14.0':
         # np.set_printoptions(sign='legacy')
         np.set_printoptions(legacy='1.13')
 
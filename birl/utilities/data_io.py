@@ -4,25 +4,52 @@ Useful function for managing Input/Output
 Copyright (C) 2017-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 """
 
+import json
 import logging
 import os
 import warnings
 from functools import wraps
 
-import cv2 as cv
-import nibabel
 import numpy as np
 import pandas as pd
-import SimpleITK as sitk
-import yaml
 from PIL import Image
-from skimage.color import gray2rgb, rgb2gray
+
+from birl.utilities import LazyModule
+
+# the backends are heavy to import, so each of them is imported with its first use
+#: image resizing, see :func:`image_resize`
+cv = LazyModule('cv2')
+#: NIfTI images, see :func:`convert_image_to_nifti`
+nibabel = LazyModule('nibabel')
+#: MetaImage (MHD) images, see :func:`convert_image_from_mhd`
+sitk = LazyModule('SimpleITK')
+#: configuration files, see :func:`load_config_yaml`
+yaml = LazyModule('yaml')
+#: colour conversions, see :func:`load_image`
+sk_color = LazyModule('skimage.color')
 
 #: landmarks coordinates, loading from CSV file
 LANDMARK_COORDS = ['X', 'Y']
 # PIL.Image.DecompressionBombError: could be decompression bomb DOS attack.
 # SEE: https://gitlab.mister-muffin.de/josch/img2pdf/issues/42
 Image.MAX_IMAGE_PIXELS = None
+#: maximal number of resolved paths memorised by :func:`update_path` in each process
+UPDATE_PATH_CACHE_SIZE = 2**16
+#: memorised paths found by :func:`_find_upper_path` in this process
+_UPDATE_PATH_CACHE = {}
+#: numpy types for MetaImage (MHD) element types
+MHD_ELEMENT_TYPES = {
+    'MET_UCHAR': 'u1',
+    'MET_CHAR': 'i1',
+    'MET_USHORT': 'u2',
+    'MET_SHORT': 'i2',
+    'MET_UINT': 'u4',
+    'MET_INT': 'i4',
+    'MET_ULONG_LONG': 'u8',
+    'MET_LONG_LONG': 'i8',
+    'MET_FLOAT': 'f4',
+    'MET_DOUBLE': 'f8',
+}
 
 
 def create_folder(path_folder, ok_existing=True):
@@ -215,7 +242,61 @@ def save_landmarks_csv(path_file, landmarks):
     return path_file
 
 
-def update_path(a_path, pre_path=None, lim_depth=5, absolute=True):
+def _find_upper_path(path_, lim_depth, path_cwd=None, use_cache=True):
+    """ bubble in the folder tree up until it found desired path
+
+    The found paths are memorised (per process), the missing ones are not memorised
+    so they are searched again next time, e.g. after creating them.
+    A memorised path which does not exist anymore is dropped and searched again.
+    The working directory is a part of the cache key as the search is relative to it.
+
+    :param str path_: original path
+    :param int lim_depth: max depth of going up in the folder tree
+    :param str|None path_cwd: current working directory
+    :param bool use_cache: reuse and memorise the found path
+    :return str|None: existing path or None if it was not found
+
+    >>> path_file = './sample-cached-path.txt'
+    >>> open(path_file, 'w').close()
+    >>> _find_upper_path(path_file, 1)
+    'sample-cached-path.txt'
+    >>> os.remove(path_file)
+    >>> _find_upper_path(path_file, 1) is None
+    True
+    """
+    key = (path_, lim_depth, path_cwd)
+    if use_cache and key in _UPDATE_PATH_CACHE:
+        if os.path.exists(_UPDATE_PATH_CACHE[key]):
+            return _UPDATE_PATH_CACHE[key]
+        _UPDATE_PATH_CACHE.pop(key, None)
+    tmp_path = path_[2:] if path_.startswith('./') else path_
+    for _ in range(lim_depth):
+        if os.path.exists(tmp_path):
+            if use_cache:
+                # simple bound of the memory, start over with the cache once it is full
+                if len(_UPDATE_PATH_CACHE) >= UPDATE_PATH_CACHE_SIZE:
+                    _UPDATE_PATH_CACHE.clear()
+                _UPDATE_PATH_CACHE[key] = tmp_path
+            return tmp_path
+        tmp_path = os.path.join('..', tmp_path)
+    return None
+
+
+def clear_update_path_cache():
+    """ invalidate memorised paths of :func:`update_path`,
+    call it after creating files which shall be found instead of the memorised ones
+
+    >>> _ = update_path('./birl')
+    >>> len(_UPDATE_PATH_CACHE) > 0
+    True
+    >>> clear_update_path_cache()
+    >>> len(_UPDATE_PATH_CACHE)
+    0
+    """
+    _UPDATE_PATH_CACHE.clear()
+
+
+def update_path(a_path, pre_path=None, lim_depth=5, absolute=True, use_cache=True):
     """ bubble in the folder tree up until it found desired file
     otherwise return original one
 
@@ -223,6 +304,7 @@ def update_path(a_path, pre_path=None, lim_depth=5, absolute=True):
     :param str|None base_path: special case when you want to add something before
     :param int lim_depth: max depth of going up in the folder tree
     :param bool absolute: format as absolute path
+    :param bool use_cache: reuse already found paths, see :func:`clear_update_path_cache`
     :return str: updated path if it exists otherwise the original one
 
     >>> os.path.exists(update_path('./birl', absolute=False))
@@ -231,6 +313,8 @@ def update_path(a_path, pre_path=None, lim_depth=5, absolute=True):
     True
     >>> os.path.exists(update_path('~', absolute=False))
     True
+    >>> update_path('./birl', use_cache=False) == update_path('./birl')
+    True
     """
     path_ = str(a_path)
     if path_.startswith('/'):
@@ -241,12 +325,9 @@ def update_path(a_path, pre_path=None, lim_depth=5, absolute=True):
     elif pre_path:
         path_ = os.path.join(pre_path, path_)
 
-    tmp_path = path_[2:] if path_.startswith('./') else path_
-    for _ in range(lim_depth):
-        if os.path.exists(tmp_path):
-            path_ = tmp_path
-            break
-        tmp_path = os.path.join('..', tmp_path)
+    found_path = _find_upper_path(path_, lim_depth, os.getcwd(), use_cache=use_cache)
+    if found_path is not None:
+        path_ = found_path
 
     if absolute:
         path_ = os.path.abspath(path_)
@@ -318,7 +399,7 @@ def load_image(path_image, force_rgb=True):
         image = image / 255.
     if force_rgb and (image.ndim == 2 or image.shape[2] == 1):
         image = image[:, :, 0] if image.ndim == 3 else image
-        image = gray2rgb(image)
+        image = sk_color.gray2rgb(image)
     return image.astype(np.float32)
 
 
@@ -362,12 +443,48 @@ def save_image(path_image, image):
     image.save(path_image)
 
 
+def _image_to_dtype(img, dtype=np.uint8):
+    """ convert image in range (0, 1) to given type, integer types are scaled to range (0, 255)
+
+    :param ndarray img: input image
+    :param dtype: output image type
+    :return ndarray: image
+
+    >>> _image_to_dtype(np.array([0., 0.5, 1.]))
+    array([  0, 128, 255], dtype=uint8)
+    >>> _image_to_dtype(np.array([0., 0.5, 1.]), dtype=np.float32)
+    array([ 0. ,  0.5,  1. ], dtype=float32)
+    """
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        img = np.clip(np.round(img * 255), a_min=0, a_max=255)
+    return img.astype(dtype)
+
+
+def _save_nifti(path_image, img, path_out_dir=None, dtype=np.uint8, compress=False):
+    """ save image into NIfTI next to the source image
+
+    :param str path_image: path to the source image
+    :param ndarray img: image in range (0, 1)
+    :param str path_out_dir: path to output folder
+    :param dtype: voxel type, `uint8` or `float32`
+    :param bool compress: use gzip, otherwise save raw data which can be memory mapped
+    :return str: resulted image
+    """
+    path_img_out = _gene_out_path(path_image, '.nii.gz' if compress else '.nii', path_out_dir)
+    logging.debug('Convert image to Nifti format "%s" ->  "%s"', path_image, path_img_out)
+    nim = nibabel.Nifti1Image(_image_to_dtype(img, dtype), np.eye(4))
+    nibabel.save(nim, path_img_out)
+    return path_img_out
+
+
 @io_image_decorate
-def convert_image_to_nifti(path_image, path_out_dir=None):
+def convert_image_to_nifti(path_image, path_out_dir=None, dtype=np.uint8, compress=False):
     """ converting normal image to Nifty Image
 
     :param str path_image: input image
     :param str path_out_dir: path to output folder
+    :param dtype: voxel type, `uint8` in range (0, 255) or `float32` in range (0, 1)
+    :param bool compress: use gzip, otherwise save raw data which can be memory mapped
     :return str: resulted image
 
     >>> path_img = os.path.join(update_path('data-images'), 'images',
@@ -384,31 +501,25 @@ def convert_image_to_nifti(path_image, path_out_dir=None):
     [...]
     """
     path_image = update_path(path_image)
-    path_img_out = _gene_out_path(path_image, '.nii', path_out_dir)
-    logging.debug('Convert image to Nifti format "%s" ->  "%s"', path_image, path_img_out)
-
-    # img = Image.open(path_file).convert('LA')
-    img = load_image(path_image)
-    nim = nibabel.Nifti1Pair(img, np.eye(4))
-    del img
-    nibabel.save(nim, path_img_out)
-
-    return path_img_out
+    return _save_nifti(path_image, load_image(path_image), path_out_dir, dtype=dtype, compress=compress)
 
 
 @io_image_decorate
-def convert_image_to_nifti_gray(path_image, path_out_dir=None):
+def convert_image_to_nifti_gray(path_image, path_out_dir=None, dtype=np.uint8, compress=False):
     """ converting normal image to Nifty Image
 
     :param str path_image: input image
     :param str path_out_dir: path to output folder
+    :param dtype: voxel type, `uint8` in range (0, 255) or `float32` in range (0, 1)
+    :param bool compress: use gzip, otherwise save raw data which can be memory mapped
     :return str: resulted image
 
     >>> path_img = './sample-image.png'
     >>> save_image(path_img, np.zeros((100, 200, 3)))
     >>> path_img2 = convert_image_to_nifti_gray(path_img)
-    >>> os.path.isfile(path_img2)
-    True
+    >>> nim = nibabel.load(path_img2)
+    >>> nim.shape, nim.get_data_dtype()
+    ((200, 100), dtype('uint8'))
     >>> path_img3 = convert_image_from_nifti(path_img2, '.')
     >>> os.path.isfile(path_img3)
     True
@@ -416,16 +527,10 @@ def convert_image_to_nifti_gray(path_image, path_out_dir=None):
     [...]
     """
     path_image = update_path(path_image)
-    path_img_out = _gene_out_path(path_image, '.nii', path_out_dir)
-    logging.debug('Convert image to Nifti format "%s" ->  "%s"', path_image, path_img_out)
-
-    # img = Image.open(path_file).convert('LA')
-    img = rgb2gray(load_image(path_image))
-    nim = nibabel.Nifti1Pair(np.swapaxes(img, 1, 0), np.eye(4))
-    del img
-    nibabel.save(nim, path_img_out)
-
-    return path_img_out
+    img = load_image(path_image, force_rgb=False)
+    if img.ndim == 3:
+        img = sk_color.rgb2gray(img)
+    return _save_nifti(path_image, np.swapaxes(img, 1, 0), path_out_dir, dtype=dtype, compress=compress)
 
 
 def _gene_out_path(path_file, file_ext, path_out_dir=None):
@@ -454,12 +559,11 @@ def convert_image_from_nifti(path_image, path_out_dir=None):
     path_image = update_path(path_image)
     path_img_out = _gene_out_path(path_image, '.jpg', path_out_dir)
     logging.debug('Convert Nifti to image format "%s" ->  "%s"', path_image, path_img_out)
-    nim = nibabel.load(path_image)
+    # uncompressed data are memory mapped, the compressed are decompressed just once
+    img = np.asanyarray(nibabel.load(path_image, mmap='r').dataobj)
 
-    if len(nim.get_data().shape) > 2:  # colour
-        img = nim.get_data()
-    else:  # gray
-        img = np.swapaxes(nim.get_data(), 1, 0)
+    if img.ndim == 2:  # gray
+        img = np.swapaxes(img, 1, 0)
 
     if img.max() > 1.5:
         img = img / 255.
@@ -527,14 +631,14 @@ def convert_image_from_mhd(path_image, path_out_dir=None, img_ext='.png', scalin
     path_image = update_path(path_image)
     if not os.path.isfile(path_image):
         raise FileNotFoundError('missing image: %s' % path_image)
-    # Reads the image using SimpleITK
-    itk_image = sitk.ReadImage(path_image)
-
-    # Convert the image to a numpy array first and then shuffle the dimensions
-    # to get axis in the order z,y,x
-    img = sitk.GetArrayFromImage(itk_image)
-    # Scaling image if requested
-    img = image_resize(img, scaling, v_range=255)
+    try:
+        # map the RAW data directly, axis are already in the order z,y,x
+        img, _ = load_mhd_memmap(path_image)
+    except (ValueError, KeyError):
+        logging.debug('MHD can not be mapped, reading by SimpleITK: %s', path_image)
+        img = sitk.GetArrayFromImage(sitk.ReadImage(path_image))
+    # take a copy, so the mapped file is never changed
+    img = image_resize(np.array(img), scaling, v_range=255)
 
     # define output/destination path
     path_image = _gene_out_path(path_image, img_ext, path_out_dir)
@@ -567,23 +671,265 @@ def convert_image_to_mhd(path_image, path_out_dir=None, to_gray=True, overwrite=
         logging.debug('skip converting since the image exists and no-overwrite: %s', path_image_new)
         return path_image_new
 
-    img = load_image(path_image)
+    img = load_image(path_image, force_rgb=not to_gray)
     # if required and RGB on input convert to gray-scale
     if to_gray and img.ndim == 3 and img.shape[2] in (3, 4):
-        img = rgb2gray(img)
+        img = sk_color.rgb2gray(img)
     # Scaling image if requested
-    scaling = 1. / scaling
+    scaling = 1. / scaling if scaling else 1.
     # the MHD usually require pixel value range (0, 255)
-    img = image_resize(img, scaling, v_range=255)
+    img = image_resize(img, scaling, v_range=255, dtype=None)
+    # the resize skips the identity scaling, so the image is still in range (0, 1)
+    if scaling == 1:
+        img = np.round(img * 255)
 
     logging.debug('exporting image of size: %r', img.shape)
-    image = sitk.GetImageFromArray(img.astype(np.uint8), isVector=False)
-
     # do not use text in MHD, othwerwise it crash DROP method
-    sitk.WriteImage(image, path_image_new, False)
+    save_mhd_raw(path_image_new, np.clip(img, a_min=0, a_max=255).astype(np.uint8))
     return path_image_new
 
 
+def load_mhd_header(path_mhd):
+    """ load header of MetaImage (MHD) as dictionary of string values
+
+    :param str path_mhd: path to the MHD file
+    :return dict: header fields
+    """
+    header = {}
+    with open(path_mhd, 'rb') as fp:
+        for line in fp:
+            if b'=' not in line:
+                break
+            key, val = line.decode('ascii', errors='replace').split('=', 1)
+            header[key.strip()] = val.strip()
+            # the local data follows right after this field
+            if key.strip() == 'ElementDataFile':
+                break
+    return header
+
+
+def load_mhd_memmap(path_mhd):
+    """ memory map the raw data of MetaImage (MHD) without loading it
+
+    Only uncompressed single-file data is supported, otherwise it raises ValueError.
+
+    :param str path_mhd: path to the MHD file
+    :return tuple(ndarray,tuple(float)): memory mapped data np.array<[depth,] height, width[, channels]>
+        and spacing (X, Y[, Z])
+
+    >>> img = np.arange(12, dtype=np.float32).reshape(3, 4)
+    >>> sitk.WriteImage(sitk.GetImageFromArray(img), './sample-field.mhd', False)
+    >>> data, spacing = load_mhd_memmap('./sample-field.mhd')
+    >>> data.shape, spacing
+    ((3, 4), (1.0, 1.0))
+    >>> np.array_equal(data, img)
+    True
+    >>> del data
+    >>> list(map(os.remove, ['./sample-field.mhd', './sample-field.raw']))  # doctest: +ELLIPSIS
+    [...]
+    >>> with open('./sample-local.mhd', 'wb') as fp:
+    ...     _ = fp.write(b'NDims = 2\\nDimSize = 4 3\\nElementType = MET_FLOAT\\nElementDataFile = LOCAL\\n')
+    ...     _ = fp.write(img.astype('<f4').tobytes())
+    >>> data, _ = load_mhd_memmap('./sample-local.mhd')
+    >>> np.array_equal(data, img)
+    True
+    >>> del data
+    >>> os.remove('./sample-local.mhd')
+    """
+    header = load_mhd_header(path_mhd)
+    if header.get('CompressedData', 'False').lower() == 'true':
+        raise ValueError('compressed data can not be mapped: %s' % path_mhd)
+    if header.get('ElementType') not in MHD_ELEMENT_TYPES:
+        raise ValueError('not supported element type "%s" in: %s' % (header.get('ElementType'), path_mhd))
+    name_data = header.get('ElementDataFile', '')
+    if name_data.startswith('LIST') or '%' in name_data:
+        raise ValueError('multi-file data can not be mapped: %s' % path_mhd)
+
+    shape = tuple(int(d) for d in header['DimSize'].split())[::-1]
+    nb_channels = int(header.get('ElementNumberOfChannels', 1))
+    if nb_channels > 1:
+        shape += (nb_channels, )
+    byte_order = header.get('BinaryDataByteOrderMSB', header.get('ElementByteOrderMSB', 'False'))
+    dtype = np.dtype(('>' if byte_order.lower() == 'true' else '<') + MHD_ELEMENT_TYPES[header['ElementType']])
+    if name_data == 'LOCAL':
+        path_data, offset = path_mhd, None
+        # reading by lines, the file iteration in python 2 reads ahead so the position would be wrong
+        with open(path_mhd, 'rb') as fp:
+            line = fp.readline()
+            while line:
+                if line.split(b'=')[0].strip() == b'ElementDataFile':
+                    offset = fp.tell()
+                    break
+                line = fp.readline()
+    else:
+        path_data = os.path.join(os.path.dirname(path_mhd), name_data)
+        offset = int(header.get('HeaderSize', 0))
+        # the data are at the end of the file
+        if offset < 0:
+            offset = os.path.getsize(path_data) - int(np.prod(shape)) * dtype.itemsize
+
+    spacing = header.get('ElementSpacing', header.get('ElementSize', ' '.join(['1'] * len(shape))))
+    data = np.memmap(path_data, dtype=dtype, mode='r', offset=offset, shape=shape)
+    return data, tuple(float(s) for s in spacing.split())
+
+
+def save_mhd_raw(path_mhd, image, spacing=None):
+    """ save image as MetaImage (MHD) header and uncompressed RAW data written straight from the image buffer
+
+    :param str path_mhd: path to the MHD file, the RAW data are saved next to it
+    :param ndarray image: image np.array<height, width[, channels]>
+    :param tuple(float)|None spacing: pixel spacing (X, Y)
+    :return str: path to the MHD file
+
+    >>> img = np.arange(24, dtype=np.uint8).reshape(2, 4, 3)
+    >>> save_mhd_raw('./sample-image.mhd', img)
+    './sample-image.mhd'
+    >>> np.array_equal(sitk.GetArrayFromImage(sitk.ReadImage('./sample-image.mhd')), img)
+    True
+    >>> data, spacing = load_mhd_memmap('./sample-image.mhd')
+    >>> np.array_equal(data, img), spacing
+    (True, (1.0, 1.0))
+    >>> del data
+    >>> list(map(os.remove, ['./sample-image.mhd', './sample-image.raw']))  # doctest: +ELLIPSIS
+    [...]
+    """
+    # the RAW data are always saved in little-endian byte order
+    image = np.ascontiguousarray(image, dtype=image.dtype.newbyteorder('<'))
+    types = {np.dtype(tp): name for name, tp in MHD_ELEMENT_TYPES.items()}
+    if image.dtype not in types or image.ndim not in (2, 3):
+        raise ValueError('not supported image %r of type "%s"' % (image.shape, image.dtype))
+    if spacing is None:
+        spacing = (1, 1)
+
+    name_raw = os.path.splitext(os.path.basename(path_mhd))[0] + '.raw'
+    image.tofile(os.path.join(os.path.dirname(path_mhd), name_raw))
+    header = [
+        ('ObjectType', 'Image'),
+        ('NDims', 2),
+        ('BinaryData', 'True'),
+        ('BinaryDataByteOrderMSB', 'False'),
+        ('CompressedData', 'False'),
+        ('TransformMatrix', '1 0 0 1'),
+        ('Offset', '0 0'),
+        ('CenterOfRotation', '0 0'),
+        ('ElementSpacing', ' '.join('%g' % s for s in spacing)),
+        ('DimSize', '%i %i' % (image.shape[1], image.shape[0])),
+    ]
+    if image.ndim == 3:
+        header.append(('ElementNumberOfChannels', image.shape[2]))
+    header += [('ElementType', types[image.dtype]), ('ElementDataFile', name_raw)]
+    with open(path_mhd, 'w') as fp:
+        fp.write(''.join('%s = %s\n' % hd for hd in header))
+    return path_mhd
+
+
+class _NiftiRows(object):
+    """ lazy access to rows of 2D (compressed) NIfTI image, reading just the band of requested rows
+
+    >>> img = np.arange(12, dtype=np.float32).reshape(3, 4)
+    >>> nibabel.save(nibabel.Nifti1Image(img.T[..., np.newaxis], np.eye(4)), './sample-field.nii.gz')
+    >>> rows = _NiftiRows(nibabel.load('./sample-field.nii.gz').dataobj)
+    >>> rows.shape
+    (3, 4)
+    >>> rows[[2, 1]]
+    array([[  8.,   9.,  10.,  11.],
+           [  4.,   5.,   6.,   7.]], dtype=float32)
+    >>> os.remove('./sample-field.nii.gz')
+    """
+
+    def __init__(self, dataobj):
+        """ wrap NIfTI data with axis ordered as X, Y[, Z]
+
+        :param dataobj: nibabel array proxy
+        """
+        self._dataobj = dataobj
+        self.shape = tuple(dataobj.shape[:2][::-1])
+
+    def __getitem__(self, rows):
+        rows = np.asarray(rows, dtype=int)
+        # the rows are contiguous in the file, so read them at once as one band
+        slices = (slice(None), slice(rows.min(), rows.max() + 1)) + (0, ) * (len(self._dataobj.shape) - 2)
+        band = np.asarray(self._dataobj[slices]).T
+        return band[rows - rows.min()]
+
+
+def load_image_lazy(path_image):
+    """ open 2D image (e.g. deformation field) without loading all data
+
+    Raw MHD and uncompressed NIfTI are memory mapped, compressed NIfTI is read just by needed rows
+    and other formats are loaded by SimpleITK.
+
+    :param str path_image: path to the image
+    :return tuple(ndarray,tuple(float)): image as np.array<height, width> (or lazy rows access)
+        and spacing (X, Y)
+
+    >>> img = np.arange(12, dtype=np.float32).reshape(3, 4)
+    >>> nibabel.save(nibabel.Nifti1Image(img.T[..., np.newaxis], np.diag([2, 3, 1, 1])), './sample-field.nii')
+    >>> data, spacing = load_image_lazy('./sample-field.nii')
+    >>> np.array_equal(data, img), spacing
+    (True, (2.0, 3.0))
+    >>> del data
+    >>> os.remove('./sample-field.nii')
+    """
+    if path_image.endswith('.mhd'):
+        try:
+            data, spacing = load_mhd_memmap(path_image)
+            return data.reshape(data.shape[-2:]), spacing[:2]
+        except (ValueError, KeyError):
+            logging.debug('MHD can not be mapped, loading: %s', path_image)
+    elif path_image.endswith('.nii'):
+        nim = nibabel.load(path_image, mmap='r')
+        # NIfTI has axis ordered as X, Y[, Z], transpose is just a view
+        data = np.asanyarray(nim.dataobj)
+        data = data.reshape(data.shape[:2]).T
+        return data, tuple(float(s) for s in nim.header.get_zooms()[:2])
+    elif path_image.endswith('.nii.gz'):
+        nim = nibabel.load(path_image)
+        return _NiftiRows(nim.dataobj), tuple(float(s) for s in nim.header.get_zooms()[:2])
+    itk_image = sitk.ReadImage(path_image)
+    data = sitk.GetArrayFromImage(itk_image)
+    return data.reshape(data.shape[-2:]), itk_image.GetSpacing()[:2]
+
+
+def sample_image_points(image, points, bilinear=True):
+    """ sample image values at given points, it touches only the image rows around the points,
+    so it is cheap for memory mapped images
+
+    :param ndarray image: image np.array<height, width>
+    :param ndarray points: points (X, Y) np.array<nb_points, 2>
+    :param bool bilinear: use bilinear interpolation, otherwise the nearest pixel
+    :return ndarray: sampled values
+
+    >>> img = np.arange(12, dtype=float).reshape(3, 4)
+    >>> sample_image_points(img, [[0, 0], [1.5, 0.5], [3, 2], [2.6, 1.2]])
+    array([  0. ,   3.5,  11. ,   7.4])
+    >>> sample_image_points(img, [[0, 0], [1.5, 0.5], [3, 2], [2.6, 1.2]], bilinear=False)
+    array([  0.,   2.,  11.,   7.])
+    """
+    points = np.asarray(points, dtype=float)
+    height, width = image.shape[:2]
+    if not bilinear:
+        cols = np.clip(np.round(points[:, 0]).astype(int), 0, width - 1)
+        rows = np.clip(np.round(points[:, 1]).astype(int), 0, height - 1)
+        rows_uq, rows_idx = np.unique(rows, return_inverse=True)
+        return np.asarray(image[rows_uq])[rows_idx, cols]
+
+    pts_x = np.clip(points[:, 0], 0, width - 1)
+    pts_y = np.clip(points[:, 1], 0, height - 1)
+    cols0 = np.minimum(np.floor(pts_x).astype(int), max(width - 2, 0))
+    rows0 = np.minimum(np.floor(pts_y).astype(int), max(height - 2, 0))
+    cols1 = np.minimum(cols0 + 1, width - 1)
+    rows1 = np.minimum(rows0 + 1, height - 1)
+    # read only the needed rows
+    rows_uq, rows_idx = np.unique(np.concatenate([rows0, rows1]), return_inverse=True)
+    rows_data = np.asarray(image[rows_uq], dtype=float)
+    idx0, idx1 = rows_idx[:len(points)], rows_idx[len(points):]
+    dx, dy = pts_x - cols0, pts_y - rows0
+    vals_0 = rows_data[idx0, cols0] * (1 - dx) + rows_data[idx0, cols1] * dx
+    vals_1 = rows_data[idx1, cols0] * (1 - dx) + rows_data[idx1, cols1] * dx
+    return vals_0 * (1 - dy) + vals_1 * dy
+
+
 def load_config_args(path_config, comment='#'):
     """load config arguments from file with dropping comments
 
@@ -640,3 +986,62 @@ def save_config_yaml(path_config, config):
     """
     with open(path_config, 'w') as fp:
         yaml.dump(config, fp, default_flow_style=False)
+
+
+def save_stage_timing(path_file, stage, start, end, cpu=None):
+    """ append timing of a single stage as a JSON line to the timing sidecar
+
+    Each line is a record ``{"stage": str, "start": float, "end": float, "cpu": float}``
+    with the wall-clock start and end as UNIX time stamps and optional CPU time, all in seconds.
+    Any method wrapper (e.g. R or Python script) can write these lines by its own.
+
+    :param str path_file: path to the timing sidecar
+    :param str stage: name of the stage, e.g. `registration`
+    :param float start: stage start, UNIX time stamp in seconds
+    :param float end: stage end, UNIX time stamp in seconds
+    :param float|None cpu: CPU time spent in the stage in seconds
+    """
+    record = {'stage': stage, 'start': start, 'end': end}
+    if cpu is not None:
+        record['cpu'] = cpu
+    with open(path_file, 'a') as fp:
+        fp.write(json.dumps(record) + '\n')
+
+
+def load_stage_timings(path_file):
+    """ parse the timing sidecar line by line and sum the times of each stage,
+    invalid lines (e.g. from interrupted writing) are skipped
+
+    :param str path_file: path to the timing sidecar
+    :return dict: {str: {str: float}} time and optional CPU time in seconds for each stage
+
+    >>> path_timing = './sample-timing.jsonl'
+    >>> save_stage_timing(path_timing, 'registration', 10., 70., cpu=110.)
+    >>> save_stage_timing(path_timing, 'loading', 0., 4.5)
+    >>> save_stage_timing(path_timing, 'registration', 80., 95.)
+    >>> with open(path_timing, 'a') as fp:
+    ...     _ = fp.write('{"stage": "warping", "start": 9')
+    >>> sorted(load_stage_timings(path_timing).items())
+    [('loading', {'time': 4.5}), ('registration', {'time': 75.0, 'cpu': 110.0})]
+    >>> os.remove(path_timing)
+    >>> load_stage_timings(path_timing)
+    {}
+    """
+    timings = {}
+    if not os.path.isfile(path_file):
+        return timings
+    with open(path_file, 'r') as fp:
+        for line in fp:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                stage, t_exec = record['stage'], float(record['end']) - float(record['start'])
+            except (ValueError, KeyError, TypeError):
+                logging.warning('skip invalid timing record in "%s": %r', path_file, line)
+                continue
+            stage_times = timings.setdefault(stage, {})
+            stage_times['time'] = stage_times.get('time', 0.) + t_exec
+            if record.get('cpu') is not None:
+                stage_times['cpu'] = stage_times.get('cpu', 0.) + float(record['cpu'])
+    return timings
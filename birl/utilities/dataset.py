@@ -5,29 +5,27 @@ Copyright (C) 2016-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 """
 
 import glob
+import hashlib
+import heapq
+import json
 import logging
 import os
 import re
 
-import matplotlib.pyplot as plt
 import numpy as np
-from cv2 import (
-    COLOR_RGB2BGR,
-    COLOR_RGBA2RGB,
-    cvtColor,
-    GaussianBlur,
-    imwrite,
-    IMWRITE_JPEG_QUALITY,
-    IMWRITE_PNG_COMPRESSION,
-    INTER_LINEAR,
-    resize,
-)
-from matplotlib.path import Path
 from PIL import Image
-from scipy import optimize, spatial
-from skimage.color import hed2rgb, hsv2rgb, lab2lch, lab2rgb, lch2lab, luv2rgb, rgb2hed, rgb2hsv, rgb2lab, rgb2luv
-from skimage.exposure import rescale_intensity
-from skimage.filters import threshold_otsu
+
+from birl.utilities import LazyModule
+
+# the heavy backends are imported with their first use, e.g. only parsing paths do not need any of them
+cv = LazyModule('cv2')
+plt = LazyModule('matplotlib.pyplot')
+mpl_path = LazyModule('matplotlib.path')
+optimize = LazyModule('scipy.optimize')
+spatial = LazyModule('scipy.spatial')
+sk_color = LazyModule('skimage.color')
+sk_exposure = LazyModule('skimage.exposure')
+sk_filters = LazyModule('skimage.filters')
 
 #: threshold of tissue/background presence on potential cutting line
 TISSUE_CONTENT = 0.01
@@ -35,8 +33,8 @@ TISSUE_CONTENT = 0.01
 IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 # https://github.com/opencv/opencv/issues/6729
 # https://www.life2coding.com/save-opencv-images-jpeg-quality-png-compression
-IMAGE_COMPRESSION_OPTIONS = (IMWRITE_JPEG_QUALITY, 98) + \
-                            (IMWRITE_PNG_COMPRESSION, 9)
+#: OpenCV writing parameters (names of the flags with their values), see :func:`save_large_image`
+IMAGE_COMPRESSION_OPTIONS = (('IMWRITE_JPEG_QUALITY', 98), ('IMWRITE_PNG_COMPRESSION', 9))
 #: template for detecting/parsing scale from folder name
 REEXP_FOLDER_SCALE = r'\S*scale-(\d+)pc'
 # ERROR:root:error: Image size (... pixels) exceeds limit of ... pixels,
@@ -45,14 +43,21 @@ REEXP_FOLDER_SCALE = r'\S*scale-(\d+)pc'
 Image.MAX_IMAGE_PIXELS = None
 #: maximal image size for visualisations, larger images will be downscaled
 MAX_IMAGE_SIZE = 5000
+#: image size used for detecting tissue boxes
+TISSUE_DETECT_SIZE = 512
+#: suffix of the file with cached tissue boxes of an image in the cache folder
+TISSUE_BOXES_SUFFIX = '.tissue-boxes.json'
 #: define pair of forward and backward color space conversion
 CONVERT_RGB = {
     'rgb': (lambda img: img, lambda img: img),
-    'hsv': (rgb2hsv, hsv2rgb),
-    'lab': (rgb2lab, lab2rgb),
-    'luv': (rgb2luv, luv2rgb),
-    'hed': (rgb2hed, hed2rgb),
-    'lch': (lambda img: lab2lch(rgb2lab(img)), lambda img: lab2rgb(lch2lab(img))),
+    'hsv': (lambda img: sk_color.rgb2hsv(img), lambda img: sk_color.hsv2rgb(img)),
+    'lab': (lambda img: sk_color.rgb2lab(img), lambda img: sk_color.lab2rgb(img)),
+    'luv': (lambda img: sk_color.rgb2luv(img), lambda img: sk_color.luv2rgb(img)),
+    'hed': (lambda img: sk_color.rgb2hed(img), lambda img: sk_color.hed2rgb(img)),
+    'lch': (
+        lambda img: sk_color.lab2lch(sk_color.rgb2lab(img)),
+        lambda img: sk_color.lab2rgb(sk_color.lch2lab(img)),
+    ),
 }
 
 
@@ -65,31 +70,45 @@ def detect_binary_blocks(vec_bin):
     >>> vec = np.array([1] * 15 + [0] * 5 + [1] * 20)
     >>> detect_binary_blocks(vec)
     ([0, 20], [15, 39], [14, 19])
+    >>> detect_binary_blocks([0, 1, 1, 0, 1, 0])
+    ([1, 4], [3, 5], [1, 0])
     """
-    begins, ends, lengths = [], [], []
+    return detect_binary_blocks_batch([vec_bin])[0]
+
 
-    # in case that it starts with an object
-    if vec_bin[0]:
-        begins.append(0)
+def detect_binary_blocks_batch(vecs_bin):
+    """ detect the binary objects in several 1d signals at once, for instance row and column
+    projections of many images; the signals may have different lengths
 
-    length = 0
-    # iterate over whole array, skip the first one
-    for i in range(1, len(vec_bin)):
-        if vec_bin[i] > vec_bin[i - 1]:
-            begins.append(i)
-        elif vec_bin[i] < vec_bin[i - 1]:
-            ends.append(i)
-            lengths.append(length)
-            length = 0
-        elif vec_bin[i] == 1:
-            length += 1
+    The output for each signal is the same as for :func:`detect_binary_blocks`,
+    the end of an inner object is the first index after it, an object touching the signal end
+    ends at the last index and the length is the object size minus one.
 
-    # in case that it ends with an object
-    if vec_bin[-1]:
-        ends.append(len(vec_bin) - 1)
-        lengths.append(length)
+    :param list(list(bool)) vecs_bin: binary vectors with 1 for an object
+    :return list(tuple(list(int),list(int),list(int))): beginnings, ends and lengths per signal
 
-    return begins, ends, lengths
+    >>> vecs = [[1] * 15 + [0] * 5 + [1] * 20, [0, 1, 1, 0], [0, 0], [1]]
+    >>> detect_binary_blocks_batch(vecs)  # doctest: +NORMALIZE_WHITESPACE
+    [([0, 20], [15, 39], [14, 19]), ([1], [3], [1]), ([], [], []), ([0], [0], [0])]
+    """
+    vecs_bin = [np.asarray(vec, dtype=bool).ravel() for vec in vecs_bin]
+    if not vecs_bin:
+        return []
+    sizes = np.array([len(vec) for vec in vecs_bin])
+    # pad all signals by background, so each object has a rising and falling edge
+    mat_bin = np.zeros((len(vecs_bin), sizes.max() + 2), dtype=np.int8)
+    for i, vec in enumerate(vecs_bin):
+        mat_bin[i, 1:len(vec) + 1] = vec
+    edges = np.diff(mat_bin, axis=1)
+    # edges are ordered by signal and position, so beginnings and ends are paired
+    rows, begins = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    lengths = ends - begins - 1
+    # an object touching the signal end ends at the last index
+    ends = np.where(ends == sizes[rows], ends - 1, ends)
+    splits = np.cumsum(np.bincount(rows, minlength=len(vecs_bin)))[:-1]
+    blocks = zip(*[np.split(arr, splits) for arr in (begins, ends, lengths)])
+    return [tuple(arr.tolist() for arr in block) for block in blocks]
 
 
 def find_split_objects(hist, nb_objects=2, threshold=TISSUE_CONTENT):
@@ -165,10 +184,10 @@ def project_object_edge(img, dimension):
     if img.ndim != 3:
         raise ValueError('unsupported image shape %r' % img.shape)
     img_gray = np.mean(img, axis=-1)
-    img_gray = GaussianBlur(img_gray, (5, 5), 0)
+    img_gray = cv.GaussianBlur(img_gray, (5, 5), 0)
     p_low, p_high = np.percentile(img_gray, (1, 95))
-    img_gray = rescale_intensity(img_gray, in_range=(p_low, p_high))
-    img_bin = img_gray > threshold_otsu(img_gray)
+    img_gray = sk_exposure.rescale_intensity(img_gray, in_range=(p_low, p_high))
+    img_bin = img_gray > sk_filters.threshold_otsu(img_gray)
     img_edge = np.mean(img_bin, axis=1 - dimension)
     return img_edge
 
@@ -186,7 +205,7 @@ def load_large_image(img_path):
         raise FileNotFoundError('missing image: %s' % img_path)
     img = plt.imread(img_path)
     if img.ndim == 3 and img.shape[2] == 4:
-        img = cvtColor(img, COLOR_RGBA2RGB)
+        img = cv.cvtColor(img, cv.COLOR_RGBA2RGB)
     if np.max(img) <= 1.5:
         np.clip(img, a_min=0, a_max=1, out=img)
         # this command split should reduce mount of required memory
@@ -245,8 +264,204 @@ def save_large_image(img_path, img):
         logging.debug('WARNING: this image will be overwritten: %s', img_path)
     # why cv2 imwrite changes the color of pics
     # https://stackoverflow.com/questions/42406338
-    img = cvtColor(img, COLOR_RGB2BGR)
-    imwrite(img_path, img, IMAGE_COMPRESSION_OPTIONS)
+    img = cv.cvtColor(img, cv.COLOR_RGB2BGR)
+    options = sum([(getattr(cv, name), val) for name, val in IMAGE_COMPRESSION_OPTIONS], ())
+    cv.imwrite(img_path, img, options)
+
+
+def image_shape_header(img_path):
+    """ get image size from the image header without loading the raster
+
+    :param str img_path: path to the image
+    :return tuple(int,int): image size (height, width)
+
+    >>> img_path = './sample-image.png'
+    >>> save_large_image(img_path, np.zeros((50, 75, 3), dtype=np.uint8))
+    >>> image_shape_header(img_path)
+    (50, 75)
+    >>> os.remove(img_path)
+    """
+    if not os.path.isfile(img_path):
+        raise FileNotFoundError('missing image: %s' % img_path)
+    with Image.open(img_path) as img:
+        width, height = img.size
+    return height, width
+
+
+def load_image_thumbnail(img_path, scale_factor):
+    """ load down-scaled image, for JPEG it uses reduced decoding, other formats are decoded
+    and down-scaled by Pillow which is much leaner then loading full image with `load_large_image`
+
+    :param str img_path: path to the image
+    :param float scale_factor: down-scaling factor, larger then 1
+    :return ndarray: RGB image
+
+    >>> img_path = './sample-image.png'
+    >>> save_large_image(img_path, np.zeros((500, 750, 3), dtype=np.uint8))
+    >>> load_image_thumbnail(img_path, 5).shape
+    (100, 150, 3)
+    >>> os.remove(img_path)
+    """
+    height, width = image_shape_header(img_path)
+    size = (max(1, int(round(width / scale_factor))), max(1, int(round(height / scale_factor))))
+    try:
+        with Image.open(img_path) as img:
+            img.draft('RGB', size)
+            img = img.convert('RGB') if img.mode not in ('RGB', 'L') else img
+            img_small = np.array(img.resize(size, Image.BOX))
+    except Exception:  # some very large images can not be decoded by Pillow
+        logging.debug('loading thumbnail via full image: %s', img_path)
+        img_small = cv.resize(load_large_image(img_path), size, interpolation=cv.INTER_AREA)
+    if img_small.ndim == 2:
+        img_small = np.rollaxis(np.array([img_small] * 3), 0, 3)
+    return img_small[..., :3]
+
+
+def _file_signature(path_file):
+    """ signature of a file for invalidating cached values
+
+    :param str path_file: path to the file
+    :return list(int): file size and modification time
+    """
+    stat = os.stat(path_file)
+    return [stat.st_size, int(stat.st_mtime * 1e6)]
+
+
+def _tissue_boxes_cache_path(img_path, path_cache):
+    """ path to the cached tissue boxes of the image, unique also for images with the same name
+
+    :param str img_path: path to the image
+    :param str path_cache: path to the cache folder
+    :return str: path to the cache file
+    """
+    name = os.path.splitext(os.path.basename(img_path))[0]
+    hash_path = hashlib.sha1(os.path.abspath(img_path).encode()).hexdigest()[:10]
+    return os.path.join(path_cache, '%s_%s%s' % (name, hash_path, TISSUE_BOXES_SUFFIX))
+
+
+def load_tissue_boxes_cache(img_path, path_cache):
+    """ load cached tissue boxes for the image, records for a changed image are dropped
+
+    :param str img_path: path to the image
+    :param str path_cache: path to the cache folder
+    :return dict: cached boxes
+    """
+    path_json = _tissue_boxes_cache_path(img_path, path_cache)
+    if not os.path.isfile(path_json):
+        return {}
+    with open(path_json, 'r') as fp:
+        cache = json.load(fp)
+    if cache.get('signature') != _file_signature(img_path):
+        return {}
+    return cache.get('boxes', {})
+
+
+def save_tissue_boxes_cache(img_path, key, boxes, path_cache):
+    """ add tissue boxes for the image to its file in the cache folder
+
+    :param str img_path: path to the image
+    :param str key: name of the detection with its parameters
+    :param boxes: detected boxes, any JSON serializable structure
+    :param str path_cache: path to the cache folder
+    """
+    cache = load_tissue_boxes_cache(img_path, path_cache)
+    cache[key] = boxes
+    with open(_tissue_boxes_cache_path(img_path, path_cache), 'w') as fp:
+        json.dump({'signature': _file_signature(img_path), 'boxes': cache}, fp)
+
+
+def estimate_tissue_crop(img_path, crop_dims=(0, 1), padding=0.15, path_cache=None):
+    """ estimate box tight around tissue with padding on a down-scaled image
+
+    :param str img_path: path to image
+    :param tuple(int) crop_dims: crop in selected dimensions
+    :param float padding: padding around tissue
+    :param str|None path_cache: folder for caching the boxes, no caching if it is not set
+    :return list(list(int)): begin and end for both image dimensions
+
+    >>> img = np.full((800, 1200, 3), 255, dtype=np.uint8)
+    >>> img[200:400, 300:900] = 0
+    >>> img_path = './sample-image.png'
+    >>> save_large_image(img_path, img)
+    >>> estimate_tissue_crop(img_path, padding=0.1, path_cache='.')
+    [[179, 420], [238, 960]]
+    >>> path_json = _tissue_boxes_cache_path(img_path, '.')
+    >>> os.path.isfile(path_json)
+    True
+    >>> estimate_tissue_crop(img_path, padding=0.1, path_cache='.')
+    [[179, 420], [238, 960]]
+    >>> os.remove(img_path)
+    >>> os.remove(path_json)
+    """
+    key = 'crop_dims-%s_padding-%f' % ('-'.join(map(str, crop_dims)), padding)
+    if path_cache:
+        boxes = load_tissue_boxes_cache(img_path, path_cache).get(key)
+        if boxes:
+            return boxes
+
+    shape = image_shape_header(img_path)
+    scale_factor = max(1, np.mean(shape) / float(TISSUE_DETECT_SIZE))
+    # work with just a scaled version
+    img_small = 255 - load_image_thumbnail(img_path, scale_factor)
+
+    crops = [[0, shape[0]], [0, shape[1]]]
+    for crop_dim in crop_dims:
+        if crop_dim not in (0, 1):
+            raise ValueError('not supported dimension: %i' % crop_dim)
+        img_edge = project_object_edge(img_small, crop_dim)
+
+        begin, end = find_largest_object(img_edge, threshold=TISSUE_CONTENT)
+        pad_px = padding * (end - begin) * scale_factor
+        begin_px = max(0, int((begin * scale_factor) - pad_px))
+        end_px = min(shape[crop_dim], int((end * scale_factor) + pad_px))
+        crops[crop_dim] = [begin_px, end_px]
+
+    if path_cache:
+        save_tissue_boxes_cache(img_path, key, crops, path_cache)
+    return crops
+
+
+def estimate_tissue_splits(img_path, nb_objects=2, cut_dim=0, path_cache=None):
+    """ estimate cutting edges among several tissues on a down-scaled image
+
+    :param str img_path: path to image
+    :param int nb_objects: number of tissues in the image
+    :param int cut_dim: define splitting dimension
+    :param str|None path_cache: folder for caching the edges, no caching if it is not set
+    :return list(int): edges of the image parts including image borders, empty if not found
+
+    >>> img = np.full((800, 1200, 3), 255, dtype=np.uint8)
+    >>> img[100:300, 300:900] = 0
+    >>> img[500:700, 300:900] = 0
+    >>> img_path = './sample-image.png'
+    >>> save_large_image(img_path, img)
+    >>> estimate_tissue_splits(img_path, nb_objects=2, cut_dim=0)
+    [0, 400, 800]
+    >>> estimate_tissue_splits(img_path, nb_objects=3, cut_dim=0)
+    []
+    >>> os.remove(img_path)
+    """
+    if cut_dim not in (0, 1):
+        raise ValueError('unsupported dimension: %i' % cut_dim)
+    key = 'split_dim-%i_objects-%i' % (cut_dim, nb_objects)
+    if path_cache:
+        edges = load_tissue_boxes_cache(img_path, path_cache).get(key)
+        if edges is not None:
+            return edges
+
+    shape = image_shape_header(img_path)
+    scale_factor = max(1, shape[cut_dim] / float(TISSUE_DETECT_SIZE))
+    # work with just a scaled version
+    img_small = 255 - load_image_thumbnail(img_path, scale_factor)
+    img_edge = project_object_edge(img_small, cut_dim)
+
+    # prepare all cut edges and scale them to original image size
+    splits = find_split_objects(img_edge, nb_objects=nb_objects)
+    edges = [int(round(i * scale_factor)) for i in [0] + splits + [len(img_edge)]] if splits else []
+
+    if path_cache:
+        save_tissue_boxes_cache(img_path, key, edges, path_cache)
+    return edges
 
 
 def generate_pairing(count, step_hide=None):
@@ -492,25 +707,57 @@ def get_close_diag_corners(points):
     return pt_begin, pt_end, (idx_begin, idx_end)
 
 
-def simplify_polygon(points, tol_degree=5):
+def simplify_polygon(points, tol_degree=5, points_inside=None):
     """ simplify path, drop point on the same line
 
+    If the points which have to stay inside are given, only the vertices whose removal
+    enlarges the polygon (straight or concave) and does not cross any other point are dropped,
+    so no point gets outside.
+
     :param ndarray points: point in polygon
     :param float tol_degree: tolerance on change in orientation
+    :param ndarray|None points_inside: points which have to stay inside the polygon
     :return list(list(float)): pints of polygon
 
     >>> pts = [[1, 2], [2, 4], [1, 5], [2, 8], [3, 8], [5, 8], [7, 8], [8, 7],
     ...     [8, 5], [8, 3], [8, 1], [7, 1], [6, 1], [4, 1], [3, 1], [3, 2], [2, 2]]
     >>> simplify_polygon(pts)
     [[1, 2], [2, 4], [1, 5], [2, 8], [7, 8], [8, 7], [8, 1], [3, 1], [3, 2]]
+    >>> pts = [[0, 0], [5, -1], [10, 0], [10, 10], [5, 9], [0, 10]]
+    >>> simplify_polygon(pts, tol_degree=25)
+    [[0, 0], [10, 0], [10, 10], [0, 10]]
+    >>> simplify_polygon(pts, tol_degree=25, points_inside=pts)
+    [[0, 0], [5, -1], [10, 0], [10, 10], [0, 10]]
     """
     if len(points) < 3:
         return points
+    if points_inside is not None:
+        points_inside = np.asarray(points_inside, dtype=float)
+        poly = np.asarray(points, dtype=float)
+        # orientation of the polygon, positive for counter-clockwise in (x, y)
+        orient = np.sign(np.sum(poly[:, 0] * np.roll(poly[:, 1], -1) - np.roll(poly[:, 0], -1) * poly[:, 1]))
+
+    def _cross(pt0, pt1, pt2):
+        return (pt1[0] - pt0[0]) * (pt2[1] - pt0[1]) - (pt1[1] - pt0[1]) * (pt2[0] - pt0[0])
+
+    def _is_removable(pt_prev, pt, pt_next):
+        if points_inside is None:
+            return True
+        # dropping convex vertex would leave the vertex itself outside
+        if orient * _cross(pt_prev, pt, pt_next) > 0:
+            return False
+        # the new edge must not cross the polygon, so no point may lie strictly inside the added triangle
+        corners = [pt_prev, pt, pt_next] if orient * _cross(pt_prev, pt, pt_next) < 0 else [pt_prev, pt_next, pt]
+        sides = [_cross(corners[i], corners[(i + 1) % 3], points_inside.T) for i in range(3)]
+        return not np.any(np.all(np.array(sides) < 0, axis=0))
+
     path = [points[0]]
     for i in range(1, len(points)):
+        pt_next = points[(i + 1) % len(points)]
         angle0 = line_angle_2d(path[-1], points[i], deg=True)
-        angle1 = line_angle_2d(points[i], points[(i + 1) % len(points)], deg=True)
-        if abs(norm_angle(angle0 - angle1, deg=True)) > tol_degree:
+        angle1 = line_angle_2d(points[i], pt_next, deg=True)
+        if abs(norm_angle(angle0 - angle1, deg=True)) > tol_degree \
+                or not _is_removable(path[-1], points[i], pt_next):
             path.append(points[i])
     return np.array(path).tolist()
 
@@ -518,6 +765,8 @@ def simplify_polygon(points, tol_degree=5):
 def compute_bounding_polygon(landmarks):
     """ get the polygon where all point lies inside
 
+    .. note:: The complexity is roughly cubic, for larger point sets use :func:`compute_concave_hull`.
+
     :param ndarray landmarks: set of points
     :return ndarray: pints of polygon
 
@@ -569,6 +818,92 @@ def compute_convex_hull(landmarks):
     return chull_points
 
 
+def compute_concave_hull(landmarks, edge_ratio=0.5, tol_degree=5):
+    """ compute concave hull (so-called chi-shape) around landmarks in O(n log n)
+
+    Starting from Delaunay triangulation, the longest boundary edges are iteratively removed
+    (with their triangle) while they are longer then the threshold and the boundary stays
+    a simple polygon, see http://doi.org/10.1016/j.patcog.2008.03.023
+
+    :param ndarray landmarks: set of points
+    :param float edge_ratio: threshold on the edge length as ratio in range (0, 1)
+        between the shortest and longest edge in triangulation; 1 gives convex hull
+    :param float tol_degree: tolerance on change in orientation for polygon simplification,
+        the landmarks always stay inside or on the boundary
+    :return list(list(float)): pints of polygon
+
+    >>> pts = [[0, 0], [0, 2], [0, 4], [1, 1], [1, 3], [2, 0], [2, 4],
+    ...        [3, 1], [3, 2], [3, 3], [4, 0], [4, 4], [5, 2], [6, 0], [6, 4]]
+    >>> compute_concave_hull(pts, edge_ratio=1)
+    [[0, 0], [6, 0], [6, 4], [0, 4]]
+    >>> compute_concave_hull(pts)
+    [[0, 0], [6, 0], [5, 2], [6, 4], [0, 4]]
+    >>> compute_concave_hull(pts[:3])
+    [[0, 0], [0, 2], [0, 4]]
+    """
+    points = np.unique(np.asarray(landmarks), axis=0)
+    try:
+        tri = spatial.Delaunay(points)
+    except Exception:  # QhullError for too few or collinear points
+        return points.tolist()
+    simplices, neighbors = tri.simplices, tri.neighbors
+    alive = np.ones(len(simplices), dtype=bool)
+    on_boundary = np.zeros(len(points), dtype=bool)
+
+    def _edge(idx_tri, k):
+        # edge of the triangle opposite to its k-th vertex
+        return simplices[idx_tri][(k + 1) % 3], simplices[idx_tri][(k + 2) % 3]
+
+    def _length(idx_tri, k):
+        i, j = _edge(idx_tri, k)
+        return np.linalg.norm(points[i] - points[j])
+
+    edge_lengths = np.linalg.norm(points[simplices] - points[np.roll(simplices, 1, axis=1)], axis=-1)
+    threshold = edge_lengths.min() + edge_ratio * (edge_lengths.max() - edge_lengths.min())
+
+    heap = []
+    for idx_tri, k in zip(*np.nonzero(neighbors == -1)):
+        on_boundary[list(_edge(idx_tri, k))] = True
+        heap.append((-_length(idx_tri, k), idx_tri, k))
+    heapq.heapify(heap)
+
+    # remove the longest boundary edges and expose the inner ones
+    while heap and -heap[0][0] > threshold:
+        _, idx_tri, k = heapq.heappop(heap)
+        idx_pt = simplices[idx_tri][k]
+        # removing triangle with the third point on boundary would break the polygon
+        if not alive[idx_tri] or on_boundary[idx_pt]:
+            continue
+        alive[idx_tri] = False
+        on_boundary[idx_pt] = True
+        for k_nb in ((k + 1) % 3, (k + 2) % 3):
+            idx_nb = neighbors[idx_tri][k_nb]
+            if idx_nb >= 0 and alive[idx_nb]:
+                k_edge = int(np.flatnonzero(neighbors[idx_nb] == idx_tri)[0])
+                heapq.heappush(heap, (-_length(idx_nb, k_edge), idx_nb, k_edge))
+
+    # collect the oriented boundary edges of remaining triangles
+    next_pt = {}
+    for idx_tri in np.flatnonzero(alive):
+        for k in range(3):
+            idx_nb = neighbors[idx_tri][k]
+            if idx_nb < 0 or not alive[idx_nb]:
+                i, j = _edge(idx_tri, k)
+                next_pt[i] = j
+    # walk along the boundary starting from the point closest to the minimal corner
+    start = min(next_pt, key=lambda i: np.linalg.norm(points[i] - points.min(axis=0)))
+    poly = [start]
+    while next_pt[poly[-1]] != start:
+        poly.append(next_pt[poly[-1]])
+    poly = points[poly]
+    # orient the polygon consistently, counter-clockwise in (x, y)
+    area = np.sum(poly[:, 0] * np.roll(poly[:, 1], -1) - np.roll(poly[:, 0], -1) * poly[:, 1])
+    if area < 0:
+        poly = np.vstack([poly[:1], poly[1:][::-1]])
+    # drop only vertices which keep all the landmarks inside
+    return simplify_polygon(poly.tolist(), tol_degree=tol_degree, points_inside=points)
+
+
 def inside_polygon(polygon, point):
     """ check if a point is strictly inside the polygon
 
@@ -584,7 +919,7 @@ def inside_polygon(polygon, point):
     >>> inside_polygon(poly, [2, 2])
     True
     """
-    path = Path(polygon)
+    path = mpl_path.Path(polygon)
     return path.contains_points([point])[0]
 
 
@@ -607,6 +942,9 @@ def list_sub_folders(path_folder, name='*'):
 def common_landmarks(points1, points2, threshold=1.5):
     """ find common landmarks in two sets
 
+    The assignment is solved over the full distance matrix, since also the distant pairs
+    influence which close pairs are selected, it can not be restricted to the near candidates.
+
     :param ndarray|list(list(float)) points1: first point set
     :param ndarray|list(list(float)) points2: second point set
     :param float threshold: threshold for assignment (for landmarks in pixels)
@@ -725,7 +1063,8 @@ def scale_large_images_landmarks(images, landmarks):
         )
     # using float16 as image raise TypeError: src data type = 23 is not supported
     images = [
-        resize(img, None, fx=scale, fy=scale, interpolation=INTER_LINEAR) if img is not None else None for img in images
+        cv.resize(img, None, fx=scale, fy=scale, interpolation=cv.INTER_LINEAR) if img is not None else None
+        for img in images
     ]
     landmarks = [lnds * scale if lnds is not None else None for lnds in landmarks]
     return images, landmarks
@@ -8,16 +8,19 @@ import collections
 import logging
 import os
 
-import matplotlib.pylab as plt
 import numpy as np
-from matplotlib import colors as plt_colors
-from matplotlib import ticker as plt_ticker
 from PIL import ImageDraw
 
+from birl.utilities import LazyModule
 from birl.utilities.data_io import convert_ndarray2image
 from birl.utilities.dataset import scale_large_images_landmarks
 from birl.utilities.evaluate import compute_matrix_user_ranking
 
+# the matplotlib is imported with the first figure, so the other tools do not pay for its import
+plt = LazyModule('matplotlib.pylab')
+plt_colors = LazyModule('matplotlib.colors')
+plt_ticker = LazyModule('matplotlib.ticker')
+
 #: default figure size for visualisations
 MAX_FIGURE_SIZE = 18  # inches
 
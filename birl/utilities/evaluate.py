@@ -9,10 +9,12 @@ from itertools import chain
 
 import numpy as np
 import pandas as pd
-from scipy.spatial import distance
 
+from birl.utilities import LazyModule
 from birl.utilities.registration import estimate_affine_transform, get_affine_components, norm_angle
 
+distance = LazyModule('scipy.spatial.distance')
+
 
 def compute_tre(points_1, points_2):
     """ computing Target Registration Error for each landmark pair
@@ -164,6 +166,40 @@ def compute_affine_transf_diff(points_ref, points_init, points_est):
     return diff
 
 
+def compute_ranking_matrix(df_values, reverse=False, df_mask=None):
+    """ compute ranking of users (rows) for each case (column), ties are ranked
+    by the users order, missing values (NaN) are ranked after all valid values
+    and users with masked case are ranked by the number of users
+
+    :param DF df_values: table with users in rows and cases in columns
+    :param bool reverse: use reverse ordering
+    :param DF|None df_mask: table marking available user cases, if None all are available
+    :return DF: ranks with the same shape as the input
+
+    >>> df = pd.DataFrame([[0.04, 0.25, 0.1], [0.33, np.nan, 0.05], [np.nan, 0.01, 0.15]],
+    ...                   index=['karel', 'pepa', 'franta'], columns=[1, 2, 3])
+    >>> compute_ranking_matrix(df, df_mask=df.notnull() | [[True] * 3, [True] * 3, [False] * 3])
+            1  2  3
+    karel   1  2  2
+    pepa    2  3  1
+    franta  3  1  3
+    >>> compute_ranking_matrix(df, reverse=True)
+            1  2  3
+    karel   2  1  2
+    pepa    1  3  3
+    franta  3  2  1
+    """
+    if df_mask is None:
+        df_mask = pd.DataFrame(True, index=df_values.index, columns=df_values.columns)
+    df_values = df_values.where(df_mask)
+    df_ranks = df_values.rank(axis=0, method='first', ascending=not reverse, na_option='keep')
+    # missing values of present users go after all valid values in the users order
+    nan_present = df_values.isnull() & df_mask
+    df_ranks = df_ranks.fillna(df_ranks.notnull().sum(axis=0) + nan_present.cumsum(axis=0))
+    df_ranks = df_ranks.where(df_mask, len(df_values))
+    return df_ranks.astype(int)
+
+
 def compute_ranking(user_cases, field, reverse=False):
     """ compute ranking over selected field
 
@@ -189,16 +225,28 @@ def compute_ranking(user_cases, field, reverse=False):
     3       3      2     1
     """
     users = list(user_cases.keys())
-    cases = set(chain(*[user_cases[u].keys() for u in user_cases]))
-
-    for cs in cases:
-        usr_val = [(u, user_cases[u][cs].get(field, np.nan)) for u in users if cs in user_cases[u]]
-        usr_val = sorted(usr_val, key=lambda x: x[1], reverse=reverse)
-        usr_rank = {usr: i + 1 for i, (usr, _) in enumerate(usr_val)}
-        for usr in users:
-            if cs not in user_cases[usr]:
-                user_cases[usr][cs] = {}
-            user_cases[usr][cs][field + '_rank'] = usr_rank.get(usr, len(users))
+    cases = list(set(chain(*[user_cases[u].keys() for u in user_cases])))
+    if not users or not cases:
+        return user_cases
+
+    case_idx = {cs: j for j, cs in enumerate(cases)}
+    idx_rows, idx_cols, vals = [], [], []
+    for i, usr in enumerate(users):
+        idx_rows += [i] * len(user_cases[usr])
+        idx_cols += [case_idx[cs] for cs in user_cases[usr]]
+        vals += [meas.get(field, np.nan) for meas in user_cases[usr].values()]
+    idx = (np.array(idx_rows, dtype=int), np.array(idx_cols, dtype=int))
+    values = np.full((len(users), len(cases)), np.nan)
+    values[idx] = np.array(vals, dtype=float)
+    mask = np.zeros(values.shape, dtype=bool)
+    mask[idx] = True
+    df_mask = pd.DataFrame(mask, index=users, columns=cases)
+    ranks = compute_ranking_matrix(pd.DataFrame(values, index=users, columns=cases), reverse, df_mask)
+
+    name = field + '_rank'
+    for usr, usr_ranks in zip(users, ranks.values.tolist()):
+        for cs, rank in zip(cases, usr_ranks):
+            user_cases[usr].setdefault(cs, {})[name] = rank
 
     return user_cases
 
@@ -219,16 +267,17 @@ def compute_matrix_user_ranking(df_stat, higher_better=False):
            [ 1.,  3.,  0.],
            [ 0.,  2.,  1.],
            [ 4.,  4.,  2.]])
+    >>> df.iloc[1, 0] = np.nan
+    >>> compute_matrix_user_ranking(df, higher_better=True)[:, 0]
+    array([  4.,   0.,   2.,   3.,  nan])
     """
-    ranking = np.zeros(df_stat.values.shape)
-    nan = -np.inf if higher_better else np.inf
-    for i, col in enumerate(df_stat.columns):
-        vals = [v if not np.isnan(v) else nan for v in df_stat[col]]
-        idx_vals = list(zip(range(len(df_stat)), vals))
-        # sort according second element - vale
-        idx_vals = sorted(idx_vals, key=lambda iv: iv[1], reverse=higher_better)
-        # if values are NaN keep index as NaN
-        ranking[:, i] = [idx if val != nan else np.nan for idx, val in idx_vals]
+    vals = np.asarray(df_stat.values, dtype=float)
+    # stable sort (mergesort, also for old numpy) keeps the users order for ties
+    # also for reversed ordering, NaN are sorted last
+    order = np.argsort(-vals if higher_better else vals, axis=0, kind='mergesort')
+    ranking = order.astype(float)
+    # if values are NaN keep index as NaN
+    ranking[np.isnan(vals[order, np.arange(vals.shape[1])])] = np.nan
     return ranking
 
 
@@ -5,26 +5,37 @@ Copyright (C) 2016-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 """
 
 import argparse
+import atexit
 import collections
 import copy
+import importlib
 import logging
 import multiprocessing as mproc
 import os
 import platform
 import subprocess
 import sys
+import threading
 import time
 import types
 import uuid
 from functools import wraps
 
+try:  # python 3
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
 import numpy as np
-import tqdm
-from pathos.multiprocessing import ProcessPool
 
+from birl.utilities import LazyModule
 from birl.utilities.data_io import create_folder, save_config_yaml, update_path
 from birl.utilities.dataset import CONVERT_RGB
 
+# imported only when some iterations are executed
+tqdm = LazyModule('tqdm')
+pathos_mproc = LazyModule('pathos.multiprocessing')
+
 #: number of available CPUs on this computer
 CPU_COUNT = int(mproc.cpu_count())
 #: default date-time format
@@ -489,6 +500,146 @@ def exec_commands(commands, path_logger=None, timeout=None):
     return success
 
 
+class PersistentWorker(object):
+    """ long-living interpreter process (e.g. JVM with Fiji or R session) executing jobs sent by pipe,
+    so the interpreter start-up is paid just once instead of once per command
+
+    Each job is a single line sent to the standard input of the process; the process prints its outputs
+    and finishes each job by a line starting with the end marker followed by the job exit status.
+    The process is expected to terminate when its standard input is closed.
+
+    >>> script = ('import sys\\nfor ln in iter(sys.stdin.readline, ""):\\n  print(ln.strip()[::-1])\\n'
+    ...           '  print("%s %i" % (sys.argv[1], len(ln) > 5))')
+    >>> worker = PersistentWorker([sys.executable, '-u', '-c', script, PersistentWorker.MARKER_END])
+    >>> worker.execute('abc', path_logger='./sample-output.log')
+    True
+    >>> worker.execute('abcdef', timeout=10)
+    False
+    >>> open('./sample-output.log').read()
+    'abc\\ncba\\n'
+    >>> worker.close()
+    >>> worker.is_alive()
+    False
+    >>> os.remove('./sample-output.log')
+    """
+    #: line which closes outputs of a job, followed by exit status, zero for success
+    MARKER_END = 'BIRL-JOB-END'
+
+    def __init__(self, command):
+        """ start the worker process
+
+        :param list(str) command: command starting the interpreter with the job loop
+        """
+        self.command = list(command)
+        self.command[0] = os.path.expanduser(self.command[0])
+        logging.debug('starting persistent worker: %s', ' '.join(self.command))
+        self._process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1,
+        )
+        # reading in separate thread allows the timeout of waiting for outputs
+        self._outputs = queue.Queue()
+        self._reader = threading.Thread(target=self._read_outputs)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read_outputs(self):
+        # reading by lines, iterating the file would wait for a full buffer in python 2
+        for line in iter(self._process.stdout.readline, ''):
+            self._outputs.put(line.rstrip('\n'))
+        # the process ended
+        self._outputs.put(None)
+
+    def is_alive(self):
+        """ whether the worker process is still running
+
+        :return bool:
+        """
+        return self._process.poll() is None
+
+    def execute(self, job, path_logger=None, timeout=None):
+        """ send the job to the worker and wait for its end
+
+        :param str job: single line job description
+        :param str path_logger: path to the logger
+        :param int timeout: timeout for the job, after it the worker is killed
+        :return bool: whether the job passed
+        """
+        logging.debug('JOB ->> \n%s', job)
+        outputs = [job]
+        success = False
+        t_end = time.time() + timeout if timeout else None
+        try:
+            self._process.stdin.write(job + '\n')
+            self._process.stdin.flush()
+            while True:
+                line = self._outputs.get(timeout=max(0, t_end - time.time()) if t_end else None)
+                if line is None:
+                    logging.error('persistent worker terminated: %s', ' '.join(self.command))
+                    break
+                if line.startswith(self.MARKER_END):
+                    success = line[len(self.MARKER_END):].strip() == '0'
+                    break
+                outputs.append(line)
+        except queue.Empty:
+            logging.warning('Job "%s" timed out after %i seconds, killing the worker', job, timeout)
+            self.close()
+        except (IOError, OSError) as ex:
+            logging.exception(ex)
+        if path_logger is not None:
+            with open(path_logger, 'a') as fp:
+                fp.write('\n'.join(outputs) + '\n')
+        return success
+
+    def close(self, timeout=5):
+        """ close the worker, the process is killed if it does not end itself
+
+        :param float timeout: time in seconds given to the process to end itself
+        """
+        try:
+            self._process.stdin.close()
+        except (IOError, OSError) as ex:
+            logging.debug('closing worker input failed: %r', ex)
+        t_end = time.time() + timeout
+        while self._process.poll() is None and time.time() < t_end:
+            time.sleep(0.05)
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+
+#: persistent workers started in this process, one per command
+_PERSISTENT_WORKERS = {}
+
+
+def get_persistent_worker(command):
+    """ get the persistent worker of this process for given command, start a new one if it is not running
+
+    Each process of the parallel pool keeps its own worker, so there are as many workers as pool processes.
+
+    :param list(str) command: command starting the interpreter with the job loop
+    :return PersistentWorker: the worker
+    """
+    command = tuple(command)
+    worker = _PERSISTENT_WORKERS.get(command)
+    if worker is None or not worker.is_alive():
+        worker = PersistentWorker(command)
+        _PERSISTENT_WORKERS[command] = worker
+    return worker
+
+
+@atexit.register
+def close_persistent_workers():
+    """ close all persistent workers started in this process """
+    while _PERSISTENT_WORKERS:
+        _, worker = _PERSISTENT_WORKERS.popitem()
+        worker.close()
+
+
 # class NoDaemonProcess(mp.Process):
 #     """ `pathos` pools are wrappers around multiprocess pools.
 #     That's the raw `multiprocess.Pool` object without the pathos interface wrapper.
@@ -522,7 +673,32 @@ def exec_commands(commands, path_logger=None, timeout=None):
 #     Process = NoDaemonProcess
 
 
-def iterate_mproc_map(wrap_func, iterate_vals, nb_workers=CPU_COUNT, desc='', ordered=True):
+def preload_modules(module_names):
+    """ import the given modules in advance, it is used as initializer of pool workers,
+    so each worker pays for the heavy imports once at its start and only for those the run needs
+
+    :param list(str) module_names: full names of modules, e.g. `skimage.color`
+
+    >>> preload_modules(['json', 'xml.dom.minidom', 'some_missing_module'])
+    >>> 'xml.dom.minidom' in sys.modules
+    True
+    """
+    for name in module_names:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logging.warning('the module %r requested for preloading is missing', name)
+
+
+def iterate_mproc_map(
+    wrap_func,
+    iterate_vals,
+    nb_workers=CPU_COUNT,
+    desc='',
+    ordered=True,
+    initializer=None,
+    initargs=(),
+):
     """ create a multi-porocessing pool and execute a wrapped function in separate process
 
     :param func wrap_func: function which will be excited in the iterations
@@ -532,6 +708,9 @@ def iterate_mproc_map(wrap_func, iterate_vals, nb_workers=CPU_COUNT, desc='', or
     :param str|None desc: description for the bar,
         if it is set None, bar is suppressed
     :param bool ordered: whether enforce ordering in the parallelism
+    :param func|None initializer: function called once in each worker before any iteration,
+        in sequential run it is called once in this process, e.g. :func:`preload_modules`
+    :param tuple initargs: arguments passed to the initializer
 
     Waiting reply on:
 
@@ -553,6 +732,9 @@ def iterate_mproc_map(wrap_func, iterate_vals, nb_workers=CPU_COUNT, desc='', or
     [1, 1, 1, 1, 1]
     >>> list(iterate_mproc_map(max, [(2, 1)] * 5, nb_workers=2, desc=''))
     [2, 2, 2, 2, 2]
+    >>> list(iterate_mproc_map(len, ['abc'] * 3, nb_workers=2, desc=None,
+    ...                        initializer=preload_modules, initargs=(['json'], )))
+    [3, 3, 3]
     """
     iterate_vals = list(iterate_vals)
     nb_workers = 1 if not nb_workers else int(nb_workers)
@@ -571,13 +753,16 @@ def iterate_mproc_map(wrap_func, iterate_vals, nb_workers=CPU_COUNT, desc='', or
 
         # pool = mproc.Pool(nb_workers)
         # pool = NonDaemonPool(nb_workers)
-        pool = ProcessPool(nb_workers)
+        pool_kwargs = dict(initializer=initializer, initargs=initargs) if initializer else {}
+        pool = pathos_mproc.ProcessPool(nb_workers, **pool_kwargs)
         # pool = Pool(nb_workers)
         mapping = pool.imap if ordered else pool.uimap
     else:
         logging.debug('perform sequential')
         pool = None
         mapping = map
+        if initializer:
+            initializer(*initargs)
 
     for out in mapping(wrap_func, iterate_vals):
         pbar.update() if pbar else None
@@ -4,8 +4,21 @@ Image registration tools
 Copyright (C) 2016-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 """
 
+import logging
+import time
+
 import numpy as np
-from skimage.transform import AffineTransform
+import pandas as pd
+
+from birl.utilities import LazyModule
+
+#: the scikit-image transformations are heavy to import and needed only for some of the affine components
+sk_transform = LazyModule('skimage.transform')
+sk_color = LazyModule('skimage.color')
+#: the ANTsPy is imported only with the first registration, it is installed just for this method
+ants = LazyModule('ants')
+#: CPU time of the current process, the `time.clock` is its python 2 equivalent
+_process_time = getattr(time, 'process_time', None) or time.clock
 
 
 def transform_points(points, matrix):
@@ -84,7 +97,7 @@ def get_affine_components(matrix):
     translation                   (65.0, -60.0)
     dtype: object
     """
-    aff = AffineTransform(matrix)
+    aff = sk_transform.AffineTransform(matrix)
     norm_rotation = norm_angle(np.rad2deg(aff.rotation), deg=True)
     comp = {
         'rotation': float(norm_rotation),
@@ -115,3 +128,50 @@ def norm_angle(angle, deg=True):
     while angle > unit:
         angle -= 2 * unit
     return angle
+
+
+def register_images_ants(img_ref, img_move, lnds_move):
+    """ register images with ANTsPy, it is shared by the in-process benchmark `BmANTsPy`
+    and the script `scripts/Python/run_ANTsPy.py`
+
+    :param ndarray img_ref: target image
+    :param ndarray img_move: source image
+    :param ndarray lnds_move: source landmarks np.array<nb_points, 2>
+    :return tuple(ndarray,ndarray,dict): warped source image, warped source landmarks
+        and the wall-clock and CPU time in seconds for each stage, e.g. ``{'loading': {'time': .., 'cpu': ..}}``
+    """
+    timings = {}
+
+    def _measure(stage, t_start, t_cpu):
+        timings[stage] = {'time': time.time() - t_start, 'cpu': _process_time() - t_cpu}
+        return time.time(), _process_time()
+
+    t_start, t_cpu = time.time(), _process_time()
+    fixed = ants.from_numpy(sk_color.rgb2gray(img_ref) if img_ref.ndim == 3 else img_ref)
+    moving = ants.from_numpy(sk_color.rgb2gray(img_move) if img_move.ndim == 3 else img_move)
+    # transform landmarks coordinates
+    lnds = pd.DataFrame(lnds_move, columns=['y', 'x'])
+    t_start, t_cpu = _measure('loading', t_start, t_cpu)
+
+    # perform image registration
+    mytx = ants.registration(
+        fixed=fixed,
+        moving=moving,
+        initial_transform='AffineFast',
+        type_of_transform='ElasticSyN',
+        grad_step=5,
+        aff_metric='mattes',
+        aff_sampling=32,
+        syn_metric='mattes',
+        syn_sampling=32,
+        reg_iterations=(40, 20, 10),
+    )
+    t_start, t_cpu = _measure('registration', t_start, t_cpu)
+    logging.debug('Transform: %r', mytx)
+
+    warped_moving = ants.apply_transforms(fixed=fixed, moving=moving, transformlist=mytx['fwdtransforms'])
+    warped_points = ants.apply_transforms_to_points(dim=2, points=lnds, transformlist=mytx['invtransforms'])
+    # transform landmarks coordinates back
+    lnds_warp = warped_points[['y', 'x']].values
+    _measure('warping', t_start, t_cpu)
+    return warped_moving.numpy(), lnds_warp, timings
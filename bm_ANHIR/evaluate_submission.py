@@ -29,6 +29,16 @@ Sample usage::
         -o ./output \
         --min_landmarks 0.20
 
+Several submissions (experiment folders matching a pattern) can be evaluated at once,
+sharing the loaded cover table and landmarks pairing, with a combined ranking::
+
+    python evaluate_submission.py \
+        -e "./results/Bm*" \
+        -t ./data-images/pairs-imgs-lnds_histol.csv \
+        -d ./data-images \
+        -o ./output \
+        --nb_workers 4
+
 DOCKER
 ------
 Running in grad-challenge.org environment::
@@ -61,6 +71,7 @@ Copyright (C) 2018-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 """
 
 import argparse
+import glob
 import json
 import logging
 import os
@@ -73,15 +84,37 @@ import numpy as np
 import pandas as pd
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
-from birl.benchmark import _df_drop_unnamed, COL_PAIRED_LANDMARKS, filter_paired_landmarks, ImRegBenchmark
+from birl.benchmark import (
+    _df_drop_unnamed,
+    COL_PAIRED_LANDMARKS,
+    filter_paired_landmarks,
+    ImRegBenchmark,
+    preload_landmarks,
+)
 from birl.utilities.data_io import create_folder, load_landmarks, save_landmarks, update_path
 from birl.utilities.dataset import parse_path_scale
+from birl.utilities.evaluate import compute_matrix_user_ranking, compute_ranking
 from birl.utilities.experiments import FORMAT_DATE_TIME, get_nb_workers, iterate_mproc_map, parse_arg_params
 
 NB_WORKERS = get_nb_workers(0.9)
 NAME_CSV_RESULTS = 'registration-results.csv'
 NAME_JSON_COMPUTER = 'computer-performances.json'
 NAME_JSON_RESULTS = 'metrics.json'
+#: combined ranking table of several submissions
+NAME_CSV_RANKING = 'submissions-ranking.csv'
+#: folder for cached landmarks pairing shared among submissions
+FOLDER_CACHE_PAIRING = 'cache-landmarks-pairing'
+#: per case measures used for ranking submission with related aggregated score
+RANKING_CASE_MEASURES = (('rTRE Median', 'Average-Rank-Median-rTRE'), ('rTRE Max', 'Average-Rank-Max-rTRE'))
+#: aggregated scores for the overall ranking and whether higher is better
+RANKING_SCORES = (
+    ('Average-Rank-Median-rTRE', False),
+    ('Average-Rank-Max-rTRE', False),
+    ('Average-Median-rTRE', False),
+    ('Average-Max-rTRE', False),
+    ('Average-Robustness', True),
+    ('Average-Norm-Time', False),
+)
 COL_NORM_TIME = 'Norm. execution time [minutes]'
 COL_TISSUE = 'Tissue kind'
 # FOLDER_FILTER_DATASET = 'filtered dataset'
@@ -98,7 +131,12 @@ def create_parser():
     # SEE: https://docs.python.org/3/library/argparse.html
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        '-e', '--path_experiment', type=str, required=True, help='path to the experiments', default='/input/'
+        '-e',
+        '--path_experiment',
+        type=str,
+        required=True,
+        help='path to the experiments, a pattern evaluates several submissions',
+        default='/input/'
     )
     parser.add_argument(
         '-t',
@@ -122,6 +160,9 @@ def create_parser():
     parser.add_argument(
         '-p', '--path_comp_bm', type=str, required=False, help='path to reference computer performance JSON'
     )
+    parser.add_argument(
+        '--path_cache', type=str, required=False, help='path to folder caching landmarks pairing among submissions'
+    )
     parser.add_argument(
         '-o', '--path_output', type=str, required=True, help='path to output results', default='/output/'
     )
@@ -129,8 +170,13 @@ def create_parser():
     parser.add_argument(
         '--min_landmarks', type=float, required=False, default=0.5, help='ration of required landmarks in submission'
     )
-    # parser.add_argument('--nb_workers', type=int, required=False, default=NB_WORKERS,
-    #                     help='number of processes in parallel')
+    parser.add_argument(
+        '--nb_workers',
+        type=int,
+        required=False,
+        default=NB_WORKERS,
+        help='number of submissions evaluated in parallel'
+    )
     parser.add_argument(
         '--details', action='store_true', required=False, default=False, help='export details for each case'
     )
@@ -171,30 +217,44 @@ def filter_export_landmarks(idx_row, path_output, path_dataset, path_reference):
     return idx, ratio_matches
 
 
-def normalize_exec_time(df_experiments, path_experiments, path_comp_bm=None):
+def load_comp_benchmark(path_comp_bm):
+    """ load the reference computer performance
+
+    :param str|None path_comp_bm: path to reference comp. benchmark
+    :return dict|None: reference comp. benchmark, None if it is not available
+    """
+    if not path_comp_bm:
+        logging.warning('Reference comp. perform. not specified.')
+        return None
+    if not os.path.isfile(path_comp_bm):
+        logging.warning('Missing the reference comp. perform. JSON: %s', path_comp_bm)
+        return None
+    with open(path_comp_bm, 'r') as fp:
+        comp_ref = json.load(fp)
+    return comp_ref
+
+
+def normalize_exec_time(df_experiments, path_experiments, path_comp_bm=None, comp_ref=None):
     """ normalize execution times if reference and experiment computer is given
 
     :param DF df_experiments: experiment DataFrame
     :param str path_experiments: path to experiment folder
     :param str path_comp_bm: path to reference comp. benchmark
+    :param dict|None comp_ref: already loaded reference comp. benchmark, see :func:`load_comp_benchmark`
     """
     path_comp_bm_expt = os.path.join(path_experiments, NAME_JSON_COMPUTER)
     if ImRegBenchmark.COL_TIME not in df_experiments.columns:
         logging.warning('Missing %s among result columns.', ImRegBenchmark.COL_TIME)
         return
-    if not path_comp_bm:
-        logging.warning('Reference comp. perform. not specified.')
+    if comp_ref is None:
+        comp_ref = load_comp_benchmark(path_comp_bm)
+    if comp_ref is None:
         return
-    if not all(os.path.isfile(p) for p in [path_comp_bm, path_comp_bm_expt]):
-        logging.warning(
-            'Missing one of the JSON files: \n %s (%s)\n %s (%s)', path_comp_bm, os.path.isfile(path_comp_bm),
-            path_comp_bm_expt, os.path.isfile(path_comp_bm_expt)
-        )
+    if not os.path.isfile(path_comp_bm_expt):
+        logging.warning('Missing the experiment comp. perform. JSON: %s', path_comp_bm_expt)
         return
 
     logging.info('Normalizing the Execution time.')
-    with open(path_comp_bm, 'r') as fp:
-        comp_ref = json.load(fp)
     with open(path_comp_bm_expt, 'r') as fp:
         comp_exp = json.load(fp)
 
@@ -313,6 +373,28 @@ def _compute_scores_general(df_experiments, df_expt_robust):
     return scores
 
 
+def _aggregate_mean_median(df, by, cols):
+    """ aggregate mean and median of selected columns in a single grouping,
+    the mean skips missing values and the median is NaN if any value is missing
+    (same as :func:`numpy.median` over the group)
+
+    :param DF df: experiment table
+    :param str|list(str) by: column(s) to group by
+    :param list(str) cols: aggregated columns
+    :return dict(dict): aggregated values per statistic, column and group
+
+    >>> df = pd.DataFrame({'g': list('aabbc'), 'v': [1, 2, 3, np.nan, 5]})
+    >>> aggr = _aggregate_mean_median(df, 'g', ['v'])
+    >>> aggr['Average']['v']
+    {'a': 1.5, 'b': 3.0, 'c': 5.0}
+    >>> aggr['Median']['v']
+    {'a': 1.5, 'b': nan, 'c': 5.0}
+    """
+    grouped = df.groupby(by)[cols]
+    df_median = grouped.median().where(grouped.count().eq(grouped.size(), axis=0))
+    return {'Average': grouped.mean().to_dict(), 'Median': df_median.to_dict()}
+
+
 def _compute_scores_state_tissue(df_experiments):
     scores = {}
     if ImRegBenchmark.COL_STATUS not in df_experiments.columns:
@@ -320,22 +402,27 @@ def _compute_scores_state_tissue(df_experiments):
         df_experiments[ImRegBenchmark.COL_STATUS] = 'any'
     # filter all statuses in the experiments
     statuses = df_experiments[ImRegBenchmark.COL_STATUS].unique()
+    tissues = sorted(df_experiments[COL_TISSUE].dropna().unique())
+    measures = [('Average-rTRE', 'rTRE Mean'), ('Median-rTRE', 'rTRE Median'), ('Max-rTRE', 'rTRE Max'),
+                ('Robustness', 'Robustness')]
+    cols = [col for _, col in measures]
+    # aggregate all combinations of tissue and status at once, and their marginals
+    aggr_status = _aggregate_mean_median(df_experiments, ImRegBenchmark.COL_STATUS, cols)
+    aggr_tissue = _aggregate_mean_median(df_experiments, COL_TISSUE, cols)
+    aggr_tiss_st = _aggregate_mean_median(df_experiments, [COL_TISSUE, ImRegBenchmark.COL_STATUS], cols)
     # parse metrics according to TEST and TRAIN case
-    for name, col in [('Average-rTRE', 'rTRE Mean'), ('Median-rTRE', 'rTRE Median'), ('Max-rTRE', 'rTRE Max'),
-                      ('Robustness', 'Robustness')]:
+    for name, col in measures:
         # iterate over common measures
-        for stat_name, stat_func in [('Average', np.mean), ('Median', np.median)]:
+        for stat_name in ('Average', 'Median'):
             _sname = '%s-%s' % (stat_name, name)
             for status in statuses:
-                df_expt_ = df_experiments[df_experiments[ImRegBenchmark.COL_STATUS] == status]
-                scores['%s_%s' % (_sname, status)] = stat_func(df_expt_[col])
+                scores['%s_%s' % (_sname, status)] = aggr_status[stat_name][col].get(status, np.nan)
             # parse according to Tissue
-            for tissue, dfg_tissue in df_experiments.groupby(COL_TISSUE):
-                scores['%s__tissue_%s__All' % (_sname, tissue)] = stat_func(dfg_tissue[col])
+            for tissue in tissues:
+                scores['%s__tissue_%s__All' % (_sname, tissue)] = aggr_tissue[stat_name][col][tissue]
                 # also per state in tissue
                 for status in statuses:
-                    df_tiss_st_ = dfg_tissue[dfg_tissue[ImRegBenchmark.COL_STATUS] == status]
-                    stat = stat_func(df_tiss_st_[col]) if not df_tiss_st_.empty else np.nan
+                    stat = aggr_tiss_st[stat_name][col].get((tissue, status), np.nan)
                     scores['%s__tissue_%s__%s' % (_sname, tissue, status)] = stat
     return scores
 
@@ -407,6 +494,23 @@ def export_summary_json(df_experiments, path_experiments, path_output, min_landm
     return path_json
 
 
+def _list_folder_files(path_folder):
+    """ scan the folder tree once and list all files relative to the folder
+
+    :param str path_folder: path to the folder
+    :return set(str): normalised relative paths of all files
+
+    >>> path_dir = os.path.abspath(os.path.dirname(__file__))
+    >>> 'evaluate_submission.py' in _list_folder_files(path_dir)
+    True
+    """
+    paths = set()
+    for path_root, _, file_names in os.walk(path_folder):
+        path_rel = os.path.relpath(path_root, path_folder)
+        paths.update(os.path.normpath(os.path.join(path_rel, n)) for n in file_names)
+    return paths
+
+
 def replicate_missing_warped_landmarks(df_experiments, path_dataset, path_experiment):
     """ if some warped landmarks are missing replace the path by initial landmarks
 
@@ -427,20 +531,26 @@ def replicate_missing_warped_landmarks(df_experiments, path_dataset, path_experi
     df_experiments.loc[missing_mask, ImRegBenchmark.COL_TIME] = \
         df_experiments[ImRegBenchmark.COL_TIME].max()
 
-    count = 0
-    # iterate over whole table and check if the path is valid
-    for idx, row in df_experiments.iterrows():
-        # select refence/moving warped landmarks
-        use_move_warp = isinstance(row.get(ImRegBenchmark.COL_POINTS_MOVE_WARP), str)
-        col_lnds_warp = ImRegBenchmark.COL_POINTS_MOVE_WARP \
-            if use_move_warp else ImRegBenchmark.COL_POINTS_REF_WARP
-        # extract the CSV path
-        path_csv = update_path(row[col_lnds_warp], pre_path=path_experiment)
-        if not os.path.isfile(path_csv):
-            # if the path is false, put there the initial from dataset
-            path_csv = update_path(row[ImRegBenchmark.COL_POINTS_MOVE], pre_path=path_dataset)
-            df_experiments.loc[idx, ImRegBenchmark.COL_POINTS_MOVE_WARP] = path_csv
-            count += 1
+    # select refence/moving warped landmarks
+    paths_warp = df_experiments[ImRegBenchmark.COL_POINTS_MOVE_WARP]
+    use_move_warp = paths_warp.map(lambda p: isinstance(p, str))
+    if ImRegBenchmark.COL_POINTS_REF_WARP in df_experiments.columns:
+        paths_warp = paths_warp.where(use_move_warp, df_experiments[ImRegBenchmark.COL_POINTS_REF_WARP])
+    # check if the paths are valid against single scan of the experiment folder
+    paths_warp = paths_warp.astype(str)
+    mask_abs = paths_warp.str.startswith('/') | paths_warp.str.startswith('~')
+    exp_files = _list_folder_files(path_experiment)
+    valid = paths_warp.map(os.path.normpath).isin(exp_files)
+    valid[mask_abs] = paths_warp[mask_abs].map(lambda p: os.path.isfile(os.path.expanduser(p)))
+    valid = valid.astype(bool)
+
+    # if the path is false, put there the initial from dataset
+    paths_init = df_experiments.loc[~valid, ImRegBenchmark.COL_POINTS_MOVE].astype(str)
+    mask_abs = paths_init.str.startswith('/') | paths_init.str.startswith('~')
+    paths_init = paths_init.where(mask_abs, os.path.abspath(path_dataset) + os.sep + paths_init)
+    df_experiments.loc[~valid, ImRegBenchmark.COL_POINTS_MOVE_WARP] = \
+        paths_init.map(lambda p: os.path.normpath(os.path.expanduser(p)))
+    count = int((~valid).sum())
 
     logging.info('Missing warped landmarks: %i', count)
     return df_experiments
@@ -472,9 +582,45 @@ def swap_inverse_experiment(table, allow_inverse):
     return table
 
 
-def main(
+def load_cover_table(path_table):
+    """ load the cover table with requested registration pairs, without any results
+
+    :param str path_table: path to assignment file (requested registration pairs)
+    :return DF: cover table
+    """
+    # drop time column from Cover which should be empty
+    df_overview = pd.read_csv(path_table).drop([ImRegBenchmark.COL_TIME], axis=1, errors='ignore')
+    df_overview = _df_drop_unnamed(df_overview)
+    # drop Warp* column from Cover which should be empty
+    df_overview = df_overview.drop(
+        [col for col in df_overview.columns if 'warped' in col.lower()],
+        axis=1,
+        errors='ignore',
+    )
+    return df_overview
+
+
+def load_ground_truth(df_overview, path_dataset, path_reference=None):
+    """ load all provided and reference landmarks of the cover table once,
+    so they are shared by evaluations of several submissions
+
+    :param DF df_overview: cover table, see :func:`load_cover_table`
+    :param str path_dataset: path to provided landmarks
+    :param str|None path_reference: path to the complete landmark collection,
+        if None use dataset folder
+    :return dict: landmarks and their file hashes, see :func:`birl.benchmark.preload_landmarks`
+    """
+    cols = [ImRegBenchmark.COL_POINTS_REF, ImRegBenchmark.COL_POINTS_MOVE]
+    paths = pd.unique(df_overview[cols].values.ravel())
+    folders = set(p for p in (path_dataset, path_reference) if p)
+    paths = [update_path(p, pre_path=folder) for p in paths if pd.notnull(p) for folder in folders]
+    logging.info('loading %i landmarks files of the ground truth', len(paths))
+    return preload_landmarks(paths)
+
+
+def evaluate_experiment(
     path_experiment,
-    path_table,
+    df_overview,
     path_dataset,
     path_output,
     path_reference=None,
@@ -482,38 +628,34 @@ def main(
     min_landmarks=1.,
     details=True,
     allow_inverse=False,
+    path_cache=None,
+    landmarks=None,
+    comp_ref=None,
 ):
-    """ main entry point
+    """ evaluate single submission with already loaded cover table
 
     :param str path_experiment: path to experiment folder
-    :param str path_table: path to assignment file (requested registration pairs)
+    :param DF df_overview: cover table, see :func:`load_cover_table`
     :param str path_dataset: path to provided landmarks
     :param str path_output: path to generated results
     :param str|None path_reference: path to the complete landmark collection,
         if None use dataset folder
     :param str|None path_comp_bm: path to reference comp. benchmark
-    :param int nb_workers: number of parallel processes
     :param float min_landmarks: required number of submitted landmarks in range (0, 1),
         match values in COL_PAIRED_LANDMARKS
     :param bool details: exporting case details
     :param bool allow_inverse: allow evaluate also inverse transformation,
         warped landmarks from ref to move image
+    :param str|None path_cache: path to folder caching the landmarks pairing
+    :param dict|None landmarks: already loaded provided and reference landmarks, see :func:`load_ground_truth`
+    :param dict|None comp_ref: already loaded reference comp. benchmark, see :func:`load_comp_benchmark`
+    :return tuple(DF,str): evaluated experiments and path to exported results
     """
-
     path_results = os.path.join(path_experiment, ImRegBenchmark.NAME_CSV_REGISTRATION_PAIRS)
     if not os.path.isfile(path_results):
         raise AttributeError('Missing experiments results: %s' % path_results)
     path_reference = path_dataset if not path_reference else path_reference
 
-    # drop time column from Cover which should be empty
-    df_overview = pd.read_csv(path_table).drop([ImRegBenchmark.COL_TIME], axis=1, errors='ignore')
-    df_overview = _df_drop_unnamed(df_overview)
-    # drop Warp* column from Cover which should be empty
-    df_overview = df_overview.drop(
-        [col for col in df_overview.columns if 'warped' in col.lower()],
-        axis=1,
-        errors='ignore',
-    )
     df_results = pd.read_csv(path_results)
     df_results = _df_drop_unnamed(df_results)
     # df_results.drop(filter(lambda c: 'Unnamed' in c, df_results.columns), axis=1, inplace=True)
@@ -527,7 +669,7 @@ def main(
 
     df_experiments = replicate_missing_warped_landmarks(df_experiments, path_dataset, path_experiment)
 
-    normalize_exec_time(df_experiments, path_experiment, path_comp_bm)
+    normalize_exec_time(df_experiments, path_experiment, path_comp_bm, comp_ref=comp_ref)
 
     # logging.info('Filter used landmarks.')
     # path_filtered = os.path.join(path_output, FOLDER_FILTER_DATASET)
@@ -545,6 +687,8 @@ def main(
         path_dataset=path_dataset,
         path_experiment=path_experiment,
         path_reference=path_reference,
+        path_cache=path_cache,
+        landmarks=landmarks,
     )
     # NOTE: this has to run in SINGLE thread so there is SINGLE table instance
     list(iterate_mproc_map(_compute_lnds_stat, df_experiments.iterrows(), desc='Statistic', nb_workers=1))
@@ -555,13 +699,216 @@ def main(
     df_experiments.to_csv(path_results)
 
     path_json = export_summary_json(df_experiments, path_experiment, path_output, min_landmarks, details)
+    return df_experiments, path_json
+
+
+def main(
+    path_experiment,
+    path_table,
+    path_dataset,
+    path_output,
+    path_reference=None,
+    path_comp_bm=None,
+    min_landmarks=1.,
+    details=True,
+    allow_inverse=False,
+    path_cache=None,
+):
+    """ main entry point
+
+    :param str path_experiment: path to experiment folder
+    :param str path_table: path to assignment file (requested registration pairs)
+    :param str path_dataset: path to provided landmarks
+    :param str path_output: path to generated results
+    :param str|None path_reference: path to the complete landmark collection,
+        if None use dataset folder
+    :param str|None path_comp_bm: path to reference comp. benchmark
+    :param float min_landmarks: required number of submitted landmarks in range (0, 1),
+        match values in COL_PAIRED_LANDMARKS
+    :param bool details: exporting case details
+    :param bool allow_inverse: allow evaluate also inverse transformation,
+        warped landmarks from ref to move image
+    :param str|None path_cache: path to folder caching the landmarks pairing, so it is shared
+        among evaluations of several submissions
+    """
+    df_overview = load_cover_table(path_table)
+    _, path_json = evaluate_experiment(
+        path_experiment,
+        df_overview,
+        path_dataset,
+        path_output,
+        path_reference=path_reference,
+        path_comp_bm=path_comp_bm,
+        min_landmarks=min_landmarks,
+        details=details,
+        allow_inverse=allow_inverse,
+        path_cache=path_cache,
+    )
     return path_json
 
 
+def _evaluate_submission(name_path_experiment, path_output, **kwargs):
+    """ evaluate one of several submissions in its own output folder
+
+    :param tuple(str,str) name_path_experiment: unique submission name and path to experiment folder
+    :param str path_output: path to the common output folder
+    :return tuple(str,str,dict): submission name, path to results and measures per case for ranking
+    """
+    name, path_experiment = name_path_experiment
+    path_out = create_folder(os.path.join(path_output, name), ok_existing=True)
+    df_experiments, path_json = evaluate_experiment(path_experiment, path_output=path_out, **kwargs)
+    cols = [col for col, _ in RANKING_CASE_MEASURES if col in df_experiments.columns]
+    cases = {
+        str(idx): {col: row[col] for col in cols}
+        for idx, row in df_experiments[cols].iterrows()
+    }
+    return name, path_json, cases
+
+
+def _submission_names(paths_experiments):
+    """ name the submissions by their folders, the same names get numbered suffix
+
+    :param list(str) paths_experiments: paths to experiment folders
+    :return list(str): unique names
+
+    >>> _submission_names(['a/Bm1', 'b/Bm2', 'c/Bm1/', 'd/Bm1'])
+    ['Bm1', 'Bm2', 'Bm1-2', 'Bm1-3']
+    """
+    names, counts = [], {}
+    for path in paths_experiments:
+        name = os.path.basename(os.path.normpath(path))
+        counts[name] = counts.get(name, 0) + 1
+        if counts[name] > 1:
+            logging.warning('submission name "%s" is used several times, renamed for: %s', name, path)
+            name = '%s-%i' % (name, counts[name])
+        names.append(name)
+    return names
+
+
+def rank_submissions(user_cases, user_scores):
+    """ rank the submissions, first over each case and then over the aggregated scores
+
+    :param dict(dict(dict)) user_cases: measures per submission and case
+    :param dict(dict) user_scores: aggregated scores per submission
+    :return DF: ranking table with submissions in rows
+
+    >>> user_cases = {'a': {1: {'rTRE Median': 0.1, 'rTRE Max': 0.2}, 2: {'rTRE Median': 0.3, 'rTRE Max': 0.5}},
+    ...               'b': {1: {'rTRE Median': 0.2, 'rTRE Max': 0.1}, 2: {'rTRE Median': 0.1, 'rTRE Max': 0.2}}}
+    >>> user_scores = {'a': {'Average-Robustness': 0.9}, 'b': {'Average-Robustness': 0.8}}
+    >>> df = rank_submissions(user_cases, user_scores)
+    >>> df[['Average-Rank-Median-rTRE', 'Average-Rank-Max-rTRE', 'Average-Robustness']].values.tolist()
+    [[1.5, 2.0, 0.9], [1.5, 1.0, 0.8]]
+    >>> df[['Average-Rank-Median-rTRE_rank', 'Average-Rank-Max-rTRE_rank', 'Average-Robustness_rank']].values.tolist()
+    [[1, 2, 1], [2, 1, 2]]
+    """
+    for col, name in RANKING_CASE_MEASURES:
+        user_cases = compute_ranking(user_cases, col)
+        for user in user_cases:
+            ranks = [user_cases[user][cs][col + '_rank'] for cs in user_cases[user]]
+            user_scores[user][name] = np.mean(ranks) if ranks else np.nan
+
+    df_scores = pd.DataFrame(user_scores).T
+    cols = [col for col, _ in RANKING_SCORES if col in df_scores.columns]
+    df_ranking = df_scores[cols].astype(float)
+    for col, higher_better in RANKING_SCORES:
+        if col not in df_scores.columns:
+            continue
+        # the matrix ranking gives ordered users, so invert it to rank per user
+        order = compute_matrix_user_ranking(df_ranking[[col]], higher_better)[:, 0]
+        ranks = pd.Series(np.nan, index=df_ranking.index)
+        for i, idx in enumerate(order):
+            if not np.isnan(idx):
+                ranks.iloc[int(idx)] = i + 1
+        df_ranking[col + '_rank'] = ranks.astype(int) if not ranks.isnull().any() else ranks
+    return df_ranking
+
+
+def evaluate_submissions(
+    paths_experiments,
+    path_table,
+    path_dataset,
+    path_output,
+    path_reference=None,
+    path_comp_bm=None,
+    min_landmarks=1.,
+    details=True,
+    allow_inverse=False,
+    path_cache=None,
+    nb_workers=NB_WORKERS,
+):
+    """ evaluate several submissions in parallel sharing the loaded cover table, ground truth landmarks,
+    reference comp. benchmark and landmarks pairing, each submission is exported into its own folder
+    (named by the experiment folder, repeated names get numbered suffix) and all of them are ranked together
+
+    :param list(str) paths_experiments: paths to experiment folders
+    :param str path_table: path to assignment file (requested registration pairs)
+    :param str path_dataset: path to provided landmarks
+    :param str path_output: path to generated results
+    :param str|None path_reference: path to the complete landmark collection,
+        if None use dataset folder
+    :param str|None path_comp_bm: path to reference comp. benchmark
+    :param float min_landmarks: required number of submitted landmarks in range (0, 1),
+        match values in COL_PAIRED_LANDMARKS
+    :param bool details: exporting case details
+    :param bool allow_inverse: allow evaluate also inverse transformation,
+        warped landmarks from ref to move image
+    :param str|None path_cache: path to folder caching the landmarks pairing,
+        if None it is created in the output folder
+    :param int nb_workers: number of submissions evaluated in parallel
+    :return str: path to the ranking table
+    """
+    df_overview = load_cover_table(path_table)
+    landmarks = load_ground_truth(df_overview, path_dataset, path_reference)
+    comp_ref = load_comp_benchmark(path_comp_bm)
+    path_cache = path_cache or os.path.join(path_output, FOLDER_CACHE_PAIRING)
+
+    _wrap_eval = partial(
+        _evaluate_submission,
+        df_overview=df_overview,
+        path_dataset=path_dataset,
+        path_output=path_output,
+        path_reference=path_reference,
+        min_landmarks=min_landmarks,
+        details=details,
+        allow_inverse=allow_inverse,
+        path_cache=path_cache,
+        landmarks=landmarks,
+        comp_ref=comp_ref,
+    )
+    names_paths = list(zip(_submission_names(paths_experiments), paths_experiments))
+    user_cases, user_paths = {}, {}
+    for name, path_json, cases in iterate_mproc_map(
+            _wrap_eval, names_paths, desc='Evaluating submissions', nb_workers=nb_workers):
+        user_cases[name], user_paths[name] = cases, path_json
+
+    user_metrics = {}
+    for name, path_json in user_paths.items():
+        with open(path_json, 'r') as fp:
+            user_metrics[name] = json.load(fp)
+    df_ranking = rank_submissions(user_cases, {n: user_metrics[n]['aggregates'] for n in user_metrics})
+
+    # update the case ranking in the individual results
+    for name, metrics in user_metrics.items():
+        for _, col in RANKING_CASE_MEASURES:
+            metrics['aggregates'][col] = df_ranking.loc[name, col]
+        with open(user_paths[name], 'w') as fp:
+            json.dump(metrics, fp)
+
+    path_csv = os.path.join(path_output, NAME_CSV_RANKING)
+    logging.info('exporting ranking of %i submissions: %s', len(df_ranking), path_csv)
+    df_ranking.to_csv(path_csv)
+    return path_csv
+
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
 
-    arg_params = parse_arg_params(create_parser())
+    arg_params = parse_arg_params(create_parser(), upper_dirs=['path_cache'])
     logging.info('running...')
-    main(**arg_params)
+    nb_workers = arg_params.pop('nb_workers', NB_WORKERS)
+    if glob.has_magic(arg_params['path_experiment']):
+        paths_expt = sorted(p for p in glob.glob(arg_params.pop('path_experiment')) if os.path.isdir(p))
+        evaluate_submissions(paths_expt, nb_workers=nb_workers, **arg_params)
+    else:
+        main(**arg_params)
     logging.info('DONE')
@@ -7,12 +7,17 @@ of a particular level (regarding the pyramid) using mosaic techniques
 Be aware that this conversion takes lots of memory, for example
 image of size 50k x 60k takes about 10GB in RAM
 
+The `tiles` mode reads the slide regions in a thread pool (OpenSlide releases GIL)
+and streams them into a tiled BigTIFF `<name>_tiled.tif`, so the full raster is never held in memory.
+
 Sample usage::
 
     python convert_tiff2png.py -l 0 --nb_workers 2 \
         -i "/datagrid/Medical/dataset_ANHIR/images_raw/*/*.tiff"
     python convert_tiff2png.py -l 1 --nb_workers 5 --overwrite \
         -i "/datagrid/Medical/dataset_ANHIR/images_raw/*/*.svs"
+    python convert_tiff2png.py -l 0 --mode tiles --nb_threads 8 --codec zlib --compression 6 \
+        -i "/datagrid/Medical/dataset_ANHIR/images_raw/*/*.svs"
 
 
 Copyright (C) 2016-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
@@ -26,6 +31,7 @@ import os
 import sys
 import time
 from functools import partial
+from multiprocessing.pool import ThreadPool
 
 import cv2 as cv
 import numpy as np
@@ -38,6 +44,10 @@ except (ImportError, OSError):
         'It seems that you do not have installed OpenSlide on your computer.'
         ' To do so, please follow instructions - https://openslide.org/'
     )
+try:
+    import tifffile
+except ImportError:
+    print('It seems that you do not have installed `tifffile`, which is required for the tiled export.')
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.utilities.dataset import args_expand_parse_images
@@ -46,7 +56,19 @@ from birl.utilities.experiments import get_nb_workers, iterate_mproc_map
 DEFAULT_LEVEL = 1
 MAX_LOAD_IMAGE_SIZE = 16000
 IMAGE_EXTENSION = '.png'
+#: output name suffix and extension for the streamed tiled export, distinct from the input slides
+IMAGE_SUFFIX_TILED = '_tiled.tif'
 NB_WORKERS = get_nb_workers(0.5)
+#: number of threads reading slide regions in the tiled export
+NB_THREADS = get_nb_workers(0.5)
+#: supported export modes - assembled full raster to PNG or streamed tiles to BigTIFF
+EXPORT_MODES = ('mosaic', 'tiles')
+#: tile size for the tiled export, TIFF requires multiple of 16
+TILE_SIZE = 1024
+#: default compression level for both PNG and TIFF export
+COMPRESSION_LEVEL = 9
+#: default compression codec for the tiled export
+COMPRESSION_CODEC = 'zlib'
 
 
 def arg_parse_params():
@@ -56,12 +78,28 @@ def arg_parse_params():
     # SEE: https://docs.python.org/3/library/argparse.html
     parser = argparse.ArgumentParser()
     parser.add_argument('-l', '--level', type=int, required=False, help='list of output scales', default=DEFAULT_LEVEL)
+    parser.add_argument(
+        '--mode', type=str, required=False, choices=EXPORT_MODES, default=EXPORT_MODES[0], help='export mode'
+    )
+    parser.add_argument(
+        '--nb_threads', type=int, required=False, default=NB_THREADS, help='threads reading regions in tiled mode'
+    )
+    parser.add_argument(
+        '--codec',
+        type=str,
+        required=False,
+        default=COMPRESSION_CODEC,
+        help='compression codec for tiled mode, `none` disables the compression'
+    )
+    parser.add_argument(
+        '--compression', type=int, required=False, default=COMPRESSION_LEVEL, help='compression level'
+    )
     args = args_expand_parse_images(parser, NB_WORKERS)
     logging.info('ARGUMENTS: \n%r' % args)
     return args
 
 
-def convert_image(path_img, level=DEFAULT_LEVEL, overwrite=False):
+def convert_image(path_img, level=DEFAULT_LEVEL, overwrite=False, compression=COMPRESSION_LEVEL):
     """ convert TIFF/SVS image to standard format
     The output image has the same name and it is exported in the same folder
 
@@ -69,6 +107,7 @@ def convert_image(path_img, level=DEFAULT_LEVEL, overwrite=False):
     :param int level: selected level of the internal pyramid representation
         the level 0 means full scale and higher number is small image in pyramid scaling
     :param bool overwrite: whether overwrite existing image on output
+    :param int compression: PNG compression level in range (0, 9)
     """
     slide_img = OpenSlide(path_img)
     if level >= len(slide_img.level_dimensions):
@@ -103,12 +142,120 @@ def convert_image(path_img, level=DEFAULT_LEVEL, overwrite=False):
         image = image[:, :, 0]
 
     logging.debug('save image: "%s"', path_img_new)
-    cv.imwrite(path_img_new, image, params=(cv.IMWRITE_PNG_COMPRESSION, 9))
+    cv.imwrite(path_img_new, image, params=(cv.IMWRITE_PNG_COMPRESSION, compression))
     gc.collect()
     time.sleep(1)
 
 
-def main(path_images, level=DEFAULT_LEVEL, overwrite=False, nb_workers=1):
+def _read_slide_tile(slide_img, level, location, tile_size, nb_channels):
+    """ read a single tile from selected pyramid level, tiles on the image border are zero padded
+
+    :param slide_img: opened OpenSlide image
+    :param int level: selected level of the internal pyramid representation
+    :param tuple(int,int) location: tile position (x, y) in the level coordinates
+    :param int tile_size: size of the squared tile
+    :param int nb_channels: number of exported channels
+    :return ndarray: np.array<tile_size, tile_size[, nb_channels]>
+    """
+    loc_i, loc_j = location
+    width, height = slide_img.level_dimensions[level]
+    level_scale = slide_img.level_downsamples[level]
+    loc_img = int(loc_i * level_scale), int(loc_j * level_scale)
+    size = min(tile_size, width - loc_i), min(tile_size, height - loc_j)
+    img = np.array(slide_img.read_region(loc_img, level, size=size))
+    tile = np.zeros((tile_size, tile_size, nb_channels), dtype=np.uint8)
+    tile[:img.shape[0], :img.shape[1], :] = img[:, :, :nb_channels]
+    return tile[:, :, 0] if nb_channels == 1 else tile
+
+
+def convert_image_tiles(
+    path_img,
+    level=DEFAULT_LEVEL,
+    overwrite=False,
+    nb_threads=NB_THREADS,
+    codec=COMPRESSION_CODEC,
+    compression=COMPRESSION_LEVEL,
+    tile_size=TILE_SIZE,
+):
+    """ convert TIFF/SVS image to tiled BigTIFF streaming tiles without holding the full raster
+    The output image has the same name with suffix `_tiled.tif` and it is exported in the same folder
+
+    The tiles are read by a thread pool row by row, so there is at most one row of tiles in memory.
+
+    :param str path_img: path to the input image
+    :param int level: selected level of the internal pyramid representation
+        the level 0 means full scale and higher number is small image in pyramid scaling
+    :param bool overwrite: whether overwrite existing image on output
+    :param int nb_threads: number of threads reading the slide regions
+    :param str|None codec: compression codec supported by `tifffile`, e.g. `zlib`, `lzma` or `zstd`,
+        None or `none` means no compression
+    :param int|None compression: compression level, the range depends on the codec
+    :param int tile_size: size of the squared tile, has to be multiple of 16
+    """
+    if tile_size % 16:
+        raise ValueError('tile size %i has to be multiple of 16' % tile_size)
+    if codec and codec.lower() == 'none':
+        codec = None
+    path_img_new = os.path.splitext(path_img)[0] + IMAGE_SUFFIX_TILED
+    # the slide is still read while the output is written
+    if os.path.realpath(path_img_new) == os.path.realpath(path_img):
+        raise ValueError('the output image "%s" would overwrite the input' % path_img_new)
+    slide_img = OpenSlide(path_img)
+    if level >= len(slide_img.level_dimensions):
+        raise ValueError('unsupported level %i of %i' % (level, slide_img.level_count))
+
+    if os.path.isfile(path_img_new) and not overwrite:
+        logging.warning('existing "%s"', path_img_new)
+        return
+
+    width, height = slide_img.level_dimensions[level]
+    im = np.array(slide_img.read_region((0, 0), 0, size=(10, 10)))
+    nb_channels = min(3, im.shape[2]) if im.ndim == 3 else 1
+    # two channels are gray with alpha, the same as in `convert_image`
+    nb_channels = 1 if nb_channels == 2 else nb_channels
+    img_shape = (height, width, nb_channels) if nb_channels > 1 else (height, width)
+    tile_rows = [[(i, j) for i in range(0, width, tile_size)] for j in range(0, height, tile_size)]
+
+    _read_tile = partial(
+        _read_slide_tile, slide_img, level, tile_size=tile_size, nb_channels=nb_channels
+    )
+    pool = ThreadPool(max(1, nb_threads))
+
+    def _iterate_tiles():
+        for locations in tqdm.tqdm(tile_rows, desc=os.path.basename(path_img)):
+            # reading just one row at a time keeps the memory bounded
+            for tile in pool.map(_read_tile, locations):
+                yield tile
+
+    logging.debug('save image: "%s"', path_img_new)
+    compress_args = {'level': compression} if codec and compression is not None else None
+    try:
+        tifffile.imwrite(
+            path_img_new,
+            data=_iterate_tiles(),
+            shape=img_shape,
+            dtype=np.uint8,
+            tile=(tile_size, tile_size),
+            photometric='rgb' if nb_channels == 3 else 'minisblack',
+            bigtiff=True,
+            compression=codec,
+            compressionargs=compress_args,
+        )
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main(
+    path_images,
+    level=DEFAULT_LEVEL,
+    overwrite=False,
+    nb_workers=1,
+    mode=EXPORT_MODES[0],
+    nb_threads=NB_THREADS,
+    codec=COMPRESSION_CODEC,
+    compression=COMPRESSION_LEVEL,
+):
     """ main entry point
 
     :param str path_images: path to images
@@ -116,10 +263,26 @@ def main(path_images, level=DEFAULT_LEVEL, overwrite=False, nb_workers=1):
         the level 0 means full scale and higher number is small image in pyramid scaling
     :param bool overwrite: whether overwrite existing image on output
     :param int nb_workers: nb jobs running in parallel
+    :param str mode: export mode, see `EXPORT_MODES`
+    :param int nb_threads: number of threads reading the slide regions, only for `tiles` mode
+    :param str codec: compression codec, only for `tiles` mode, `none` disables the compression
+    :param int compression: compression level
     """
     paths_img = sorted(glob.glob(path_images))
 
-    _wrap_convert = partial(convert_image, level=level, overwrite=overwrite)
+    if mode == 'tiles':
+        # skip outputs of previous runs matched by the same pattern
+        paths_img = [p for p in paths_img if not p.endswith(IMAGE_SUFFIX_TILED)]
+        _wrap_convert = partial(
+            convert_image_tiles,
+            level=level,
+            overwrite=overwrite,
+            nb_threads=nb_threads,
+            codec=codec,
+            compression=compression,
+        )
+    else:
+        _wrap_convert = partial(convert_image, level=level, overwrite=overwrite, compression=compression)
 
     list(iterate_mproc_map(_wrap_convert, paths_img, desc='Converting images', nb_workers=nb_workers))
 
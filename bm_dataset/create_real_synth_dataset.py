@@ -10,16 +10,32 @@ Sample run::
         -l ../data-images/landmarks/Rat-Kidney_HE.csv \
         -o ../output/synth_dataset  --visual
 
+Multiple source images can be given by image and landmarks patterns (matched by sorted order)
+or by a cover table; all (image, sample) jobs run in a single pool with images in shared memory::
+
+    python create_real_synth_dataset.py \
+        -i "../data-images/images/*.jpg" \
+        -l "../data-images/landmarks/*.csv" \
+        -o ../output/synth_dataset -n 3
+    python create_real_synth_dataset.py \
+        -t ../data-images/pairs-imgs-lnds_mix.csv \
+        -o ../output/synth_dataset -n 3
+
+In both cases the script exports also a table with registration pairs `registration-pairs.csv`.
+
 Copyright (C) 2016-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 """
 
 import argparse
+import glob
 import logging
 import multiprocessing as mproc
+import multiprocessing.util as mproc_util
 import os
 import sys
 from functools import partial
 
+import cv2 as cv
 import matplotlib
 
 # in case you are running on machine without display, e.g. server
@@ -32,10 +48,16 @@ import numpy as np
 import pandas as pd
 import tqdm
 from PIL import Image
-from scipy import interpolate, ndimage, stats
+from scipy import interpolate, ndimage
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # it is available since Python 3.8
+    shared_memory = None
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
-from birl.utilities.data_io import LANDMARK_COORDS
+from birl.benchmark import _df_drop_unnamed, ImRegBenchmark
+from birl.utilities.data_io import LANDMARK_COORDS, update_path
 from birl.utilities.experiments import get_nb_workers, parse_arg_params
 
 COLUMNS_COORD = LANDMARK_COORDS
@@ -47,6 +69,18 @@ FIG_MAX_SIZE = 16
 DEFORMATION_MAX = 50
 DEFORMATION_SMOOTH = 25
 DEFORMATION_BOUNDARY_COEF = 3
+#: spacing of the control grid (in pixels) where the deformation field is evaluated
+DEFORMATION_GRID_STEP = 16
+#: models of the random deformation field
+DEFORMATION_MODELS = ('rbf', 'gauss')
+#: number of image rows warped at once
+WARP_TILE_SIZE = 512
+#: OpenCV remap is limited to images smaller then SHRT_MAX in any dimension
+CV_REMAP_MAX_SIZE = 32767
+#: name of the exported table with registration pairs
+NAME_CSV_PAIRS = 'registration-pairs.csv'
+#: source images accessible in a worker, filled by the pool initializer
+_SOURCE_IMAGES = {}
 
 
 def arg_parse_params():
@@ -55,12 +89,28 @@ def arg_parse_params():
     """
     # SEE: https://docs.python.org/3/library/argparse.html
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--path_image', type=str, required=True, help='path to the input image')
-    parser.add_argument('-l', '--path_landmarks', type=str, required=True, help='path to the input landmarks')
+    parser.add_argument('-i', '--path_image', type=str, required=False, help='path (pattern) to the input image(s)')
+    parser.add_argument(
+        '-l', '--path_landmarks', type=str, required=False, help='path (pattern) to the input landmarks'
+    )
+    parser.add_argument(
+        '-t', '--path_table', type=str, required=False, help='cover table with source images and landmarks'
+    )
+    parser.add_argument(
+        '-d', '--path_dataset', type=str, required=False, help='path to the dataset, prefix for paths in cover table'
+    )
     parser.add_argument('-o', '--path_out', type=str, required=True, help='path to the output folder')
     parser.add_argument(
         '-n', '--nb_samples', type=int, required=False, help='number of deformed images', default=NB_DEFORMATIONS
     )
+    parser.add_argument(
+        '--deform_model',
+        type=str,
+        required=False,
+        default=DEFORMATION_MODELS[0],
+        choices=DEFORMATION_MODELS,
+        help='model of the random deformation, thin plate spline or sum of Gaussians'
+    )
     parser.add_argument(
         '--visual', action='store_true', required=False, default=False, help='visualise the landmarks in images'
     )
@@ -68,37 +118,81 @@ def arg_parse_params():
         '--nb_workers', type=int, required=False, default=NB_WORKERS, help='number of processes in parallel'
     )
     args = parse_arg_params(parser, upper_dirs=['path_out'])
+    if 'path_table' not in args and not all(k in args for k in ('path_image', 'path_landmarks')):
+        parser.error('required either `path_table` or both `path_image` and `path_landmarks`')
     args['visual'] = bool(args['visual'])
     return args
 
 
-def generate_deformation_field_gauss(shape, points, max_deform=DEFORMATION_MAX, deform_smooth=DEFORMATION_SMOOTH):
+def generate_deformation_field_gauss(
+    shape,
+    points,
+    max_deform=DEFORMATION_MAX,
+    deform_smooth=DEFORMATION_SMOOTH,
+    grid_step=None,
+    rand_seed=None,
+):
     """ generate deformation field as combination of positive and
     negative Galatians densities scaled in range +/- max_deform
 
+    All Gaussian kernels are evaluated at once in a coarse control grid
+    which is up-sampled before the final smoothing.
+
     :param tuple(int,int) shape: tuple of size 2
     :param points: <nb_points, 2> list of landmarks
     :param float max_deform: maximal deformation distance in any direction
     :param float deform_smooth: smoothing the deformation by Gaussian filter
+    :param int|None grid_step: spacing of the control grid, `1` means evaluation in every pixel;
+        by default it is a quarter of the smoothing, so the sub-sampling is hidden by the final filter
+    :param int|None rand_seed: seed for the random generator, for reproducible deformations;
+        by default the global random state is used, so it follows `np.random.seed`
     :return: np.array<shape>
+
+    >>> pts = np.array([[20, 30], [60, 70], [80, 25]])
+    >>> field = generate_deformation_field_gauss((100, 120), pts, max_deform=10, deform_smooth=5, rand_seed=0)
+    >>> field.shape
+    (100, 120)
+    >>> field_2 = generate_deformation_field_gauss((100, 120), pts, max_deform=10, deform_smooth=5, rand_seed=0)
+    >>> np.array_equal(field, field_2)
+    True
+    >>> np.random.seed(0)
+    >>> field_3 = generate_deformation_field_gauss((100, 120), pts, max_deform=10, deform_smooth=5)
+    >>> np.array_equal(field, field_3)
+    True
     """
+    if grid_step is None:
+        grid_step = max(1, int(deform_smooth / 4.))
+    rnd = np.random if rand_seed is None else np.random.RandomState(rand_seed)
+    points = np.asarray(points, dtype=float)
     ndim = len(shape)
-    x, y = np.mgrid[0:shape[0], 0:shape[1]]
-    pos_grid = np.rollaxis(np.array([x, y]), 0, 3)
-    # initialise the deformation
-    deform = np.zeros(shape)
-    for point in points:
-        sign = np.random.choice([-1, 1])
-        cov = np.random.random((ndim, ndim))
-        cov[np.eye(ndim, dtype=bool)] = 100 * np.random.random(ndim)
+    # draw random sign and covariance for each Gaussian
+    signs, covs = [], []
+    for _ in points:
+        signs.append(rnd.choice([-1, 1]))
+        cov = rnd.random_sample((ndim, ndim))
+        cov[np.eye(ndim, dtype=bool)] = 100 * rnd.random_sample(ndim)
         # obtain a positive semi-definite matrix
-        cov = np.dot(cov, cov.T) * (0.1 * np.mean(shape))
-        gauss = stats.multivariate_normal(point, cov)
-        deform += sign * gauss.pdf(pos_grid)
+        covs.append(np.dot(cov, cov.T) * (0.1 * np.mean(shape)))
+    signs, covs = np.array(signs), np.array(covs).reshape(-1, ndim, ndim)
+    covs_inv = np.linalg.inv(covs)
+    norms = signs / np.sqrt((2 * np.pi)**ndim * np.linalg.det(covs))
+
+    nodes_x = _deformation_grid_nodes(shape[0], grid_step)
+    nodes_y = _deformation_grid_nodes(shape[1], grid_step)
+    grid_x, grid_y = np.meshgrid(nodes_x, nodes_y, indexing='ij')
+    nodes = np.array([grid_x.ravel(), grid_y.ravel()]).T
+    deform = np.zeros(len(nodes))
+    # process the points in batches to keep the intermediate arrays reasonably small
+    batch = max(1, int(1e7 // max(len(nodes), 1)))
+    for i in range(0, len(points), batch):
+        diff = nodes[np.newaxis] - points[i:i + batch, np.newaxis]
+        dist = np.einsum('pni,pij,pnj->pn', diff, covs_inv[i:i + batch], diff)
+        deform += np.dot(norms[i:i + batch], np.exp(-0.5 * dist))
+    deform = upsample_deformation_block(deform.reshape(grid_x.shape), shape, (0, shape[0]))
     # normalise the deformation and multiply by the amplitude
     deform *= max_deform / np.abs(deform).max()
     # set boundary region to zeros
-    fix_deform_bounds = DEFORMATION_BOUNDARY_COEF * deform_smooth
+    fix_deform_bounds = int(DEFORMATION_BOUNDARY_COEF * deform_smooth)
     deform[:fix_deform_bounds, :] = 0
     deform[-fix_deform_bounds:, :] = 0
     deform[:, :fix_deform_bounds] = 0
@@ -108,18 +202,15 @@ def generate_deformation_field_gauss(shape, points, max_deform=DEFORMATION_MAX,
     return deform
 
 
-def generate_deformation_field_rbf(shape, points, max_deform=DEFORMATION_MAX, nb_bound_points=25):
-    """ generate deformation field as thin plate spline  deformation
-    in range +/- max_deform
+def _estimate_deformation_rbf(shape, points, max_deform=DEFORMATION_MAX, nb_bound_points=25):
+    """ estimate thin plate spline with random shift in landmarks and fixed image boundary
 
     :param tuple(int,int) shape: tuple of size 2
     :param points: np.array<nb_points, 2> list of landmarks
     :param float max_deform: maximal deformation distance in any direction
     :param int nb_bound_points: number of fix boundary points
-    :return: np.array<shape>
+    :return obj: interpolation function `f(x, y)`
     """
-    # x_point = points[:, 0]
-    # y_point = points[:, 1]
     # generate random shifting
     move = (np.random.random(points.shape[0]) - 0.5) * max_deform
 
@@ -135,37 +226,163 @@ def generate_deformation_field_rbf(shape, points, max_deform=DEFORMATION_MAX, nb
     # create the interpolation function
     smooth = 0.2 * max_deform
     rbf = interpolate.Rbf(x_point, y_point, move, function='thin-plate', epsilon=1, smooth=smooth)
-    # interpolate in regular grid
-    x_grid, y_grid = np.mgrid[0:shape[0], 0:shape[1]].astype(np.int32)
-    # FIXME: it takes to much of RAM memory, for sample image more that 8GM !
-    deform = rbf(x_grid, y_grid)
+    return rbf
+
+
+def _deformation_grid_nodes(size, grid_step):
+    """ positions of the control grid nodes along single axis, the grid covers also the last pixel
+
+    :param int size: image size along the axis
+    :param int grid_step: spacing of the control grid
+    :return: np.array<nb_nodes>
+    """
+    nb_nodes = int(np.ceil((size - 1) / float(max(grid_step, 1)))) + 1
+    return np.linspace(0, size - 1, max(nb_nodes, 2))
+
+
+def evaluate_deformation_grid(rbf, shape, grid_step=DEFORMATION_GRID_STEP):
+    """ evaluate the deformation function only in nodes of a coarse control grid
+
+    :param obj rbf: interpolation function `f(x, y)`
+    :param tuple(int,int) shape: image size
+    :param int grid_step: spacing of the control grid
+    :return: np.array<nb_nodes_x, nb_nodes_y>
+    """
+    nodes_x = _deformation_grid_nodes(shape[0], grid_step)
+    nodes_y = _deformation_grid_nodes(shape[1], grid_step)
+    grid_x, grid_y = np.meshgrid(nodes_x, nodes_y, indexing='ij')
+    return rbf(grid_x, grid_y)
+
+
+def upsample_deformation_block(field_coarse, shape, rows, cols=None):
+    """ bi-linear up-sampling of the coarse deformation to a block of the full image grid
+
+    :param field_coarse: np.array<nb_nodes_x, nb_nodes_y> deformation in control grid nodes
+    :param tuple(int,int) shape: full image size
+    :param tuple(int,int) rows: range of rows in the full image
+    :param tuple(int,int)|None cols: range of columns in the full image, default all
+    :return: np.array<nb_rows, nb_cols>
+    """
+    cols = (0, shape[1]) if cols is None else cols
+    scales = [(nb - 1) / float(max(size - 1, 1)) for nb, size in zip(field_coarse.shape, shape)]
+    grid_x, grid_y = np.meshgrid(np.arange(*rows) * scales[0], np.arange(*cols) * scales[1], indexing='ij')
+    return ndimage.map_coordinates(field_coarse, [grid_x, grid_y], order=1, mode='nearest')
+
+
+def generate_deformation_field_rbf(
+    shape, points, max_deform=DEFORMATION_MAX, nb_bound_points=25, grid_step=DEFORMATION_GRID_STEP
+):
+    """ generate deformation field as thin plate spline  deformation
+    in range +/- max_deform
+
+    The spline is evaluated only in a coarse control grid and then up-sampled.
+
+    :param tuple(int,int) shape: tuple of size 2
+    :param points: np.array<nb_points, 2> list of landmarks
+    :param float max_deform: maximal deformation distance in any direction
+    :param int nb_bound_points: number of fix boundary points
+    :param int grid_step: spacing of the control grid, `1` means evaluation in every pixel
+    :return: np.array<shape>
+    """
+    rbf = _estimate_deformation_rbf(shape, points, max_deform, nb_bound_points)
+    field_coarse = evaluate_deformation_grid(rbf, shape, grid_step)
+    deform = upsample_deformation_block(field_coarse, shape, (0, shape[0]))
     return deform
 
 
-def deform_image_landmarks(image, points, max_deform=DEFORMATION_MAX):
+def warp_image_tiles(image, field_coarse_x, field_coarse_y, tile_size=WARP_TILE_SIZE, fill_value=1.):
+    """ warp image by coarse deformation field processing the image in tiles of rows,
+    so the full resolution deformation is never kept in memory
+
+    The warped image is sampled as `image[x + dx(x, y), y + dy(x, y)]`.
+
+    :param image: np.array<height, width[, nb_channels]>
+    :param field_coarse_x: np.array<nb_nodes_x, nb_nodes_y> deformation along the first axis
+    :param field_coarse_y: np.array<nb_nodes_x, nb_nodes_y> deformation along the second axis
+    :param int tile_size: number of rows processed at once
+    :param float fill_value: value for pixels mapped outside the image
+    :return: np.array<height, width[, nb_channels]>
+    """
+    shape = image.shape[:2]
+    nb_channels = image.shape[2] if image.ndim == 3 else 1
+    use_cv = max(shape) < CV_REMAP_MAX_SIZE and nb_channels <= 4
+    img_warped = np.empty_like(image)
+    for row in range(0, shape[0], tile_size):
+        rows = (row, min(row + tile_size, shape[0]))
+        grid_x, grid_y = np.mgrid[rows[0]:rows[1], 0:shape[1]]
+        map_x = (grid_x + upsample_deformation_block(field_coarse_x, shape, rows)).astype(np.float32)
+        map_y = (grid_y + upsample_deformation_block(field_coarse_y, shape, rows)).astype(np.float32)
+        if use_cv:
+            tile = cv.remap(
+                image,
+                map_y,
+                map_x,
+                interpolation=cv.INTER_LINEAR,
+                borderMode=cv.BORDER_CONSTANT,
+                borderValue=(fill_value, ) * 4,
+            )
+        else:
+            img_ch = image if image.ndim == 3 else image[..., np.newaxis]
+            tile = np.stack([
+                ndimage.map_coordinates(img_ch[..., i], [map_x, map_y], order=1, cval=fill_value)
+                for i in range(nb_channels)
+            ], axis=-1)
+        img_warped[rows[0]:rows[1]] = tile.reshape(img_warped[rows[0]:rows[1]].shape)
+    return img_warped
+
+
+def deform_image_landmarks(
+    image,
+    points,
+    max_deform=DEFORMATION_MAX,
+    grid_step=DEFORMATION_GRID_STEP,
+    tile_size=WARP_TILE_SIZE,
+    deform_model='rbf',
+):
     """ deform the image by randomly generated deformation field
     and compute new positions for all landmarks
 
+    The thin plate spline deformation is evaluated in a coarse control grid, the image is warped
+    tile by tile and the landmarks are warped analytically by the deformation function.
+    The Gaussian deformation is generated in full resolution and the landmarks shifts are interpolated.
+
     :param image: np.array<height, width, 3>
     :param points: np.array<nb_points, 2>
     :param float max_deform: maximal deformation distance in any direction
+    :param int grid_step: spacing of the control grid of the thin plate spline
+    :param int tile_size: number of rows warped at once
+    :param str deform_model: model of the deformation, see `DEFORMATION_MODELS`
     :return: np.array<height, width, 3>, np.array<nb_points, 2>
+
+    >>> img = np.random.random((100, 120, 3))
+    >>> pts = np.array([[20, 30], [60, 70], [80, 25]])
+    >>> img_warp, pts_warp = deform_image_landmarks(img, pts, max_deform=5, deform_model='gauss')
+    >>> img_warp.shape, pts_warp.shape
+    ((100, 120, 3), (3, 2))
     """
-    x, y = np.mgrid[0:image.shape[0], 0:image.shape[1]]
+    shape = image.shape[:2]
+    points = np.asarray(points, dtype=float)
+    if deform_model == 'gauss':
+        field_x = generate_deformation_field_gauss(shape, points, max_deform)
+        field_y = generate_deformation_field_gauss(shape, points, max_deform)
+        img_warped = warp_image_tiles(image, field_x, field_y, tile_size=tile_size, fill_value=1.)
+        shifts = [ndimage.map_coordinates(f, points.T, order=1, mode='nearest') for f in (field_x, field_y)]
+        return img_warped, points - np.array(shifts).T
+    elif deform_model != 'rbf':
+        raise ValueError('not supported deformation model "%s" from %r' % (deform_model, DEFORMATION_MODELS))
+
     # generate the deformation field
     nb_fix_points = int(np.max(image.shape) / max_deform * 2.)
-    x_deform = generate_deformation_field_rbf(image.shape[:2], points, max_deform, nb_fix_points)
-    # TODO: look for another elastic deformation which is friendly to Memory usage
-    # -> generate random elastic deformation and using this field get new landmarks
-    y_deform = generate_deformation_field_rbf(image.shape[:2], points, max_deform, nb_fix_points)
+    rbf_x = _estimate_deformation_rbf(shape, points, max_deform, nb_fix_points)
+    rbf_y = _estimate_deformation_rbf(shape, points, max_deform, nb_fix_points)
     # interpolate the image
-    img_warped = interpolate.griddata(
-        zip(x.ravel(), y.ravel()), image.reshape(-1, 3), (x + x_deform, y + y_deform), method='linear', fill_value=1.
-    )
+    field_x = evaluate_deformation_grid(rbf_x, shape, grid_step)
+    field_y = evaluate_deformation_grid(rbf_y, shape, grid_step)
+    img_warped = warp_image_tiles(image, field_x, field_y, tile_size=tile_size, fill_value=1.)
     # compute new positions of landmarks
-    x_new = x - x_deform
-    y_new = y - y_deform
-    pts_warped = np.array([[x_new[pt[0], pt[1]], y_new[pt[0], pt[1]]] for pt in points])
+    x_new = points[:, 0] - rbf_x(points[:, 0], points[:, 1])
+    y_new = points[:, 1] - rbf_y(points[:, 0], points[:, 1])
+    pts_warped = np.array([x_new, y_new]).T
     return img_warped, pts_warped
 
 
@@ -247,7 +464,7 @@ def export_image_landmarks(image, points, idx, path_out, name_img, visual=False)
         plt.close(fig)
 
 
-def perform_deform_export(idx, image, points, path_out, name_img, visual=False):
+def perform_deform_export(idx, image, points, path_out, name_img, visual=False, deform_model='rbf'):
     """ perform complete image colour change, and deformation on image
     and landmarks and if required draw a visualisation
 
@@ -257,20 +474,162 @@ def perform_deform_export(idx, image, points, path_out, name_img, visual=False):
     :param str path_out:
     :param str name_img:
     :param bool visual:
+    :param str deform_model: model of the deformation, see `DEFORMATION_MODELS`
     """
     image_out = image_color_shift_hue(image)
     max_deform = int(0.03 * np.mean(image.shape[:2]))
-    image_out, points_out = deform_image_landmarks(image_out, points, max_deform)
+    image_out, points_out = deform_image_landmarks(image_out, points, max_deform, deform_model=deform_model)
     export_image_landmarks(image_out, points_out, idx + 1, path_out, name_img, visual)
 
 
-def get_name(path):
+def get_name(path, with_folder=False):
     """ parse the name without extension from complete path
 
     :param str path:
+    :param bool with_folder: prefix the name by its parent folder
     :return str:
+
+    >>> get_name(os.path.join('rat-kidney_', 'scale-5pc', 'Rat-Kidney_HE.jpg'))
+    'Rat-Kidney_HE'
+    >>> get_name(os.path.join('rat-kidney_', 'scale-5pc', 'Rat-Kidney_HE.jpg'), with_folder=True)
+    'scale-5pc_Rat-Kidney_HE'
     """
-    return os.path.splitext(os.path.basename(path))[0]
+    name = os.path.splitext(os.path.basename(path))[0]
+    folder = os.path.basename(os.path.dirname(path))
+    return '%s_%s' % (folder, name) if with_folder and folder else name
+
+
+def get_unique_names(paths):
+    """ parse the names without extension, the colliding names are prefixed by their parent folder
+
+    :param list(str) paths: paths to the images
+    :return list(str): unique names
+
+    >>> get_unique_names([os.path.join('scale-5pc', 'Rat-Kidney_HE.jpg'),
+    ...                   os.path.join('scale-10pc', 'Rat-Kidney_HE.jpg'),
+    ...                   os.path.join('scale-10pc', 'Rat-Kidney_PanCytokeratin.jpg')])
+    ['scale-5pc_Rat-Kidney_HE', 'scale-10pc_Rat-Kidney_HE', 'Rat-Kidney_PanCytokeratin']
+    """
+    names = [get_name(p) for p in paths]
+    names = [get_name(p, with_folder=names.count(n) > 1) for p, n in zip(paths, names)]
+    if len(set(names)) != len(names):
+        raise ValueError('some source images share the same folder and name: %r' % sorted(names))
+    return names
+
+
+def list_source_images_landmarks(path_image=None, path_landmarks=None, path_table=None, path_dataset=None):
+    """ list pairs of source image and landmarks, either from path patterns
+    (matched in sorted order) or from a cover table (both reference and moving columns)
+
+    :param str|None path_image: path or pattern to the images
+    :param str|None path_landmarks: path or pattern to the landmarks
+    :param str|None path_table: path to the cover table
+    :param str|None path_dataset: path to the dataset, prefix for relative paths in the cover table
+    :return list(tuple(str,str)): pairs of image and landmarks paths
+    """
+    if path_table:
+        df_cover = _df_drop_unnamed(pd.read_csv(path_table, index_col=None))
+        cols_pairs = [
+            (ImRegBenchmark.COL_IMAGE_REF, ImRegBenchmark.COL_POINTS_REF),
+            (ImRegBenchmark.COL_IMAGE_MOVE, ImRegBenchmark.COL_POINTS_MOVE),
+        ]
+        sources = []
+        for col_img, col_lnd in cols_pairs:
+            sources += list(zip(df_cover[col_img], df_cover[col_lnd]))
+        sources = [tuple(update_path(p, pre_path=path_dataset) for p in pair) for pair in sources]
+        # drop duplicates but keep the order
+        return sorted(set(sources), key=sources.index)
+
+    list_imgs = sorted(glob.glob(path_image))
+    list_lnds = sorted(glob.glob(path_landmarks))
+    if len(list_imgs) != len(list_lnds):
+        raise RuntimeError(
+            'the list of loaded images (%i) and landmarks (%i) is different length' % (len(list_imgs), len(list_lnds))
+        )
+    return list(zip(list_imgs, list_lnds))
+
+
+def _share_image(image):
+    """ copy the image into a shared memory block
+
+    :param image: np.array
+    :return tuple(obj,tuple): shared memory and its description (name, shape, dtype)
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+    np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[:] = image
+    return shm, (shm.name, image.shape, image.dtype.str)
+
+
+def _init_worker_images(sources):
+    """ pool initializer attaching all source images in the worker
+
+    :param list sources: list of images or shared memory descriptions
+    """
+    # forked workers would share the same random state
+    np.random.seed()
+    for idx, src in enumerate(sources):
+        if isinstance(src, np.ndarray):
+            _SOURCE_IMAGES[idx] = src
+            continue
+        name, shape, dtype = src
+        shm = shared_memory.SharedMemory(name=name)
+        # keep the reference to the shared memory, otherwise the buffer is released
+        _SOURCE_IMAGES[idx] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf), shm
+    if any(isinstance(src, tuple) for src in _SOURCE_IMAGES.values()):
+        # detach the shared images when the worker exits
+        mproc_util.Finalize(None, _release_worker_images, exitpriority=10)
+
+
+def _release_worker_images():
+    """ release the source images of this worker and close its handles to the shared memory """
+    while _SOURCE_IMAGES:
+        _, src = _SOURCE_IMAGES.popitem()
+        if isinstance(src, tuple):
+            image, shm = src
+            # the shared memory can not be closed while the image still uses its buffer
+            del image, src
+            shm.close()
+
+
+def _perform_deform_export_job(job, path_out, visual=False, deform_model='rbf'):
+    """ wrapper for a single (image, sample) job using the worker source images
+
+    :param tuple(int,int,ndarray,str) job: index of source image, sample index, landmarks and image name
+    :param str path_out: path to the output directory
+    :param bool visual: visualise the landmarks
+    :param str deform_model: model of the deformation, see `DEFORMATION_MODELS`
+    """
+    idx_img, idx_sample, points, name_img = job
+    image = _SOURCE_IMAGES[idx_img]
+    image = image[0] if isinstance(image, tuple) else image
+    perform_deform_export(idx_sample, image, points, path_out, name_img, visual, deform_model=deform_model)
+
+
+def export_registration_pairs(sources, nb_samples, path_out):
+    """ export table with pairs of the original and each deformed image,
+    the paths are relative to the output folder
+
+    :param list(tuple(str,tuple(int,int))) sources: list of image names and image sizes
+    :param int nb_samples: number of deformed images
+    :param str path_out: path to the output directory
+    :return str: path to the exported table
+    """
+    reg_pairs = []
+    for name_img, img_size in sources:
+        img_diag = np.round(np.sqrt(np.sum(np.array(img_size)**2)), 1)
+        for i in range(1, nb_samples + 1):
+            names = [name_img + '_%i' % j for j in (0, i)]
+            paths = [n + '.jpg' for n in names] + [n + '.csv' for n in names]
+            rec = dict(zip(ImRegBenchmark.COVER_COLUMNS, paths))
+            rec.update({
+                ImRegBenchmark.COL_IMAGE_SIZE: tuple(img_size),
+                ImRegBenchmark.COL_IMAGE_DIAGONAL: img_diag,
+            })
+            reg_pairs.append(rec)
+    path_csv = os.path.join(path_out, NAME_CSV_PAIRS)
+    logging.info('exporting %i registration pairs: %s', len(reg_pairs), path_csv)
+    pd.DataFrame(reg_pairs, columns=ImRegBenchmark.COVER_COLUMNS_EXT).to_csv(path_csv)
+    return path_csv
 
 
 def main(params):
@@ -286,39 +645,65 @@ def main(params):
     else:
         logging.warning('using existing folder: %s', params['path_out'])
 
-    image = np.array(Image.open(params['path_image']))
-    logging.debug('loaded image, shape: %s', image.shape)
-    df_points = pd.read_csv(params['path_landmarks'], index_col=0)
-    points = df_points[COLUMNS_COORD].values
-    logging.debug('loaded landmarks, dim: %s', points.shape)
-
-    name_img = get_name(params['path_image'])
-    # name_points = get_name(params['path_landmarks'])
-
-    export_image_landmarks(image, points, 0, params['path_out'], name_img, visual=params['visual'])
-
-    # create the wrapper for parallel usage
-    wrapper_deform_export = partial(
-        perform_deform_export,
-        image=image,
-        points=points,
-        path_out=params['path_out'],
-        name_img=name_img,
-        visual=params.get('visual', False),
+    paths_sources = list_source_images_landmarks(
+        params.get('path_image'), params.get('path_landmarks'), params.get('path_table'), params.get('path_dataset')
     )
-
-    tqdm_bar = tqdm.tqdm(total=params['nb_samples'])
-    if params['nb_workers'] > 1:
-        mproc_pool = mproc.Pool(params['nb_workers'])
-        for _ in mproc_pool.imap_unordered(wrapper_deform_export, range(params['nb_samples'])):
-            tqdm_bar.update()
-        mproc_pool.close()
-        mproc_pool.join()
-    else:
-        for i in range(params['nb_samples']):
-            wrapper_deform_export(i)
-            tqdm_bar.update()
-    tqdm_bar.close()
+    logging.info('found %i source images', len(paths_sources))
+    # in multi-image mode the images may share the name, so distinguish them by folder
+    names_imgs = get_unique_names([p for p, _ in paths_sources])
+    use_shared = shared_memory is not None and params['nb_workers'] > 1
+
+    sources, jobs, shared, names_sizes = [], [], [], []
+    try:
+        for idx, (path_img, path_lnds) in enumerate(paths_sources):
+            image = np.array(Image.open(path_img))
+            logging.debug('loaded image, shape: %s', image.shape)
+            df_points = pd.read_csv(path_lnds, index_col=0)
+            points = df_points[COLUMNS_COORD].values
+            logging.debug('loaded landmarks, dim: %s', points.shape)
+            name_img = names_imgs[idx]
+
+            export_image_landmarks(image, points, 0, params['path_out'], name_img, visual=params['visual'])
+            names_sizes.append((name_img, image.shape[:2]))
+            jobs += [(idx, i, points, name_img) for i in range(params['nb_samples'])]
+            if use_shared:
+                shm, image = _share_image(image)
+                shared.append(shm)
+            sources.append(image)
+
+        export_registration_pairs(names_sizes, params['nb_samples'], params['path_out'])
+
+        # create the wrapper for parallel usage
+        wrapper_deform_export = partial(
+            _perform_deform_export_job,
+            path_out=params['path_out'],
+            visual=params.get('visual', False),
+            deform_model=params.get('deform_model', DEFORMATION_MODELS[0]),
+        )
+
+        tqdm_bar = tqdm.tqdm(total=len(jobs))
+        if params['nb_workers'] > 1:
+            mproc_pool = mproc.Pool(params['nb_workers'], initializer=_init_worker_images, initargs=(sources, ))
+            try:
+                for _ in mproc_pool.imap_unordered(wrapper_deform_export, jobs):
+                    tqdm_bar.update()
+            finally:
+                mproc_pool.close()
+                mproc_pool.join()
+        else:
+            _init_worker_images(sources)
+            try:
+                for job in jobs:
+                    wrapper_deform_export(job)
+                    tqdm_bar.update()
+            finally:
+                _release_worker_images()
+        tqdm_bar.close()
+    finally:
+        # release the shared images even if some job failed
+        for shm in shared:
+            shm.close()
+            shm.unlink()
     logging.info('DONE')
 
 
@@ -3,6 +3,9 @@ Crop images around major object with set padding
 
 .. note:: Using these scripts for 1+GB images take several tens of GB RAM
 
+The tissue is detected on a thumbnail, so the full image is loaded only for the region copy.
+The crop is not cached since the image is overwritten by the cropped one.
+
 Sample usage::
 
     python crop_tissue_images.py \
@@ -21,23 +24,18 @@ import sys
 import time
 from functools import partial
 
-import cv2 as cv
-import numpy as np
-
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.utilities.dataset import (
     args_expand_parse_images,
-    find_largest_object,
+    estimate_tissue_crop,
+    image_shape_header,
     load_large_image,
-    project_object_edge,
     save_large_image,
 )
 from birl.utilities.experiments import get_nb_workers, iterate_mproc_map, try_decorator
 
 NB_WORKERS = get_nb_workers(0.5)
-SCALE_SIZE = 512
 CUT_DIMENSION = 0
-TISSUE_CONTENT = 0.01
 
 
 def arg_parse_params():
@@ -62,31 +60,12 @@ def crop_image(img_path, crop_dims=(0, 1), padding=0.15):
     :param tuple(int) crop_dims: crop in selected dimensions
     :param float padding: padding around tissue
     """
-    img = load_large_image(img_path)
-    scale_factor = max(1, np.mean(img.shape[:2]) / float(SCALE_SIZE))
-    # work with just a scaled version
-    sc = 1. / scale_factor
-    order = cv.INTER_AREA if scale_factor > 1 else cv.INTER_LINEAR
-    img_small = 255 - cv.resize(img, None, fx=sc, fy=sc, interpolation=order)
-
-    crops = {}
-    for crop_dim in crop_dims:
-        if crop_dim not in (0, 1):
-            raise ValueError('not supported dimension: %i' % crop_dim)
-        img_edge = project_object_edge(img_small, crop_dim)
-
-        begin, end = find_largest_object(img_edge, threshold=TISSUE_CONTENT)
-        # img_diag = int(np.sqrt(img.shape[0] ** 2 + img.shape[1] ** 2))
-        pad_px = padding * (end - begin) * scale_factor
-        begin_px = max(0, int((begin * scale_factor) - pad_px))
-        end_px = min(img.shape[crop_dim], int((end * scale_factor) + pad_px))
-        crops[crop_dim] = (begin_px, end_px)
-    del img_small
-
-    for _ in range(2):
-        if 0 not in crops:
-            crops[0] = (0, img.shape[0])
+    crops = estimate_tissue_crop(img_path, crop_dims=crop_dims, padding=padding)
+    if crops == [[0, size] for size in image_shape_header(img_path)]:
+        logging.debug('nothing to crop in "%s"', img_path)
+        return
 
+    img = load_large_image(img_path)
     img = img[crops[0][0]:crops[0][1], crops[1][0]:crops[1][1], ...]
 
     save_large_image(img_path, img)
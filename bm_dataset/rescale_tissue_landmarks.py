@@ -37,10 +37,11 @@ from functools import partial
 
 import numpy as np
 import pandas as pd
+from matplotlib.path import Path
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.utilities.data_io import create_folder, load_landmarks_csv, save_landmarks_csv
-from birl.utilities.dataset import compute_bounding_polygon, inside_polygon, list_sub_folders, parse_path_scale
+from birl.utilities.dataset import compute_concave_hull, list_sub_folders, parse_path_scale
 from birl.utilities.experiments import is_iterable, iterate_mproc_map, parse_arg_params
 from birl.utilities.registration import estimate_affine_transform, transform_points
 from bm_dataset.rescale_tissue_images import DEFAULT_SCALES, FOLDER_TEMPLATE, NB_WORKERS
@@ -69,6 +70,9 @@ def arg_parse_params():
     parser.add_argument(
         '--nb_total', type=int, required=False, default=None, help='total number of generated landmarks'
     )
+    parser.add_argument(
+        '--rand_seed', type=int, required=False, default=None, help='seed for reproducible landmarks selection'
+    )
     parser.add_argument(
         '--nb_workers', type=int, required=False, default=NB_WORKERS, help='number of processes in parallel'
     )
@@ -95,40 +99,79 @@ def load_largest_scale(path_set):
     return names_lnds
 
 
-def generate_random_points_inside(ref_points, nb_extras):
+def _random_generator(rng=None):
+    """ get the random generator from a generator, seed or None for global `np.random`
+
+    :param rng: random generator such as `np.random.RandomState`, a seed or None
+    :return: random generator
+
+    >>> _random_generator() is np.random
+    True
+    >>> _random_generator(0).randint(100) == np.random.RandomState(0).randint(100)
+    True
+    """
+    if rng is None:
+        return np.random
+    if not hasattr(rng, 'random_sample'):
+        return np.random.RandomState(rng)
+    return rng
+
+
+def generate_random_points_inside(ref_points, nb_extras, rng=None, max_draws=int(1e5)):
     """ generate some extra points inside the tissue boundary polygon
 
+    The candidates are drawn in batches sized by the observed acceptance rate
+    and tested all at once against the polygon.
+
     :param ref_points: point of the tissue
     :param int nb_extras: number of point to be added
-    :return [(int, int)]: extra points
+    :param rng: random generator such as `np.random.RandomState` or a seed, by default global `np.random`
+    :param int max_draws: maximal number of drawn candidates
+    :return ndarray: extra points
     """
+    rng = _random_generator(rng)
     # tighter approximation, not all tissue is really convex
-    convex_polygon = compute_bounding_polygon(ref_points)
-    poly_mins = np.min(convex_polygon, axis=0)
-    poly_size = np.max(convex_polygon, axis=0) - poly_mins
+    polygon = Path(compute_concave_hull(ref_points))
+    poly_mins = np.min(polygon.vertices, axis=0)
+    poly_size = np.max(polygon.vertices, axis=0) - poly_mins
     # generate sample points inside polygon
     points_extra = []
-    for i in range(int(1e5)):
-        point = (np.random.random(2) * poly_size + poly_mins).astype(int)
-        if inside_polygon(convex_polygon, point):
-            points_extra.append(point)
-            if len(points_extra) > nb_extras:
-                logging.debug('particular polygon generated %f inside', nb_extras / float(i))
-                break
-    else:  # in case the loop ended regularly without break
-        logging.warning('something went wrong with ')
+    nb_found, nb_drawn, ratio = 0, 0, 0.5
+    while nb_found < nb_extras and nb_drawn < max_draws:
+        nb_batch = min(max_draws - nb_drawn, max(100, int(2 * (nb_extras - nb_found) / ratio)))
+        points = (rng.random_sample((nb_batch, 2)) * poly_size + poly_mins).astype(int)
+        points = points[polygon.contains_points(points)]
+        points_extra.append(points)
+        nb_found += len(points)
+        nb_drawn += nb_batch
+        ratio = max(nb_found / float(nb_drawn), 0.01)
+    logging.debug('particular polygon generated %f inside', ratio)
+    if nb_found < nb_extras:
+        logging.warning('generated only %i of %i points inside the polygon', nb_found, nb_extras)
+    points_extra = np.vstack(points_extra)[:nb_extras] if points_extra else np.empty((0, 2), dtype=int)
     return points_extra
 
 
-def expand_random_warped_landmarks(names_lnds, names_lnds_new, nb_total):
+def expand_random_warped_landmarks(names_lnds, names_lnds_new, nb_total, rng=None):
     """ add some extra point which are randomly sampled in the first sample
     and warped to the other images using estimated affine transform
 
     :param dict names_lnds: mapping to ndarray of the original landmarks
     :param dict names_lnds_new: mapping to ndarray of the generated landmarks
     :param int nb_total: total number of point - landmarks
+    :param rng: random generator such as `np.random.RandomState` or a seed, by default global `np.random`
     :return dict: mapping to ndarray
+
+    >>> lnds = np.random.RandomState(0).random_sample((20, 2)) * 100
+    >>> names_lnds = {'a.csv': lnds, 'b.csv': lnds + 5}
+    >>> lnds_new = expand_random_warped_landmarks(names_lnds, dict(names_lnds), 30, rng=42)
+    >>> lnds_new['a.csv'].shape
+    (30, 2)
+    >>> lnds_new_2 = expand_random_warped_landmarks(names_lnds, dict(names_lnds), 30, rng=42)
+    >>> all(np.array_equal(lnds_new[n], lnds_new_2[n]) for n in names_lnds)
+    True
     """
+    rng = _random_generator(rng)
     # estimate then number of required points
     nb_min_new = min(map(len, names_lnds_new.values()))
     nb_extras = nb_total - nb_min_new
@@ -137,7 +180,7 @@ def expand_random_warped_landmarks(names_lnds, names_lnds_new, nb_total):
 
     ref_name = sorted(names_lnds)[0]
     ref_points = names_lnds[ref_name]
-    points_extra = generate_random_points_inside(ref_points, nb_extras)
+    points_extra = generate_random_points_inside(ref_points, nb_extras, rng=rng)
 
     for name in filter(lambda n: n != ref_name, names_lnds):
         # prepare the points
@@ -154,12 +197,12 @@ def expand_random_warped_landmarks(names_lnds, names_lnds_new, nb_total):
 
     # reorder landmarks but equally in all sets
     reorder = list(range(nb_total))
-    np.random.shuffle(reorder)
+    rng.shuffle(reorder)
     names_lnds_new = {n: names_lnds_new[n][reorder] for n in names_lnds_new}
     return names_lnds_new
 
 
-def extend_landmarks(path_set, path_dataset, nb_selected=None, nb_total=None):
+def extend_landmarks(path_set, path_dataset, nb_selected=None, nb_total=None, rng=None):
     """ select and extend the original set of landmarks
 
     :param str path_set: path to the particular set if images/landmarks
@@ -168,9 +211,11 @@ def extend_landmarks(path_set, path_dataset, nb_selected=None, nb_total=None):
         if None use all original landmarks
     :param int|None nb_total: add extra points up to total number,
         if None, no adding extra points
+    :param rng: random generator such as `np.random.RandomState` or a seed, by default global `np.random`
     :return:
     """
     logging.debug('> processing: %s', path_set)
+    rng = _random_generator(rng)
 
     # search form mas scale in set and load all related landmarks
     names_lnds = load_largest_scale(path_set)
@@ -189,7 +234,7 @@ def extend_landmarks(path_set, path_dataset, nb_selected=None, nb_total=None):
             nb_selected = np.ceil(nb_selected * max(lens)).astype(int)
         # perform the selection
         indexes = list(range(min(lens)))
-        np.random.shuffle(indexes)
+        rng.shuffle(indexes)
         # just a required subset
         indexes = indexes[:nb_selected]
         for name in names_lnds:
@@ -198,7 +243,7 @@ def extend_landmarks(path_set, path_dataset, nb_selected=None, nb_total=None):
         names_lnds_new = names_lnds
 
     if nb_total is not None:
-        names_lnds_new = expand_random_warped_landmarks(names_lnds, names_lnds_new, nb_total)
+        names_lnds_new = expand_random_warped_landmarks(names_lnds, names_lnds_new, nb_total, rng=rng)
 
     # export the landmarks
     path_set_scale = os.path.join(path_dataset, os.path.basename(path_set), FOLDER_TEMPLATE % 100)
@@ -207,7 +252,24 @@ def extend_landmarks(path_set, path_dataset, nb_selected=None, nb_total=None):
         save_landmarks_csv(os.path.join(path_set_scale, name), val)
 
 
-def dataset_expand_landmarks(path_annots, path_dataset, nb_selected=None, nb_total=None, nb_workers=NB_WORKERS):
+def _extend_landmarks_seeded(path_set_seed, **kwargs):
+    """ wrapper for parallel extending the landmarks sets each with own seed
+
+    :param tuple(str,int|None) path_set_seed: path to the particular set and its seed
+    :return:
+    """
+    path_set, seed = path_set_seed
+    return extend_landmarks(path_set, rng=seed, **kwargs)
+
+
+def dataset_expand_landmarks(
+    path_annots,
+    path_dataset,
+    nb_selected=None,
+    nb_total=None,
+    nb_workers=NB_WORKERS,
+    rand_seed=None,
+):
     """ select and expand over whole dataset
 
     :param str path_annots: root path to original dataset
@@ -215,13 +277,23 @@ def dataset_expand_landmarks(path_annots, path_dataset, nb_selected=None, nb_tot
     :param float|int|None nb_selected: portion of selected points
     :param int|None nb_total: add extra points up to total number
     :param int nb_workers: number of jobs running in parallel
+    :param int|None rand_seed: seed for reproducible selection, each set gets its own seed derived from it
     :return list(int):
     """
-    list_sets = list_sub_folders(path_annots)
+    list_sets = sorted(list_sub_folders(path_annots))
     logging.info('Found sets: %i', len(list_sets))
+    # the seeds are bound to the sets, so the result does not depend on the order of parallel jobs
+    if rand_seed is None:
+        seeds = [None] * len(list_sets)
+    else:
+        seeds = np.random.RandomState(rand_seed).randint(0, 2**31 - 1, len(list_sets)).tolist()
 
-    _wrap_extend = partial(extend_landmarks, path_dataset=path_dataset, nb_selected=nb_selected, nb_total=nb_total)
-    counts = list(iterate_mproc_map(_wrap_extend, sorted(list_sets), nb_workers=nb_workers, desc='expand landmarks'))
+    _wrap_extend = partial(
+        _extend_landmarks_seeded, path_dataset=path_dataset, nb_selected=nb_selected, nb_total=nb_total
+    )
+    counts = list(
+        iterate_mproc_map(_wrap_extend, zip(list_sets, seeds), nb_workers=nb_workers, desc='expand landmarks')
+    )
     return counts
 
 
@@ -270,7 +342,7 @@ def dataset_scale_landmarks(path_dataset, scales=DEFAULT_SCALES, nb_workers=NB_W
     return counts
 
 
-def main(path_annots, path_dataset, scales, nb_selected=None, nb_total=None, nb_workers=NB_WORKERS):
+def main(path_annots, path_dataset, scales, nb_selected=None, nb_total=None, nb_workers=NB_WORKERS, rand_seed=None):
     """ main entry point
 
     :param str path_annots: root path to original dataset
@@ -279,9 +351,12 @@ def main(path_annots, path_dataset, scales, nb_selected=None, nb_total=None, nb_
     :param float|int|None nb_selected: portion of selected points
     :param int|None nb_total: add extra points up to total number
     :param int nb_workers: number of jobs running in parallel
+    :param int|None rand_seed: seed for reproducible selection of landmarks
     :return tuple(int,int):
     """
-    count_gene = dataset_expand_landmarks(path_annots, path_dataset, nb_selected, nb_total, nb_workers=nb_workers)
+    count_gene = dataset_expand_landmarks(
+        path_annots, path_dataset, nb_selected, nb_total, nb_workers=nb_workers, rand_seed=rand_seed
+    )
     count_scale = dataset_scale_landmarks(path_dataset, scales=scales, nb_workers=nb_workers)
     return count_gene, count_scale
 
@@ -78,7 +78,9 @@ import logging
 import os
 import shutil
 import sys
+import tempfile
 
+import numpy as np
 import pandas as pd
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
@@ -120,6 +122,8 @@ class BmANTs(ImRegBenchmark):
     EXECUTE_TIMEOUT = 3 * 60 * 60  # default = 3 hour
     #: required experiment parameters
     REQUIRED_PARAMS = ImRegBenchmark.REQUIRED_PARAMS + ['path_config']
+    #: the converted target image is shared among all its pairs
+    GROUP_PAIRS_BY_TARGET = True
     #: executable for performing image registration
     EXEC_REGISTRATION = 'antsRegistration'
     #: executable for performing image transformation
@@ -152,6 +156,8 @@ class BmANTs(ImRegBenchmark):
     COL_IMAGE_REF_NII = ImRegBenchmark.COL_IMAGE_REF + ' Nifty'
     #: column name of temporary Nifty noving image
     COL_IMAGE_MOVE_NII = ImRegBenchmark.COL_IMAGE_MOVE + ' Nifty'
+    #: voxel type of the converted images, 8-bit keeps the precision of the source images
+    NIFTI_DTYPE = np.uint8
 
     def _prepare(self):
         """ prepare BM - copy configurations """
@@ -188,24 +194,42 @@ class BmANTs(ImRegBenchmark):
         :return dict: the same or updated registration info
         """
         logging.debug('.. generate command before registration experiment')
-        # set the paths for this experiment
-        path_dir = self._get_path_reg_dir(item)
         path_im_ref, path_im_move, _, _ = self._get_paths(item)
 
         # Convert images to Nifty
-        try:  # catching issue with too large images
-            item[self.COL_IMAGE_REF_NII] = convert_image_to_nifti_gray(path_im_ref, path_dir)
-        except Exception:
-            logging.exception('Converting: %s', path_im_ref)
-            return
-        try:  # catching issue with too large images
-            item[self.COL_IMAGE_MOVE_NII] = convert_image_to_nifti_gray(path_im_move, path_dir)
-        except Exception:
-            logging.exception('Converting: %s', path_im_move)
-            return
+        for path_img, col in [(path_im_ref, self.COL_IMAGE_REF_NII), (path_im_move, self.COL_IMAGE_MOVE_NII)]:
+            try:  # catching issue with too large images
+                item[col] = self._convert_image_nifti(path_img)
+            except Exception:
+                logging.exception('Converting: %s', path_img)
+                return
 
         return item
 
+    def _convert_image_nifti(self, path_img):
+        """ convert the image to Nifty only once and share it among all its pairs
+
+        :param str path_img: path to the target (reference) or moving image
+        :return str: path to the converted image
+        """
+        path_dir = self._get_path_target_cache(path_img)
+        name_img, _ = os.path.splitext(os.path.basename(path_img))
+        path_nii = os.path.join(path_dir, name_img + '.nii')
+        if os.path.isfile(path_nii):
+            return path_nii
+        # convert aside and move it, so parallel workers never use a partially written image
+        path_tmp = tempfile.mkdtemp(dir=path_dir)
+        path_conv = convert_image_to_nifti_gray(path_img, path_tmp, dtype=self.NIFTI_DTYPE)
+        try:
+            os.rename(path_conv, path_nii)
+        except OSError:
+            # on some systems the rename fails if another worker has already converted the same image
+            if not os.path.isfile(path_nii):
+                raise
+        finally:
+            shutil.rmtree(path_tmp, ignore_errors=True)
+        return path_nii
+
     def _generate_regist_command(self, item):
         """ generate the registration command(s)
 
@@ -25,6 +25,17 @@ Run the basic ANTs registration with original parameters::
         -py python3 \
         -script ./scripts/Python/run_ANTsPy.py
 
+The same registration can run in-process, directly in the benchmark workers
+where ANTsPy is imported just once, without executing the script for each pair,
+so the script is needed only as fallback if ANTsPy is not installed in this environment::
+
+    python bm_experiments/bm_ANTsPy.py \
+        -t ./data-images/pairs-imgs-lnds_histol.csv \
+        -d ./data-images \
+        -o ./results \
+        -py python3 \
+        --in_process
+
 
 .. note:: required to use own compiled last version since some previous releases
  do not contain `ants.apply_transforms_to_points`
@@ -39,8 +50,13 @@ import sys
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.benchmark import ImRegBenchmark
+from birl.utilities import is_module_available
+from birl.utilities.registration import register_images_ants
 from bm_experiments import bm_comp_perform
 
+#: whether the ANTsPy is installed, so the registration can run in-process
+ANTSPY_AVAILABLE = is_module_available('ants')
+
 
 class BmANTsPy(ImRegBenchmark):
     """ Benchmark for ANTs wrapper in Python
@@ -66,17 +82,40 @@ class BmANTsPy(ImRegBenchmark):
     """
     #: required experiment parameters
     REQUIRED_PARAMS = ImRegBenchmark.REQUIRED_PARAMS + ['exec_Python', 'path_script']
-    #: file with exported image registration time
+    #: file with warped image after performed registration
     NAME_IMAGE_WARPED = 'warped-image.jpg'
     #: file with warped landmarks after performed registration
     NAME_LNDS_WARPED = 'warped-landmarks.csv'
-    #: file with warped image after performed registration
-    NAME_TIME_EXEC = 'time.txt'
+
+    def _check_required_params(self):
+        """ the script is not required for the in-process registration """
+        if self.params.get('in_process', False):
+            self.REQUIRED_PARAMS = [n for n in self.REQUIRED_PARAMS if n != 'path_script']
+        super(BmANTsPy, self)._check_required_params()
 
     def _prepare(self):
         """ prepare BM - copy configurations """
         logging.info('-> copy configuration...')
-        self._copy_config_to_expt('path_script')
+        if self.params.get('path_script'):
+            self._copy_config_to_expt('path_script')
+
+        if self.params.get('in_process', False):
+            if ANTSPY_AVAILABLE:
+                self.set_method_plugin(register_images_ants)
+            elif self.params.get('path_script'):
+                logging.warning('ANTsPy is not installed in this environment, executing the script.')
+            else:
+                raise ValueError('ANTsPy is not installed in this environment and no script is given.')
+
+    def _list_preload_modules(self):
+        """ the in-process registration needs ANTsPy in each worker
+
+        :return list(str): full names of modules
+        """
+        modules = super(BmANTsPy, self)._list_preload_modules()
+        if self._method_plugin is not None:
+            modules.append('ants')
+        return modules
 
     def _generate_regist_command(self, item):
         """ generate the registration command(s)
@@ -122,18 +161,6 @@ class BmANTsPy(ImRegBenchmark):
             self.COL_POINTS_MOVE_WARP: path_lnds_warp,
         }
 
-    def _extract_execution_time(self, item):
-        """ if needed update the execution time
-
-        :param dict item: dictionary with registration params
-        :return float|None: time in minutes
-        """
-        path_dir = self._get_path_reg_dir(item)
-        path_time = os.path.join(path_dir, self.NAME_TIME_EXEC)
-        with open(path_time, 'r') as fp:
-            t_exec = float(fp.read()) / 60.
-        return t_exec
-
     @staticmethod
     def extend_parse(arg_parser):
         """ extent the basic arg parses by some extra required parameters
@@ -150,7 +177,18 @@ class BmANTsPy(ImRegBenchmark):
             default='python3'
         )
         arg_parser.add_argument(
-            '-script', '--path_script', required=True, type=str, help='path to the image registration script'
+            '-script',
+            '--path_script',
+            required=False,
+            type=str,
+            help='path to the image registration script, required unless running in-process'
+        )
+        arg_parser.add_argument(
+            '--in_process',
+            action='store_true',
+            required=False,
+            default=False,
+            help='run the registration in-process with ANTsPy imported in the workers instead of the script'
         )
         return arg_parser
 
@@ -62,10 +62,10 @@ import logging
 import os
 import shutil
 import sys
+import tempfile
 import time
 
 import numpy as np
-import SimpleITK as sitk
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.benchmark import ImRegBenchmark
@@ -73,7 +73,9 @@ from birl.utilities.data_io import (
     convert_image_from_mhd,
     convert_image_to_mhd,
     image_sizes,
+    load_image_lazy,
     load_landmarks,
+    sample_image_points,
     save_landmarks,
 )
 from bm_experiments import bm_comp_perform
@@ -111,6 +113,8 @@ class BmDROP(ImRegBenchmark):
     MAX_IMAGE_DIAGONAL = int(np.sqrt(2e3**2 + 2e3**2))
     #: time need for image conversion and optional scaling
     COL_TIME_CONVERT = 'conversion time [s]'
+    #: schedule the pairs by the target image, so its converted image is reused
+    GROUP_PAIRS_BY_TARGET = True
 
     def _prepare(self):
         logging.info('-> copy configuration...')
@@ -124,19 +128,38 @@ class BmDROP(ImRegBenchmark):
         """
         logging.debug('.. converting images to MHD')
         path_im_ref, path_im_move, _, _ = self._get_paths(item)
-        path_reg_dir = self._get_path_reg_dir(item)
 
         diags = [image_sizes(p_img)[1] for p_img in (path_im_ref, path_im_move)]
         item['scaling'] = max(1, max(diags) / float(self.MAX_IMAGE_DIAGONAL))
 
         t_start = time.time()
         for path_img, col in [(path_im_ref, self.COL_IMAGE_REF), (path_im_move, self.COL_IMAGE_MOVE)]:
-            item[col + self.COL_IMAGE_EXT_TEMP] = convert_image_to_mhd(
-                path_img, path_out_dir=path_reg_dir, overwrite=False, to_gray=True, scaling=item.get('scaling', 1.)
-            )
+            item[col + self.COL_IMAGE_EXT_TEMP] = self._convert_image_mhd(path_img, item['scaling'])
         item[self.COL_TIME_CONVERT] = time.time() - t_start
         return item
 
+    def _convert_image_mhd(self, path_img, scaling):
+        """ convert the image to gray-scale MHD only once for each scaling and share it among all its pairs
+
+        :param str path_img: path to the input image
+        :param float scaling: image down-scaling
+        :return str: path to the converted image
+        """
+        path_dir = os.path.join(self._get_path_target_cache(path_img), 'scale-%.12g' % scaling)
+        name_img, _ = os.path.splitext(os.path.basename(path_img))
+        path_mhd = os.path.join(path_dir, name_img + '.mhd')
+        if os.path.isfile(path_mhd):
+            return path_mhd
+        # convert aside and move the whole folder, so parallel workers never use a partially written image
+        path_tmp = tempfile.mkdtemp(dir=os.path.dirname(path_dir))
+        convert_image_to_mhd(path_img, path_out_dir=path_tmp, to_gray=True, scaling=scaling)
+        try:
+            os.rename(path_tmp, path_dir)
+        except OSError:
+            # some other worker has already converted the same image
+            shutil.rmtree(path_tmp, ignore_errors=True)
+        return path_mhd
+
     def _generate_regist_command(self, item):
         """ generate the registration command
 
@@ -234,12 +257,15 @@ class BmDROP(ImRegBenchmark):
         return arg_parser
 
     @staticmethod
-    def extract_landmarks_shift_from_mhd(path_deform_x, path_deform_y, lnds):
+    def extract_landmarks_shift_from_mhd(path_deform_x, path_deform_y, lnds, bilinear=True):
         """ given pair of deformation fields and landmark positions get shift
 
+        The fields are memory mapped and sampled just around the landmarks.
+
         :param str path_deform_x: path to deformation field in X axis
         :param str path_deform_y: path to deformation field in Y axis
         :param ndarray lnds: landmarks
+        :param bool bilinear: interpolate the shift in sub-pixel positions, otherwise use nearest pixel
         :return ndarray: shift for each landmarks
         """
 
@@ -247,19 +273,17 @@ class BmDROP(ImRegBenchmark):
         def __parse_shift(path_deform_, lnds):
             if not os.path.isfile(path_deform_):
                 raise FileNotFoundError('missing deformation: %s' % path_deform_)
-            deform_ = sitk.GetArrayFromImage(sitk.ReadImage(path_deform_))
-            if deform_ is None:
-                raise ValueError('loaded deformation is Empty - %s' % path_deform_)
-            lnds_max = np.max(lnds, axis=0)[::-1]
+            deform_, _ = load_image_lazy(path_deform_)
+            lnds_max = np.max(np.round(lnds), axis=0)[::-1]
             if not all(ln < dim for ln, dim in zip(lnds_max, deform_.shape)):
                 raise ValueError(
                     'landmarks max %s is larger then (exceeded) deformation shape %s' %
                     (lnds_max.tolist(), deform_.shape)
                 )
-            shift_ = deform_[lnds[:, 1], lnds[:, 0]]
+            shift_ = sample_image_points(deform_, lnds, bilinear=bilinear)
             return shift_
 
-        lnds = np.array(np.round(lnds), dtype=int)
+        lnds = np.asarray(lnds, dtype=float)
         # get shift in both axis
         shift_x = __parse_shift(path_deform_x, lnds)
         shift_y = __parse_shift(path_deform_y, lnds)
@@ -53,10 +53,15 @@ import shutil
 import sys
 
 import numpy as np
-import SimpleITK as sitk
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
-from birl.utilities.data_io import load_config_args, load_landmarks, save_landmarks
+from birl.utilities.data_io import (
+    load_config_args,
+    load_image_lazy,
+    load_landmarks,
+    sample_image_points,
+    save_landmarks,
+)
 from bm_experiments import bm_comp_perform
 from bm_experiments.bm_DROP import BmDROP
 
@@ -175,12 +180,15 @@ class BmDROP2(BmDROP):
         return super(BmDROP2, self)._clear_after_registration(item, patterns)
 
     @staticmethod
-    def extract_landmarks_shift_from_nifty(path_deform_x, path_deform_y, lnds):
+    def extract_landmarks_shift_from_nifty(path_deform_x, path_deform_y, lnds, bilinear=True):
         """ given pair of deformation fields and landmark positions get shift
 
+        The fields are read just by rows around the landmarks.
+
         :param str path_deform_x: path to deformation field in X axis
         :param str path_deform_y: path to deformation field in Y axis
         :param ndarray lnds: landmarks
+        :param bool bilinear: interpolate the shift in sub-pixel positions, otherwise use nearest pixel
         :return ndarray: shift for each landmarks
         """
 
@@ -188,23 +196,18 @@ class BmDROP2(BmDROP):
         def __parse_shift(path_deform_, axis, lnds):
             if not os.path.isfile(path_deform_):
                 raise FileNotFoundError('missing deformation: %s' % path_deform_)
-            img_ = sitk.ReadImage(path_deform_)
-            spacing = img_.GetSpacing()
-            deform_ = sitk.GetArrayFromImage(img_)[0].T
-            # deform_ = nibabel.load(path_deform_).get_data()[:, :, 0].T
-            if deform_ is None:
-                raise ValueError('loaded deformation is Empty - %s' % path_deform_)
-            lnds_max = np.max(lnds, axis=0)
-            if not all(ln < dim for ln, dim in zip(lnds_max, deform_.shape)):
+            deform_, spacing = load_image_lazy(path_deform_)
+            lnds_max = np.max(np.round(lnds), axis=0)
+            if not all(ln < dim for ln, dim in zip(lnds_max, deform_.shape[::-1])):
                 raise ValueError(
                     'landmarks max %s is larger then (exceeded) deformation shape %s' %
-                    (lnds_max.tolist(), deform_.shape)
+                    (lnds_max.tolist(), deform_.shape[::-1])
                 )
             # see: https://github.com/biomedia-mira/drop2/issues/2#issuecomment-547340836
-            shift_ = deform_[lnds[:, 0], lnds[:, 1]] / spacing[axis]
+            shift_ = sample_image_points(deform_, lnds, bilinear=bilinear) / spacing[axis]
             return shift_
 
-        lnds = np.array(np.round(lnds), dtype=int)
+        lnds = np.asarray(lnds, dtype=float)
         # get shift in both axis
         shift_x = __parse_shift(path_deform_x, 0, lnds)
         shift_y = __parse_shift(path_deform_y, 1, lnds)
@@ -33,6 +33,9 @@ Run the basic RVSS registration with original parameters::
         -cfg ./configs/ImageJ_RVSS_histol.yaml \
         --visual --unique
 
+To pay the Fiji (JVM) start-up just once per parallel worker instead of twice per image pair,
+run all the scripts in a persistent Fiji worker by adding ``--fiji_worker``.
+
 .. note:: tested for version ImageJ 1.52i & 2.35
 
 Copyright (C) 2017-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
@@ -46,7 +49,7 @@ import sys
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.benchmark import ImRegBenchmark
 from birl.utilities.data_io import load_config_yaml, load_landmarks, save_landmarks
-from birl.utilities.experiments import dict_deep_update, exec_commands
+from birl.utilities.experiments import dict_deep_update
 from bm_experiments import bm_comp_perform
 from bm_experiments.bm_bUnwarpJ import BmUnwarpJ
 
@@ -160,6 +163,20 @@ class BmRVSS(ImRegBenchmark):
         }
         return cmd
 
+    def _exec_commands(self, commands, path_log):
+        """ execute the Fiji commands, optionally in the persistent Fiji worker
+
+        :param str|list(str) commands: commands to be executed
+        :param str path_log: path to the logger
+        :return bool: whether the commands passed
+        """
+        return BmUnwarpJ.exec_fiji_commands(
+            commands,
+            path_logger=path_log,
+            timeout=self.EXECUTE_TIMEOUT,
+            persistent=self.params.get('fiji_worker', False),
+        )
+
     def _extract_warped_image_landmarks(self, item):
         """ get registration results - warped registered images and landmarks
 
@@ -191,7 +208,7 @@ class BmRVSS(ImRegBenchmark):
         pts_source = load_landmarks(path_lnds_move)
         save_landmarks(os.path.join(path_dir, BmUnwarpJ.NAME_LANDMARKS), pts_source)
         # execute transformation
-        exec_commands(self.COMMAND_WARP_LANDMARKS % dict_params, path_logger=path_log, timeout=self.EXECUTE_TIMEOUT)
+        self._exec_commands(self.COMMAND_WARP_LANDMARKS % dict_params, path_log)
         # load warped landmarks from TXT
         path_lnds_warp = os.path.join(path_dir, BmUnwarpJ.NAME_LANDMARKS_WARPED)
         if os.path.isfile(path_lnds_warp):
@@ -224,6 +241,13 @@ class BmRVSS(ImRegBenchmark):
         # SEE: https://docs.python.org/3/library/argparse.html
         arg_parser.add_argument('-Fiji', '--exec_Fiji', type=str, required=True, help='path to the Fiji executable')
         arg_parser.add_argument('-cfg', '--path_config', required=True, type=str, help='path to the RVSS configuration')
+        arg_parser.add_argument(
+            '--fiji_worker',
+            action='store_true',
+            required=False,
+            default=False,
+            help='run the scripts in one persistent Fiji per parallel worker instead of starting Fiji for each'
+        )
         return arg_parser
 
 
@@ -44,6 +44,9 @@ see: http://imagej.net/BUnwarpJ#SIFT_and_MOPS_plugin_support ::
         -cfg ./configs/ImageJ_bUnwarpJ-SIFT_histol.yaml \
         --visual --unique
 
+To pay the Fiji (JVM) start-up just once per parallel worker instead of twice per image pair,
+run all the scripts in a persistent Fiji worker by adding ``--fiji_worker``.
+
 .. note:: tested for version ImageJ 1.52i & 2.35
 
 Copyright (C) 2017-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
@@ -51,13 +54,14 @@ Copyright (C) 2017-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 
 import logging
 import os
+import shlex
 import shutil
 import sys
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.benchmark import ImRegBenchmark
 from birl.utilities.data_io import load_config_yaml, load_landmarks, save_landmarks, update_path
-from birl.utilities.experiments import dict_deep_update, exec_commands
+from birl.utilities.experiments import dict_deep_update, exec_commands, get_persistent_worker
 from bm_experiments import bm_comp_perform
 
 
@@ -96,6 +100,8 @@ class BmUnwarpJ(ImRegBenchmark):
     PATH_SCRIPT_REGISTRATION_SIFT = os.path.join(PATH_IJ_SCRIPTS, 'apply-SIFT-bUnwarpJ-registration.bsh')
     #: path/name of image/landmarks warping script
     PATH_SCRIPT_WARP_LANDMARKS = os.path.join(PATH_IJ_SCRIPTS, 'apply-bUnwarpJ-transform.bsh')
+    #: path/name of script running persistent worker which executes scripts sent as jobs
+    PATH_SCRIPT_WORKER = os.path.join(PATH_IJ_SCRIPTS, 'run-jobs-worker.bsh')
     # PATH_SCRIPT_HIST_MATCH_IJM = os.path.join(PATH_IJ_SCRIPTS,
     #                                           'histogram-matching-for-macro.bsh')
     #: command for executing the image registration
@@ -216,6 +222,20 @@ class BmUnwarpJ(ImRegBenchmark):
         }
         return cmd
 
+    def _exec_commands(self, commands, path_log):
+        """ execute the Fiji commands, optionally in the persistent Fiji worker
+
+        :param str|list(str) commands: commands to be executed
+        :param str path_log: path to the logger
+        :return bool: whether the commands passed
+        """
+        return BmUnwarpJ.exec_fiji_commands(
+            commands,
+            path_logger=path_log,
+            timeout=self.EXECUTE_TIMEOUT,
+            persistent=self.params.get('fiji_worker', False),
+        )
+
     def _extract_warped_image_landmarks(self, item):
         """ get registration results - warped registered images and landmarks
 
@@ -243,7 +263,7 @@ class BmUnwarpJ(ImRegBenchmark):
         pts_source = load_landmarks(path_lnds_move)
         save_landmarks(os.path.join(path_dir, self.NAME_LANDMARKS), pts_source)
         # execute transformation
-        exec_commands(self.COMMAND_WARP_LANDMARKS % dict_params, path_logger=path_log, timeout=self.EXECUTE_TIMEOUT)
+        self._exec_commands(self.COMMAND_WARP_LANDMARKS % dict_params, path_log)
         # load warped landmarks from TXT
         path_lnds_warp = os.path.join(path_dir, self.NAME_LANDMARKS_WARPED)
         if os.path.isfile(path_lnds_warp):
@@ -258,6 +278,33 @@ class BmUnwarpJ(ImRegBenchmark):
             self.COL_POINTS_MOVE_WARP: path_lnds_warp,
         }
 
+    @staticmethod
+    def exec_fiji_commands(commands, path_logger=None, timeout=None, persistent=False):
+        """ execute Fiji commands, optionally as jobs in the persistent Fiji worker of this process
+
+        The persistent worker runs the same script with the same arguments just without starting a new JVM,
+        so the commands have to be in form ``<Fiji> [<options>] --headless <script.bsh> <arguments>``
+        where the elements containing spaces are quoted.
+
+        :param str|list(str) commands: commands to be executed
+        :param str path_logger: path to the logger
+        :param int timeout: timeout for max commands length
+        :param bool persistent: use the persistent Fiji worker
+        :return bool: whether the commands passed
+        """
+        if not persistent:
+            return exec_commands(commands, path_logger=path_logger, timeout=timeout)
+        if isinstance(commands, str):
+            commands = [commands]
+        success = True
+        for cmd in commands:
+            cmd_elems = shlex.split(cmd)
+            # the Fiji with its options is the worker, the script with its arguments is the job
+            idx = cmd_elems.index('--headless') + 1
+            worker = get_persistent_worker(cmd_elems[:idx] + [BmUnwarpJ.PATH_SCRIPT_WORKER])
+            success &= worker.execute('\t'.join(cmd_elems[idx:]), path_logger=path_logger, timeout=timeout)
+        return success
+
     @staticmethod
     def extend_parse(arg_parser):
         """ extent the basic arg parses by some extra required parameters
@@ -269,6 +316,13 @@ class BmUnwarpJ(ImRegBenchmark):
         arg_parser.add_argument(
             '-cfg', '--path_config', required=True, type=str, help='path to the bUnwarpJ configuration'
         )
+        arg_parser.add_argument(
+            '--fiji_worker',
+            action='store_true',
+            required=False,
+            default=False,
+            help='run the scripts in one persistent Fiji per parallel worker instead of starting Fiji for each'
+        )
         return arg_parser
 
 
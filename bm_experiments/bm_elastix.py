@@ -48,6 +48,17 @@ Run the basic ANTs registration with original parameters::
         -elastix $HOME/Applications/elastix/bin \
         -cfg ./configs/elastix_affine.txt
 
+If SimpleITK is built with SimpleElastix, the registration can run in-process,
+without the executables and intermediate files (the images are kept in memory
+and the landmarks are warped by the resulting transformation)::
+
+    python bm_experiments/bm_elastix.py \
+        -t ./data-images/pairs-imgs-lnds_histol.csv \
+        -d ./data-images \
+        -o ./results \
+        -cfg ./configs/elastix_affine.txt \
+        --in_process
+
 
 .. note:: The origin of VTK coordinate system is in left bottom corner of the image.
  Also the first dimension is horizontal (swapped to matplotlib)
@@ -73,13 +84,32 @@ import sys
 
 import numpy as np
 import pandas as pd
+import SimpleITK as sitk
+from scipy import ndimage
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.benchmark import ImRegBenchmark
-from birl.utilities.data_io import load_landmarks, save_landmarks, save_landmarks_pts
+from birl.utilities.data_io import load_landmarks, save_image, save_landmarks, save_landmarks_pts
 from birl.utilities.experiments import exec_commands
 from bm_experiments import bm_comp_perform
 
+#: whether the SimpleITK is built with SimpleElastix, so the registration can run in-process
+SIMPLE_ELASTIX_AVAILABLE = hasattr(sitk, 'ElastixImageFilter')
+#: the last loaded target image in this process, reused by following pairs sharing the target
+_LAST_FIXED_IMAGE = {}
+
+
+def _load_fixed_image(path_img):
+    """ load the target image for in-process registration, reuse it if it was the last one
+
+    :param str path_img: path to the target image
+    :return: SimpleITK image
+    """
+    if path_img not in _LAST_FIXED_IMAGE:
+        _LAST_FIXED_IMAGE.clear()
+        _LAST_FIXED_IMAGE[path_img] = sitk.ReadImage(path_img, sitk.sitkFloat32)
+    return _LAST_FIXED_IMAGE[path_img]
+
 
 class BmElastix(ImRegBenchmark):
     """ Benchmark for Elastix
@@ -104,6 +134,8 @@ class BmElastix(ImRegBenchmark):
     """
     #: required experiment parameters
     REQUIRED_PARAMS = ImRegBenchmark.REQUIRED_PARAMS + ['path_config']
+    #: consecutive pairs sharing the target image can reuse it
+    GROUP_PAIRS_BY_TARGET = True
     #: executable for performing image registration
     EXEC_ELASTIX = 'elastix'
     #: executable for performing image/landmarks transformation
@@ -132,6 +164,13 @@ class BmElastix(ImRegBenchmark):
         logging.info('-> copy configuration...')
         self._copy_config_to_expt('path_config')
 
+        self._in_process = self.params.get('in_process', False)
+        if self._in_process and not SIMPLE_ELASTIX_AVAILABLE:
+            logging.warning('SimpleITK is not built with SimpleElastix, using the elastix executables.')
+            self._in_process = False
+        # transformations of in-process registrations waiting for warping landmarks
+        self._transforms = {}
+
         def _exec_update(executable):
             is_path = p_elatix and os.path.isdir(p_elatix)
             return os.path.join(p_elatix, executable) if is_path else executable
@@ -161,12 +200,86 @@ class BmElastix(ImRegBenchmark):
         }
         return cmd
 
+    def _execute_img_registration(self, item):
+        """ execute the image registration, optionally in-process with SimpleElastix
+
+        :param dict item: record
+        :return dict: record
+        """
+        if not self._in_process:
+            return super(BmElastix, self)._execute_img_registration(item)
+
+        logging.debug('.. execute image registration in-process')
+        path_dir = self._get_path_reg_dir(item)
+        path_im_ref, path_im_move, _, _ = self._get_paths(item)
+
+        elastix = sitk.ElastixImageFilter()
+        elastix.LogToConsoleOff()
+        elastix.LogToFileOff()
+        elastix.SetFixedImage(_load_fixed_image(path_im_ref))
+        elastix.SetMovingImage(sitk.ReadImage(path_im_move, sitk.sitkFloat32))
+        elastix.SetParameterMap(sitk.ReadParameterFile(self.params['path_config']))
+        try:
+            elastix.Execute()
+        except RuntimeError:
+            logging.exception('in-process registration failed for: %s', path_dir)
+            return None
+
+        name_img = os.path.basename(path_im_move)
+        img_warp = sitk.GetArrayFromImage(elastix.GetResultImage())
+        save_image(os.path.join(path_dir, name_img), np.clip(img_warp, 0, 255).astype(np.uint8))
+        self._transforms[path_dir] = elastix.GetTransformParameterMap()
+        return item
+
+    def _warp_landmarks_in_process(self, path_dir, path_lnds_ref):
+        """ warp the reference landmarks by the transformation of in-process registration
+
+        The transformation maps fixed (reference) points to the moving image,
+        so the warped points are sampled from its deformation field computed in memory.
+
+        :param str path_dir: path to the registration folder
+        :param str path_lnds_ref: path to the reference landmarks
+        :return str|None: path to the warped landmarks
+        """
+        transform = self._transforms.pop(path_dir, None)
+        if transform is None:
+            return None
+        transformix = sitk.TransformixImageFilter()
+        transformix.LogToConsoleOff()
+        transformix.LogToFileOff()
+        transformix.SetTransformParameterMap(transform)
+        transformix.ComputeDeformationFieldOn()
+        try:
+            transformix.Execute()
+        except RuntimeError:
+            logging.exception('in-process landmarks warping failed for: %s', path_dir)
+            return None
+        field = transformix.GetDeformationField()
+
+        lnds = self.warp_points_by_field(
+            load_landmarks(path_lnds_ref),
+            sitk.GetArrayFromImage(field),
+            origin=field.GetOrigin(),
+            spacing=field.GetSpacing(),
+        )
+        path_lnds_warp = os.path.join(path_dir, os.path.basename(path_lnds_ref))
+        save_landmarks(path_lnds_warp, lnds)
+        return path_lnds_warp
+
     def _extract_warped_image_landmarks(self, item):
         """ get registration results - warped registered images and landmarks
 
         :param dict item: dictionary with registration params
         :return dict: paths to warped images/landmarks
         """
+        if self._in_process:
+            path_dir = self._get_path_reg_dir(item)
+            _, path_img_move, path_lnds_ref, _ = self._get_paths(item)
+            return {
+                self.COL_IMAGE_MOVE_WARP: os.path.join(path_dir, os.path.basename(path_img_move)),
+                self.COL_POINTS_REF_WARP: self._warp_landmarks_in_process(path_dir, path_lnds_ref),
+            }
+
         path_dir = self._get_path_reg_dir(item)
         _, path_img_move, path_lnds_ref, _ = self._get_paths(item)
         path_img_warp, path_lnds_warp = None, None
@@ -236,8 +349,40 @@ class BmElastix(ImRegBenchmark):
         arg_parser.add_argument(
             '-cfg', '--path_config', required=True, type=str, help='path to the elastic configuration'
         )
+        arg_parser.add_argument(
+            '--in_process',
+            action='store_true',
+            required=False,
+            default=False,
+            help='run the registration in-process with SimpleElastix instead of the executables'
+        )
         return arg_parser
 
+    @staticmethod
+    def warp_points_by_field(points, field, origin=(0, 0), spacing=(1, 1)):
+        """ warp points by a dense displacement field with bilinear interpolation
+
+        :param ndarray points: points in physical coordinates, np.array<nb_points, 2>
+        :param ndarray field: displacements in physical coordinates, np.array<height, width, 2>
+        :param tuple(float,float) origin: physical position of the first field element (X, Y)
+        :param tuple(float,float) spacing: physical size of field element (X, Y)
+        :return ndarray: warped points, np.array<nb_points, 2>
+
+        >>> field = np.zeros((10, 20, 2))
+        >>> field[..., 0] = np.arange(20) / 10.
+        >>> field[..., 1] = -1
+        >>> BmElastix.warp_points_by_field(np.array([[5., 2.], [2.5, 8.], [30., 4.]]), field)
+        array([[  5.5 ,   1.  ],
+               [  2.75,   7.  ],
+               [ 31.9 ,   3.  ]])
+        """
+        points = np.asarray(points, dtype=float)
+        # convert physical coordinates to field indexes as (row, col)
+        idx = (points - np.asarray(origin)[:2]) / np.asarray(spacing)[:2]
+        coords = idx[:, ::-1].T
+        shift = [ndimage.map_coordinates(field[..., i], coords, order=1, mode='nearest') for i in range(2)]
+        return points + np.array(shift).T
+
     @staticmethod
     def parse_warped_points(path_pts, col_name='OutputPoint'):
 
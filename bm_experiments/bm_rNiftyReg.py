@@ -35,6 +35,9 @@ Run the RNiftyReg benchmark::
         -R Rscript \
         -script ./scripts/Rscript/RNiftyReg_linear.r
 
+To load the R runtime and packages just once per parallel worker instead of for each image pair,
+run the registration scripts in a persistent R session by adding ``--R_worker``.
+
 .. note:: tested for RNiftyReg > 2.x
 
 Copyright (C) 2017-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
@@ -47,7 +50,8 @@ import sys
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.benchmark import ImRegBenchmark
-from birl.utilities.data_io import load_landmarks, save_landmarks
+from birl.utilities.data_io import load_landmarks, save_landmarks, update_path
+from birl.utilities.experiments import get_persistent_worker
 from bm_experiments import bm_comp_perform
 
 
@@ -75,12 +79,12 @@ class BmRNiftyReg(ImRegBenchmark):
     """
     #: required experiment parameters
     REQUIRED_PARAMS = ImRegBenchmark.REQUIRED_PARAMS + ['exec_R', 'path_R_script']
-    #: file with exported image registration time
-    NAME_FILE_TIME = 'time.txt'
     #: file with warped landmarks after performed registration
     NAME_FILE_LANDMARKS = 'points.pts'
     #: file with warped image after performed registration
     NAME_FILE_IMAGE = 'warped.jpg'
+    #: path/name of script running persistent R session which executes scripts sent as jobs
+    PATH_SCRIPT_WORKER = os.path.join(update_path('scripts'), 'Rscript', 'run-jobs-worker.r')
 
     def _prepare(self):
         logging.info('-> copy configuration...')
@@ -105,6 +109,24 @@ class BmRNiftyReg(ImRegBenchmark):
         ])
         return cmd
 
+    def _execute_img_registration(self, item):
+        """ execute the image registration, optionally in the persistent R session
+
+        :param dict item: record
+        :return dict: record
+        """
+        if not self.params.get('R_worker', False):
+            return super(BmRNiftyReg, self)._execute_img_registration(item)
+
+        logging.debug('.. execute image registration in persistent R session')
+        path_log = os.path.join(self._get_path_reg_dir(item), self.NAME_LOG_REGISTRATION)
+        # the session runs the same script with the same arguments just without starting R
+        cmd_elems = self._generate_regist_command(item).split()
+        worker = get_persistent_worker([self.params['exec_R'], self.PATH_SCRIPT_WORKER])
+        cmd_result = worker.execute('\t'.join(cmd_elems[1:]), path_logger=path_log, timeout=self.EXECUTE_TIMEOUT)
+        # if the experiment failed, return back None
+        return item if cmd_result else None
+
     def _extract_warped_image_landmarks(self, item):
         """ get registration results - warped registered images and landmarks
 
@@ -136,17 +158,6 @@ class BmRNiftyReg(ImRegBenchmark):
             self.COL_POINTS_MOVE_WARP: path_lnds_warp,
         }
 
-    def _extract_execution_time(self, item):
-        """ if needed update the execution time
-        :param dict item: dictionary with registration params
-        :return float|None: time in minutes
-        """
-        path_dir = self._get_path_reg_dir(item)
-        path_time = os.path.join(path_dir, self.NAME_FILE_TIME)
-        with open(path_time, 'r') as fp:
-            t_exec = float(fp.read()) / 60.
-        return t_exec
-
     @staticmethod
     def extend_parse(arg_parser):
         """ extent the basic arg parses by some extra required parameters
@@ -160,6 +171,13 @@ class BmRNiftyReg(ImRegBenchmark):
         arg_parser.add_argument(
             '-script', '--path_R_script', required=True, type=str, help='path to the R script with registration'
         )
+        arg_parser.add_argument(
+            '--R_worker',
+            action='store_true',
+            required=False,
+            default=False,
+            help='run the registrations in one persistent R session per parallel worker instead of Rscript for each'
+        )
         return arg_parser
 
 
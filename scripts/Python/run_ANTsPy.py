@@ -4,6 +4,9 @@ https://github.com/ANTsX/ANTsPy/blob/master/tutorials/10minTutorial.ipynb
 
 For performance and parameters discussion see https://github.com/ANTsX/ANTsPy/issues/85
 
+The registration itself is shared with the in-process benchmark,
+see `birl.utilities.registration.register_images_ants`.
+
 >> python ./scripts/Python/run_ANTsPy.py \
     ./data-images/rat-kidney_/scale-5pc/Rat-Kidney_HE.jpg \
     ./data-images/rat-kidney_/scale-5pc/Rat-Kidney_PanCytokeratin.jpg \
@@ -17,12 +20,15 @@ import os
 import sys
 import time
 
-import ants
 import pandas as pd
 from PIL import Image
-from skimage.color import rgb2gray
 from skimage.io import imread, imsave
 
+# Add path to the BIRL root relative to this script, so it runs from any folder also without installed package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from birl.utilities.data_io import save_stage_timing
+from birl.utilities.registration import register_images_ants
+
 # PIL.Image.DecompressionBombError: could be decompression bomb DOS attack.
 # SEE: https://gitlab.mister-muffin.de/josch/img2pdf/issues/42
 Image.MAX_IMAGE_PIXELS = None
@@ -36,47 +42,28 @@ paths = {
 }
 paths['warped'] = os.path.join(paths['out'], 'warped-image.jpg')
 paths['pts'] = os.path.join(paths['out'], 'warped-landmarks.csv')
-paths['time'] = os.path.join(paths['out'], 'time.txt')
+paths['timing'] = os.path.join(paths['out'], 'timing.jsonl')
 
-t_start = time.time()
+t_start, t_cpu = time.time(), time.process_time()
 # loading images and landmarks
-fixed = ants.from_numpy(rgb2gray(imread(paths['fixed'])))
-moving = ants.from_numpy(rgb2gray(imread(paths['moving'])))
-lnds = pd.read_csv(paths['lnds'])[['X', 'Y']]
-# transform landmarks coordinates
-lnds.columns = ['y', 'x']
+fixed = imread(paths['fixed'])
+moving = imread(paths['moving'])
+lnds = pd.read_csv(paths['lnds'])[['X', 'Y']].values
+t_loading, t_cpu_loading = time.time() - t_start, time.process_time() - t_cpu
 
-# perform image registration
-mytx = ants.registration(
-    fixed=fixed,
-    moving=moving,
-    initial_transform='AffineFast',
-    type_of_transform='ElasticSyN',
-    grad_step=5,
-    aff_metric='mattes',
-    aff_sampling=32,
-    syn_metric='mattes',
-    syn_sampling=32,
-    reg_iterations=(40, 20, 10),
-)
-print('Transform: %r' % mytx)
-t_elapsed = time.time() - t_start
-print('Time: %r seconds' % t_elapsed)
-warped_moving = ants.apply_transforms(fixed=fixed, moving=moving, transformlist=mytx['fwdtransforms'])
-warped_points = ants.apply_transforms_to_points(dim=2, points=lnds, transformlist=mytx['invtransforms'])
+# perform image registration and warping
+warped_moving, warped_points, timings = register_images_ants(fixed, moving, lnds)
+print('Time: %r seconds' % timings['registration']['time'])
 
-# # Visualisation
-# import matplotlib.pyplot as plt
-# plt.imshow(warped_moving.numpy(), cmap=plt.cm.Greys_r)
-# plt.plot(warped_points['y'], warped_points['x'], '.')
-# plt.show()
+# report the stages one after another to the timing sidecar read by the benchmark
+timings['loading']['time'] += t_loading
+timings['loading']['cpu'] += t_cpu_loading
+for stage in ('loading', 'registration', 'warping'):
+    t_end = t_start + timings[stage]['time']
+    save_stage_timing(paths['timing'], stage, t_start, t_end, cpu=timings[stage]['cpu'])
+    t_start = t_end
 
 # Exporting results
-with open(paths['time'], 'w') as fp:
-    fp.write(str(t_elapsed))
-imsave(paths['warped'], warped_moving.numpy())
-lnds = warped_points[['y', 'x']]
-# transform landmarks coordinates back
-lnds.columns = ['X', 'Y']
-lnds.to_csv(paths['pts'])
+imsave(paths['warped'], warped_moving)
+pd.DataFrame(warped_points, columns=['X', 'Y']).to_csv(paths['pts'])
 print('finished')
@@ -25,11 +25,20 @@ pathImgB <- args[2]
 pathLnd <- args[3]
 ## output folder
 outPath <- args[4]
-outTime <- paste(outPath, 'time.txt', sep='')
+outTiming <- paste(outPath, 'timing.jsonl', sep='')
 outLnd <- paste(outPath, 'points.pts', sep='')
 outImg <- paste(outPath, 'warped.jpg', sep='')
 
+## Report a finished stage as JSON line to the timing sidecar read by the benchmark
+logStage <- function(stage, time.start, cpu.start) {
+    cpu <- proc.time() - cpu.start
+    cat(sprintf('{"stage": "%s", "start": %.3f, "end": %.3f, "cpu": %.3f}\n',
+                stage, as.numeric(time.start), as.numeric(Sys.time()), cpu[["user.self"]] + cpu[["sys.self"]]),
+        file=outTiming, append=TRUE)
+}
+
 time.start <- Sys.time()
+cpu.start <- proc.time()
 
 ## Read images, and convert (naively) to greyscale by averaging the RGB channels
 target <- rgb_2gray(readImage(pathImgA))
@@ -43,6 +52,10 @@ if (scale > 1) {
     source <- resizeImage(source, floor(dim(source)[1] / scale), floor(dim(source)[2] / scale))
 }
 
+logStage('loading', time.start, cpu.start)
+time.start <- Sys.time()
+cpu.start <- proc.time()
+
 ## Register the images and retrieve the affine matrix
 result <- niftyreg.linear(source, target,
                           scope=c("affine", "rigid"),
@@ -54,9 +67,9 @@ result <- niftyreg.linear(source, target,
 result
 
 ## Export registration time
-time.taken <- Sys.time() - time.start
-cat(time.taken, file=outTime)
-outTime
+logStage('registration', time.start, cpu.start)
+time.start <- Sys.time()
+cpu.start <- proc.time()
 
 ## Save image as bitmap
 # png::writePNG(result$image, outImg)
@@ -94,5 +107,7 @@ cat('point\n',nrow(pointsWarp),'\n', file=outLnd)
 write.table(pointsWarp, file=outLnd, sep = ' ', append=TRUE, row.names=FALSE, col.names=FALSE)
 outLnd
 
+logStage('warping', time.start, cpu.start)
+
 ## Exit
 quit('yes')
@@ -0,0 +1,38 @@
+# Persistent worker executing R scripts in a single running R session,
+#  so the R runtime and the packages (e.g. RNiftyReg) are loaded just once
+#
+# Each job is a line on the standard input with the script path and its arguments
+#  separated by tabulators, the script gets these arguments from `commandArgs(TRUE)`.
+# Each job is finished by the line "BIRL-JOB-END <status>" where the status is 0 for success.
+# The worker ends with closed standard input.
+#
+# Smoke tested in CI experiments with R 3.4.4 from Ubuntu 18.04 packages,
+#  see `.github/workflows/ci_experiment.yml`.
+#
+# CMD>> Rscript scripts/Rscript/run-jobs-worker.r
+
+input <- file("stdin", open="r")
+while (length(line <- readLines(input, n=1)) > 0) {
+    status <- 0
+    job <- strsplit(line, "\t", fixed=TRUE)[[1]]
+    if (length(job) > 0 && nchar(job[1]) > 0) {
+        ## each script runs in its own environment with its own arguments
+        env <- new.env(parent=globalenv())
+        env$commandArgs <- function(trailingOnly=FALSE) job[-1]
+        ## the script ending by `quit` has to end just the job, not the worker
+        env$quit <- function(...) {
+            signalCondition(structure(class=c("jobQuit", "condition"), list(message="quit", call=NULL)))
+        }
+        env$q <- env$quit
+        status <- tryCatch({
+            source(job[1], local=env, print.eval=TRUE)
+            0
+        }, jobQuit=function(cond) 0, error=function(err) {
+            print(err)
+            1
+        })
+    }
+    cat("BIRL-JOB-END", status, "\n")
+    flush(stdout())
+}
+close(input)
@@ -6,6 +6,7 @@ Copyright (C) 2017-2019 Jiri Borovec <jiri.borovec@fel.cvut.cz>
 """
 
 import argparse
+import json
 import logging
 import os
 import shutil
@@ -13,9 +14,9 @@ import sys
 import unittest
 
 try:  # python 3
-    from unittest.mock import patch
+    from unittest.mock import MagicMock, patch
 except ImportError:  # python 2
-    from mock import patch
+    from mock import MagicMock, patch
 
 import numpy as np
 import pandas as pd
@@ -24,9 +25,11 @@ from numpy.testing import assert_array_almost_equal, assert_raises
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.benchmark import ImRegBenchmark
 from birl.bm_template import BmTemplate
-from birl.utilities.data_io import save_config_yaml, update_path
+from birl.utilities.data_io import load_landmarks, save_config_yaml, save_stage_timing, update_path
 from birl.utilities.dataset import args_expand_parse_images
 from birl.utilities.experiments import parse_arg_params, try_decorator
+from bm_ANHIR.evaluate_submission import COL_NORM_TIME, evaluate_submissions, NAME_JSON_COMPUTER
+from bm_experiments import bm_elastix
 
 PATH_ROOT = os.path.dirname(update_path('birl'))
 PATH_DATA = update_path('data-images')
@@ -137,6 +140,99 @@ class TestBmRegistration(unittest.TestCase):
         )
         os.remove(path_config)
 
+    def test_benchmark_method_plugin(self):
+        """ test run in parallel with in-process registration method """
+        self._remove_default_experiment(ImRegBenchmark.__name__)
+        params = {
+            'path_table': PATH_CSV_COVER_MIX,
+            'path_out': self.path_out,
+            'nb_workers': 2,
+            'visual': True,
+            'unique': False,
+        }
+        benchmark = ImRegBenchmark(params)
+        benchmark.set_method_plugin(identity_method_plugin)
+        benchmark.run()
+        # the source landmarks are not moved, so the TRE is the initial one
+        self.check_benchmark_results(
+            benchmark, final_means=[28., 68., 73., 76., 95.], final_stds=[1., 13., 28., 28., 34.]
+        )
+        df_regist = pd.read_csv(os.path.join(benchmark.params['path_exp'], benchmark.NAME_CSV_REGISTRATION_PAIRS))
+        # the execution time includes the loading reported by the method and the loading its inputs
+        t_loading = df_regist[benchmark.COL_TIME_STAGE % 'loading'].values
+        self.assertTrue(all(t_loading > 1. / 60))
+        assert_array_almost_equal(df_regist[benchmark.COL_TIME].values, t_loading + 0.5)
+        assert_array_almost_equal(
+            df_regist[benchmark.COL_TIME_STAGE % 'registration'].values, [0.5] * len(df_regist)
+        )
+        assert_array_almost_equal(
+            df_regist[benchmark.COL_TIME_CPU_STAGE % 'registration'].values, [0.75] * len(df_regist)
+        )
+
+    def test_benchmark_timing_sidecar(self):
+        """ test parsing stage timings reported by the method wrapper """
+        self._remove_default_experiment(TimingSidecarBenchmark.__name__)
+        params = {
+            'path_table': PATH_CSV_COVER_MIX,
+            'path_out': self.path_out,
+            'nb_workers': 2,
+            'unique': False,
+        }
+        benchmark = TimingSidecarBenchmark(params)
+        benchmark.run()
+        df_regist = pd.read_csv(os.path.join(benchmark.params['path_exp'], benchmark.NAME_CSV_REGISTRATION_PAIRS))
+        assert_array_almost_equal(df_regist[benchmark.COL_TIME].values, [1.55] * len(df_regist))
+        assert_array_almost_equal(df_regist[benchmark.COL_TIME_STAGE % 'loading'].values, [0.05] * len(df_regist))
+        assert_array_almost_equal(
+            df_regist[benchmark.COL_TIME_STAGE % 'registration'].values, [1.5] * len(df_regist)
+        )
+        assert_array_almost_equal(
+            df_regist[benchmark.COL_TIME_CPU_STAGE % 'registration'].values, [3.] * len(df_regist)
+        )
+
+    def test_elastix_in_process(self):
+        """ test the in-process SimpleElastix registration with mocked SimpleITK """
+        self._remove_default_experiment(bm_elastix.BmElastix.__name__)
+        params = {
+            'path_table': PATH_CSV_COVER_MIX,
+            'path_out': self.path_out,
+            'path_config': os.path.join(update_path('configs'), 'elastix_affine.txt'),
+            'nb_workers': 1,
+            'unique': False,
+        }
+        benchmark = bm_elastix.BmElastix(params)
+        benchmark._in_process, benchmark._transforms = True, {}
+        item = dict(pd.read_csv(PATH_CSV_COVER_MIX).iloc[0])
+        item[benchmark.COL_REG_DIR] = 'reg-0'
+        path_dir = benchmark._get_path_reg_dir(item)
+        os.mkdir(path_dir)
+        _, path_img_move, path_lnds_ref, _ = benchmark._get_paths(item)
+
+        # the deformation field shifts all points by (1, -2)
+        field = MagicMock()
+        field.GetOrigin.return_value, field.GetSpacing.return_value = (0., 0.), (1., 1.)
+        mock_sitk = MagicMock()
+        mock_sitk.TransformixImageFilter.return_value.GetDeformationField.return_value = field
+        mock_sitk.GetArrayFromImage.side_effect = \
+            lambda img: np.tile([1., -2.], (50, 60, 1)) if img is field else np.zeros((50, 60))
+        with patch.object(bm_elastix, 'sitk', mock_sitk):
+            self.assertEqual(benchmark._execute_img_registration(item), item)
+            self.assertIn(path_dir, benchmark._transforms)
+            path_lnds_warp = benchmark._warp_landmarks_in_process(path_dir, path_lnds_ref)
+            # the transformation is used just once
+            self.assertIsNone(benchmark._warp_landmarks_in_process(path_dir, path_lnds_ref))
+
+            # failing registration or warping is not raised, only reported as missing result
+            mock_sitk.ElastixImageFilter.return_value.Execute.side_effect = RuntimeError('elastix')
+            self.assertIsNone(benchmark._execute_img_registration(item))
+            benchmark._transforms[path_dir] = MagicMock()
+            mock_sitk.TransformixImageFilter.return_value.Execute.side_effect = RuntimeError('transformix')
+            self.assertIsNone(benchmark._warp_landmarks_in_process(path_dir, path_lnds_ref))
+        bm_elastix._LAST_FIXED_IMAGE.clear()
+
+        self.assertTrue(os.path.isfile(os.path.join(path_dir, os.path.basename(path_img_move))))
+        assert_array_almost_equal(load_landmarks(path_lnds_warp), load_landmarks(path_lnds_ref) + [1., -2.])
+
     def check_benchmark_results(self, benchmark, final_means, final_stds):
         """ check whether the benchmark folder contains all required files
         and compute statistic correctly """
@@ -193,6 +289,49 @@ class TestBmRegistration(unittest.TestCase):
         assert_array_almost_equal(sorted(df_regist['TRE Mean'].values), np.array(final_means), decimal=0)
         assert_array_almost_equal(sorted(df_regist['TRE STD'].values), np.array(final_stds), decimal=0)
 
+    def test_evaluate_submissions(self):
+        """ evaluate several submissions with the same folder name at once """
+        self._remove_default_experiment(ImRegBenchmark.__name__)
+        params = {
+            'path_table': PATH_CSV_COVER_ANHIR,
+            'path_dataset': PATH_DATA,
+            'path_out': self.path_out,
+            'nb_workers': 1,
+            'unique': False,
+        }
+        benchmark = ImRegBenchmark(params)
+        benchmark.set_method_plugin(identity_method_plugin)
+        benchmark.run()
+        path_submit = os.path.join(self.path_out, 'submissions')
+        paths_expt = [os.path.join(path_submit, user, 'results') for user in ('user-A', 'user-B')]
+        # the reference computer is twice slower than the one used by the submissions
+        comp_perform = {'registration @1-thread': 1., 'registration @n-thread': 3.}
+        for path_expt in paths_expt:
+            shutil.copytree(benchmark.params['path_exp'], path_expt)
+            with open(os.path.join(path_expt, NAME_JSON_COMPUTER), 'w') as fp:
+                json.dump(comp_perform, fp)
+
+        path_eval = os.path.join(self.path_out, 'evaluation')
+        os.mkdir(path_eval)
+        path_comp_bm = os.path.join(path_eval, 'reference-computer.json')
+        with open(path_comp_bm, 'w') as fp:
+            json.dump({k: 2 * v for k, v in comp_perform.items()}, fp)
+        path_csv = evaluate_submissions(
+            paths_expt,
+            path_table=PATH_CSV_COVER_ANHIR,
+            path_dataset=PATH_DATA,
+            path_output=path_eval,
+            path_reference=PATH_DATA,
+            path_comp_bm=path_comp_bm,
+            nb_workers=2,
+        )
+        df_ranking = pd.read_csv(path_csv, index_col=0)
+        self.assertEqual(sorted(df_ranking.index), ['results', 'results-2'])
+        for name in df_ranking.index:
+            self.assertTrue(os.path.isdir(os.path.join(path_eval, name)))
+            df_expt = pd.read_csv(os.path.join(path_eval, name, 'registration-results_NEW.csv'))
+            assert_array_almost_equal(df_expt[COL_NORM_TIME].values, 2 * df_expt[benchmark.COL_TIME].values)
+
     def test_try_wrap(self):
         self.assertIsNone(try_wrap())
 
@@ -215,6 +354,22 @@ class TestBmRegistration(unittest.TestCase):
         self.assertIsNone(fig)
 
 
+def identity_method_plugin(img_ref, img_move, lnds_move):
+    """ simulate in-process registration, keep the source image and landmarks """
+    return img_move, lnds_move, {'registration': {'time': 30., 'cpu': 45.}, 'loading': 1.}
+
+
+class TimingSidecarBenchmark(ImRegBenchmark):
+    """ simulate a method wrapper which reports its stages to the timing sidecar """
+
+    def _execute_img_registration(self, item):
+        item = super(TimingSidecarBenchmark, self)._execute_img_registration(item)
+        path_timing = os.path.join(self._get_path_reg_dir(item), self.NAME_FILE_TIMING)
+        save_stage_timing(path_timing, 'loading', 0., 3.)
+        save_stage_timing(path_timing, 'registration', 3., 93., cpu=180.)
+        return item
+
+
 @try_decorator
 def try_wrap():
     return '%i' % '42'
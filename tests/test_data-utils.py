@@ -9,11 +9,13 @@ import os
 import sys
 import unittest
 
+import numpy as np
 from parameterized import parameterized
+from matplotlib.path import Path
 
 sys.path += [os.path.abspath('.'), os.path.abspath('..')]  # Add path to root
 from birl.utilities.data_io import load_image, update_path
-from birl.utilities.dataset import CONVERT_RGB, image_histogram_matching
+from birl.utilities.dataset import compute_concave_hull, CONVERT_RGB, image_histogram_matching
 
 PATH_ROOT = os.path.dirname(update_path('birl'))
 PATH_DATA = update_path('data-images')
@@ -33,3 +35,17 @@ class TestHistogramMatching(unittest.TestCase):
         """ test run in parallel with failing experiment """
         img = image_histogram_matching(self.img_src, self.img_ref, use_color=clr_space)
         self.assertAlmostEqual(self.img_src.shape, img.shape)
+
+
+class TestConcaveHull(unittest.TestCase):
+
+    def test_landmarks_inside(self):
+        """ all landmarks stay inside or on the boundary of the simplified hull """
+        rng = np.random.RandomState(0)
+        for _ in range(50):
+            points = rng.random_sample((rng.randint(20, 200), 2)) * 500
+            polygon = compute_concave_hull(points)
+            self.assertLess(len(polygon), len(points))
+            # the boundary points are counted as inside with a small positive or negative radius
+            inside = [Path(polygon).contains_points(points, radius=r) for r in (-1e-6, 1e-6)]
+            self.assertTrue(np.all(np.logical_or(*inside)))